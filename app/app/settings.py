@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 import os
+import sys
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +49,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -91,6 +93,64 @@ DATABASES = {
     }
 }
 
+# Read replicas of the database, as comma separated hosts sharing the name and credentials of the
+# primary in DATABASE_REPLICAS_HOSTS. Searches and dictionary lookups read from a random replica,
+# except for clients that stored paragraphs in the last STICKY_SECONDS, which read from the
+# primary until their STICKY_COOKIE cookie expires.
+DATABASE_REPLICAS = {
+    'ALIASES': [],
+    'STICKY_SECONDS': int(os.environ.get('DATABASE_REPLICAS_STICKY_SECONDS', 5)),
+    'STICKY_COOKIE': os.environ.get('DATABASE_REPLICAS_STICKY_COOKIE', 'db_primary'),
+}
+for index, host in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS_HOSTS', '').split(','))):
+    DATABASES[f'replica{index}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS['ALIASES'].append(f'replica{index}')
+
+# Databases the paragraphs are spread over by a consistent hash of their id, the primary alone by default.
+# Other shards are comma separated hosts sharing the name and credentials of the primary in
+# PARAGRAPH_SHARDS_HOSTS. Shards can only be appended to the list, run the rebalance_shards command after
+# appending one. Searches and dictionary lookups read from MAX_WORKERS shards at once.
+PARAGRAPH_SHARDS = {
+    'ALIASES': ['default'],
+    'MAX_WORKERS': int(os.environ.get('PARAGRAPH_SHARDS_MAX_WORKERS', 8)),
+}
+for index, host in enumerate(filter(None, os.environ.get('PARAGRAPH_SHARDS_HOSTS', '').split(',')), start=1):
+    DATABASES[f'shard{index}'] = {**DATABASES['default'], 'HOST': host}
+    PARAGRAPH_SHARDS['ALIASES'].append(f'shard{index}')
+
+# The test suite gets a second database standing in for a replica and a third standing in for a
+# shard, which only the tests of the router and of sharding use.
+if sys.argv[1:2] == ['test']:
+    DATABASES['replica_test'] = {
+        **DATABASES['default'],
+        'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica"},
+    }
+    DATABASES['shard_test'] = {
+        **DATABASES['default'],
+        'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_shard"},
+    }
+
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+
+
+# Caches
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+# The search result cache is process-local by default, point SEARCH_CACHE_BACKEND and
+# SEARCH_CACHE_LOCATION at a shared backend (e.g. memcached or redis) to share it between workers.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'search': {
+        'BACKEND': os.environ.get('SEARCH_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('SEARCH_CACHE_LOCATION', 'paragraph-search'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('SEARCH_CACHE_MAX_ENTRIES', 1000)),
+        },
+    },
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -138,3 +198,160 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
+
+# Definitions fetched from https://dictionaryapi.dev/ are cached in process and in the database.
+# TTLs are in seconds, NEGATIVE_TTL applies to words the API has no definition for.
+DEFINITION_CACHE = {
+    'MAX_SIZE': int(os.environ.get('DEFINITION_CACHE_MAX_SIZE', 1024)),
+    'TTL': int(os.environ.get('DEFINITION_CACHE_TTL', 7 * 24 * 60 * 60)),
+    'NEGATIVE_TTL': int(os.environ.get('DEFINITION_CACHE_NEGATIVE_TTL', 24 * 60 * 60)),
+}
+
+# Concurrent lookups of definitions missing from the cache. MODE is "threads" or "asyncio",
+# DEADLINE bounds the whole batch in seconds.
+DEFINITION_LOOKUP = {
+    'MODE': os.environ.get('DEFINITION_LOOKUP_MODE', 'threads'),
+    'MAX_WORKERS': int(os.environ.get('DEFINITION_LOOKUP_MAX_WORKERS', 10)),
+    'DEADLINE': float(os.environ.get('DEFINITION_LOOKUP_DEADLINE', 8)),
+}
+
+# Most common words estimated in bounded memory by core.topk, for the recompute_common_words command and for
+# /paragraph/dictionary when SOURCE is 'sketch' instead of the exact word frequency table. Paragraphs are read
+# CHUNK_SIZE at a time and counted by PROCESSES processes, in a summary of CAPACITY words whose LIMIT most common
+# ones are stored. The dictionary serves the exact word frequencies instead until they are stored, and once the
+# corpus generation, advanced twice by every paragraph write, moved more than MAX_LAG past the one they were counted at.
+COMMON_WORDS = {
+    'SOURCE': os.environ.get('COMMON_WORDS_SOURCE', 'table'),
+    'CAPACITY': int(os.environ.get('COMMON_WORDS_CAPACITY', 10000)),
+    'CHUNK_SIZE': int(os.environ.get('COMMON_WORDS_CHUNK_SIZE', 2000)),
+    'PROCESSES': int(os.environ.get('COMMON_WORDS_PROCESSES', os.cpu_count() or 1)),
+    'LIMIT': int(os.environ.get('COMMON_WORDS_LIMIT', 100)),
+    'MAX_LAG': int(os.environ.get('COMMON_WORDS_MAX_LAG', 1000)),
+}
+
+# Concurrent identical computations, dictionary builds, definition lookups and searches missing the search result
+# cache, run once per process and share their outcome, callers wait for it at most TIMEOUT seconds before running
+# the computation themselves. With DATABASE_LOCKS, computations hold a Postgres advisory lock while they run, polled
+# every LOCK_POLL_INTERVAL seconds for at most TIMEOUT seconds, so other processes wait and find them cached.
+SINGLE_FLIGHT = {
+    'ENABLED': os.environ.get('SINGLE_FLIGHT_ENABLED', '1') == '1',
+    'DATABASE_LOCKS': os.environ.get('SINGLE_FLIGHT_DATABASE_LOCKS', '1') == '1',
+    'TIMEOUT': float(os.environ.get('SINGLE_FLIGHT_TIMEOUT', 10)),
+    'LOCK_POLL_INTERVAL': float(os.environ.get('SINGLE_FLIGHT_LOCK_POLL_INTERVAL', 0.05)),
+}
+
+# HTTP client shared by the requests to metaphorpsum.com and dictionaryapi.dev.
+# Timeouts and budgets are in seconds. A request is retried at most RETRIES times with jittered
+# exponential backoff, as long as it stays within RETRY_BUDGET, which also bounds the timeouts of every
+# attempt. The circuit breaker of a host opens after BREAKER_FAILURE_THRESHOLD consecutive failures
+# and lets a trial request through every BREAKER_RESET_TIMEOUT. The async views share the clients of their event loop, holding up to
+# ASYNC_MAX_CONNECTIONS connections in pools of ASYNC_POOL_SIZE.
+UPSTREAM_HTTP = {
+    'POOL_CONNECTIONS': int(os.environ.get('UPSTREAM_POOL_CONNECTIONS', 4)),
+    'POOL_MAXSIZE': int(os.environ.get('UPSTREAM_POOL_MAXSIZE', 20)),
+    'CONNECT_TIMEOUT': float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3)),
+    'READ_TIMEOUT': float(os.environ.get('UPSTREAM_READ_TIMEOUT', 5)),
+    'RETRIES': int(os.environ.get('UPSTREAM_RETRIES', 2)),
+    'RETRY_BUDGET': float(os.environ.get('UPSTREAM_RETRY_BUDGET', 6)),
+    'BACKOFF_BASE': float(os.environ.get('UPSTREAM_BACKOFF_BASE', 0.1)),
+    'BACKOFF_MAX': float(os.environ.get('UPSTREAM_BACKOFF_MAX', 1)),
+    'BREAKER_FAILURE_THRESHOLD': int(os.environ.get('UPSTREAM_BREAKER_FAILURE_THRESHOLD', 5)),
+    'BREAKER_RESET_TIMEOUT': float(os.environ.get('UPSTREAM_BREAKER_RESET_TIMEOUT', 30)),
+    'ASYNC_MAX_CONNECTIONS': int(os.environ.get('UPSTREAM_ASYNC_MAX_CONNECTIONS', 500)),
+    'ASYNC_POOL_SIZE': int(os.environ.get('UPSTREAM_ASYNC_POOL_SIZE', 10)),
+}
+
+# Bulk ingestion through /paragraph/get?count=N. At most MAX_COUNT paragraphs are fetched per request,
+# MAX_WORKERS at a time and within DEADLINE seconds, and inserted BATCH_SIZE rows per statement. Paragraphs are
+# deleted BATCH_SIZE at a time as well.
+PARAGRAPH_BULK = {
+    'MAX_COUNT': int(os.environ.get('PARAGRAPH_BULK_MAX_COUNT', 100)),
+    'MAX_WORKERS': int(os.environ.get('PARAGRAPH_BULK_MAX_WORKERS', 10)),
+    'DEADLINE': float(os.environ.get('PARAGRAPH_BULK_DEADLINE', 30)),
+    'BATCH_SIZE': int(os.environ.get('PARAGRAPH_BULK_BATCH_SIZE', 500)),
+}
+
+# Queued ingestion through /paragraph/get?async=true, the default for every request when ASYNC is set.
+# The process_ingest_jobs worker claims CLAIM_BATCH jobs at a time, polling every POLL_INTERVAL seconds
+# when the queue is empty, and fetches their paragraphs MAX_WORKERS at a time within DEADLINE seconds.
+# Jobs without any fetched paragraph are retried after RETRY_DELAY seconds, doubled on every attempt, and
+# fail after MAX_ATTEMPTS attempts. Jobs still running LEASE seconds after being claimed are claimed again.
+PARAGRAPH_INGEST = {
+    'ASYNC': os.environ.get('PARAGRAPH_INGEST_ASYNC', '0') == '1',
+    'CLAIM_BATCH': int(os.environ.get('PARAGRAPH_INGEST_CLAIM_BATCH', 10)),
+    'POLL_INTERVAL': float(os.environ.get('PARAGRAPH_INGEST_POLL_INTERVAL', 1)),
+    'MAX_WORKERS': int(os.environ.get('PARAGRAPH_INGEST_MAX_WORKERS', 10)),
+    'DEADLINE': float(os.environ.get('PARAGRAPH_INGEST_DEADLINE', 60)),
+    'RETRY_DELAY': float(os.environ.get('PARAGRAPH_INGEST_RETRY_DELAY', 5)),
+    'MAX_ATTEMPTS': int(os.environ.get('PARAGRAPH_INGEST_MAX_ATTEMPTS', 3)),
+    'LEASE': float(os.environ.get('PARAGRAPH_INGEST_LEASE', 300)),
+}
+
+# Pagination of /paragraph/search, clients choose the page size with `limit` up to MAX_PAGE_SIZE.
+# Streamed results are read from the database and written out STREAM_CHUNK_SIZE rows at a time.
+# BACKEND answers the queries, either Postgres full text search or an in-memory inverted index
+# ('paragraph.search.InvertedIndexSearchBackend') loaded from INDEX_SNAPSHOT when the file exists, which
+# looks for paragraphs added by other processes at most every INDEX_REFRESH_INTERVAL seconds, among the ids
+# above its highest id minus INDEX_REFRESH_WINDOW, as ids are not committed in order.
+# Ranked searches return the RANK_K best matches unless clients ask for `k` of them, up to MAX_PAGE_SIZE.
+# Batch searches run at most BATCH_MAX_QUERIES queries at once.
+# Word facets list the FACET_LIMIT most frequent words by default, counted over FACET_SAMPLE_SIZE matches
+# from a random id on when there are more, and are given up after FACET_TIMEOUT milliseconds.
+# Fuzzy searches also match up to FUZZY_EXPANSIONS corpus words per search word with a trigram similarity of at
+# least FUZZY_MIN_SIMILARITY, which cannot go below the 0.3 threshold of the trigram index.
+PARAGRAPH_SEARCH = {
+    'BACKEND': os.environ.get('PARAGRAPH_SEARCH_BACKEND', 'paragraph.search.PostgresSearchBackend'),
+    'INDEX_SNAPSHOT': os.environ.get('PARAGRAPH_SEARCH_INDEX_SNAPSHOT'),
+    'INDEX_REFRESH_INTERVAL': float(os.environ.get('PARAGRAPH_SEARCH_INDEX_REFRESH_INTERVAL', 1)),
+    'INDEX_REFRESH_WINDOW': int(os.environ.get('PARAGRAPH_SEARCH_INDEX_REFRESH_WINDOW', 1000)),
+    'PAGE_SIZE': int(os.environ.get('PARAGRAPH_SEARCH_PAGE_SIZE', 100)),
+    'MAX_PAGE_SIZE': int(os.environ.get('PARAGRAPH_SEARCH_MAX_PAGE_SIZE', 1000)),
+    'STREAM_CHUNK_SIZE': int(os.environ.get('PARAGRAPH_SEARCH_STREAM_CHUNK_SIZE', 500)),
+    'RANK_K': int(os.environ.get('PARAGRAPH_SEARCH_RANK_K', 10)),
+    'BATCH_MAX_QUERIES': int(os.environ.get('PARAGRAPH_SEARCH_BATCH_MAX_QUERIES', 100)),
+    'FACET_LIMIT': int(os.environ.get('PARAGRAPH_SEARCH_FACET_LIMIT', 10)),
+    'FACET_SAMPLE_SIZE': int(os.environ.get('PARAGRAPH_SEARCH_FACET_SAMPLE_SIZE', 10000)),
+    'FACET_TIMEOUT': int(os.environ.get('PARAGRAPH_SEARCH_FACET_TIMEOUT', 1000)),
+    'FUZZY_EXPANSIONS': int(os.environ.get('PARAGRAPH_SEARCH_FUZZY_EXPANSIONS', 5)),
+    'FUZZY_MIN_SIMILARITY': float(os.environ.get('PARAGRAPH_SEARCH_FUZZY_MIN_SIMILARITY', 0.3)),
+}
+
+# Ids of the paragraphs matching a search, cached in the CACHES entry named ALIAS for TIMEOUT seconds and
+# invalidated whenever paragraphs are added or removed. Searches matching more than MAX_IDS paragraphs are
+# not cached.
+PARAGRAPH_SEARCH_CACHE = {
+    'ENABLED': os.environ.get('PARAGRAPH_SEARCH_CACHE_ENABLED', '1') == '1',
+    'ALIAS': 'search',
+    'TIMEOUT': int(os.environ.get('PARAGRAPH_SEARCH_CACHE_TIMEOUT', 300)),
+    'MAX_IDS': int(os.environ.get('PARAGRAPH_SEARCH_CACHE_MAX_IDS', 10000)),
+}
+
+# Near-duplicate detection with MinHash signatures of SHINGLE_SIZE word shingles, cut into BANDS bands of ROWS
+# values for locality sensitive hashing. Paragraphs at least DUPLICATE_THRESHOLD similar to a stored one are not
+# ingested when REJECT_DUPLICATES is set. /paragraph/<id>/similar returns up to SIMILAR_LIMIT paragraphs at least
+# SIMILAR_THRESHOLD similar by default. Run the rebuild_paragraph_signatures command after changing the shape.
+PARAGRAPH_SIMILARITY = {
+    'BANDS': int(os.environ.get('PARAGRAPH_SIMILARITY_BANDS', 32)),
+    'ROWS': int(os.environ.get('PARAGRAPH_SIMILARITY_ROWS', 4)),
+    'SHINGLE_SIZE': int(os.environ.get('PARAGRAPH_SIMILARITY_SHINGLE_SIZE', 3)),
+    'REJECT_DUPLICATES': os.environ.get('PARAGRAPH_SIMILARITY_REJECT_DUPLICATES', '1') == '1',
+    'DUPLICATE_THRESHOLD': float(os.environ.get('PARAGRAPH_SIMILARITY_DUPLICATE_THRESHOLD', 0.9)),
+    'SIMILAR_THRESHOLD': float(os.environ.get('PARAGRAPH_SIMILARITY_SIMILAR_THRESHOLD', 0.5)),
+    'SIMILAR_LIMIT': int(os.environ.get('PARAGRAPH_SIMILARITY_SIMILAR_LIMIT', 10)),
+}
+
+# Search and dictionary responses carry an ETag derived from the corpus and may be reused by clients and
+# reverse proxies for MAX_AGE seconds before being revalidated.
+HTTP_CACHE = {
+    'MAX_AGE': int(os.environ.get('HTTP_CACHE_MAX_AGE', 10)),
+}
+
+# Latency, SQL and upstream metrics of every request, served on /metrics in the Prometheus text format.
+# Requests slower than SLOW_REQUEST_MS milliseconds are logged with their SLOW_REQUEST_QUERIES slowest
+# SQL queries and, if SLOW_REQUEST_EXPLAIN is set, the plan of the slowest one. 0 disables the log.
+REQUEST_METRICS = {
+    'ENABLED': os.environ.get('REQUEST_METRICS_ENABLED', '1') == '1',
+    'SLOW_REQUEST_MS': float(os.environ.get('REQUEST_METRICS_SLOW_REQUEST_MS', 0)),
+    'SLOW_REQUEST_QUERIES': int(os.environ.get('REQUEST_METRICS_SLOW_REQUEST_QUERIES', 5)),
+    'SLOW_REQUEST_EXPLAIN': os.environ.get('REQUEST_METRICS_SLOW_REQUEST_EXPLAIN', '1') == '1',
+}
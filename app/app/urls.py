@@ -21,6 +21,8 @@ from drf_spectacular.views import (
 from django.contrib import admin
 from django.urls import path, include
 
+from core.views import MetricsView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('schema/', SpectacularAPIView.as_view(), name='api-schema'),
@@ -30,4 +32,5 @@ urlpatterns = [
         name='api-docs',
     ),
     path('paragraph/', include('paragraph.urls')),
+    path('metrics', MetricsView.as_view(), name='metrics'),
 ]
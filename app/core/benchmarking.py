@@ -0,0 +1,164 @@
+"""
+Helpers shared by the benchmark and load test commands: latency summaries, the git commit of the reports, and a
+local stand-in for the external APIs, serving canned responses with injected latency, also used by the tests.
+"""
+import json
+import multiprocessing
+import statistics
+import subprocess
+import threading
+import time
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer,
+)
+
+from django.conf import settings
+
+DEFINITION_PATH = '/api/v2/entries/en/'
+PARAGRAPH_PATH = '/paragraphs/1/50'
+
+
+def percentile(samples, fraction):
+    """Return the value below which `fraction` of the sorted `samples` fall."""
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+def summarize(samples):
+    """Return the percentiles and mean of latency `samples`, in milliseconds."""
+    samples = sorted(samples)
+    return {
+        'p50_ms': round(percentile(samples, 0.50), 3),
+        'p95_ms': round(percentile(samples, 0.95), 3),
+        'p99_ms': round(percentile(samples, 0.99), 3),
+        'mean_ms': round(statistics.mean(samples), 3),
+    }
+
+
+def get_commit():
+    """Return the git commit of the working tree, or None outside of a git checkout."""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, check=True, text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class UpstreamStubHandler(BaseHTTPRequestHandler):
+    """Answer like metaphorpsum.com and dictionaryapi.dev, delaying or failing as configured on the server."""
+
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle's algorithm would hold the body back until they are acked.
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.requests.append(self.path)
+            server.connections.add(self.client_address)
+        key = self.path[len(DEFINITION_PATH):] if self.path.startswith(DEFINITION_PATH) else self.path
+
+        time.sleep(server.delays.get(key, server.delay))
+        with server.lock:
+            status = server.statuses.get(key, 200)
+            # A list of statuses is answered in order, repeating the last one.
+            if isinstance(status, list):
+                status = status.pop(0) if len(status) > 1 else status[0]
+
+        if self.path.startswith(DEFINITION_PATH):
+            if status == 404:
+                body = {"title": "No Definitions Found", "message": "", "resolution": ""}
+            else:
+                body = [{"word": key, "meanings": []}]
+            self._send(status, json.dumps(body).encode(), 'application/json')
+        elif self.path == PARAGRAPH_PATH:
+            self._send(status, server.paragraph.encode(), 'text/plain')
+        else:
+            self._send(404, b'', 'text/plain')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class UpstreamStub(ThreadingHTTPServer):
+    """Stub server running in a background thread, use as a context manager."""
+
+    daemon_threads = True
+    block_on_close = False
+    request_queue_size = 1024
+
+    def __init__(self, delay=0.0):
+        super().__init__(('127.0.0.1', 0), UpstreamStubHandler)
+        self.delay = delay
+        self.delays = {}
+        self.statuses = {}
+        self.paragraph = 'stub paragraph text'
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def handle_error(self, request, client_address):
+        # Clients giving up on slow responses are expected, not worth a traceback.
+        pass
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+        self.server_close()
+
+
+def _serve(delay, connection):
+    with UpstreamStub(delay=delay) as stub:
+        connection.send(stub.server_address[1])
+        # Serve until the parent process asks to stop, or exits.
+        try:
+            connection.recv()
+        except EOFError:
+            pass
+
+
+class UpstreamStubProcess:
+    """
+    Stub server running in a child process, use as a context manager.
+
+    Load tests run the stub apart from the server they load, so that its threads do not compete with it for the GIL.
+    """
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.port = None
+        self._connection = None
+        self._process = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.port}'
+
+    def __enter__(self):
+        context = multiprocessing.get_context('spawn')
+        self._connection, child_connection = context.Pipe()
+        self._process = context.Process(target=_serve, args=(self.delay, child_connection), daemon=True)
+        self._process.start()
+        self.port = self._connection.recv()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._connection.send(None)
+        self._process.join(timeout=5)
+        if self._process.is_alive():
+            self._process.terminate()
@@ -0,0 +1,49 @@
+"""
+Corpus generation counter, bumped whenever paragraphs are added or removed.
+
+The counter is a Postgres sequence, so bumping it never blocks or conflicts with concurrent writers, and reading it
+is a single-row lookup. Caches of data derived from the paragraphs key their entries by generation, which makes
+stale entries unreachable as soon as the corpus changes. When paragraphs are sharded, every shard has its own
+counter and the generation of the corpus is their sum.
+"""
+from django.db import (
+    connections,
+    router,
+    transaction,
+)
+
+from core import sharding
+
+SEQUENCE_NAME = 'core_corpus_generation'
+
+
+def _alias(using):
+    from core.models import Paragraph
+    return using or router.db_for_write(Paragraph)
+
+
+def get_generation(using=None):
+    """Return the current generation of the corpus, or of the paragraphs stored in `using`."""
+    if using is None and sharding.is_sharded():
+        return sum(get_generation(alias) for alias in sharding.get_shards())
+    with connections[_alias(using)].cursor() as cursor:
+        # The sequence reports its start value until it is first bumped, count that as generation 0.
+        cursor.execute(f'SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM {SEQUENCE_NAME}')
+        return cursor.fetchone()[0]
+
+
+def bump_generation(using=None):
+    """
+    Advance the generation of the corpus, from within the transaction writing paragraphs.
+
+    The sequence is bumped immediately and again once the transaction commits. Readers seeing the first bump
+    before the commit may cache results without the new writes, the second bump makes those entries unreachable.
+    """
+    alias = _alias(using)
+
+    def bump():
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT nextval(%s)', [SEQUENCE_NAME])
+
+    bump()
+    transaction.on_commit(bump, using=alias)
@@ -0,0 +1,105 @@
+"""
+Django command to compare the accuracy, speed and memory of the common words estimates with exact counting.
+"""
+import json
+import time
+import tracemalloc
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core import topk
+from core.models import tokenize
+
+
+def measure(count):
+    """Return the result of `count()`, the seconds it took and the peak memory it allocated, traced in a second run."""
+    started = time.perf_counter()
+    result = count()
+    seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        count()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, seconds, peak
+
+
+class Command(BaseCommand):
+    """
+    Django command to count the words of the stored paragraphs exactly, with a `Counter`, then with `core.topk`
+    summaries of every `--capacity`, and report how well the summaries find the `--top` most common words.
+
+    Both are timed and have their peak memory traced in this process, so summaries are counted in process for
+    the comparison. With `--processes`, summaries are timed again on a pool of that many processes.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--capacity', type=int, action='append',
+                            help='Number of words kept in the summary. Repeat for several capacities.')
+        parser.add_argument('--top', type=int, default=10, help='Number of most common words compared.')
+        parser.add_argument('--chunk-size', type=int, default=settings.COMMON_WORDS['CHUNK_SIZE'],
+                            help='Number of paragraphs fetched from the database and counted at a time.')
+        parser.add_argument('--processes', type=int, default=1, help='Number of processes counting words.')
+        parser.add_argument('--output', help='Write the report to this file instead of the standard output.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        capacities = options['capacity'] or [100, 1000, 10000]
+        top = options['top']
+        chunk_size = options['chunk_size']
+        if min(capacities) < top or top < 1 or chunk_size < 1:
+            raise CommandError('--top must be positive and no larger than any --capacity.')
+
+        def count_exactly():
+            counter = Counter()
+            for text in topk.corpus_texts(chunk_size):
+                counter.update(tokenize(text))
+            return counter
+
+        exact, seconds, peak = measure(count_exactly)
+        expected = [word for word, count in sorted(exact.items(), key=lambda item: (-item[1], item[0]))[:top]]
+        report = {
+            'words': sum(exact.values()),
+            'distinct_words': len(exact),
+            'top': top,
+            'exact': {'seconds': round(seconds, 3), 'peak_bytes': peak},
+        }
+
+        for capacity in capacities:
+            summary, seconds, peak = measure(
+                lambda: topk.count_words(topk.corpus_texts(chunk_size), capacity, chunk_size),
+            )
+            hitters = summary.top(top)
+            result = {
+                'seconds': round(seconds, 3),
+                'peak_bytes': peak,
+                'counters': len(summary),
+                'recall': len({hitter.word for hitter in hitters} & set(expected)) / len(expected) if expected else 1,
+                'max_overcount': max([hitter.count - exact[hitter.word] for hitter in hitters], default=0),
+                'max_error_bound': max([hitter.error for hitter in hitters], default=0),
+                'guaranteed': sum(hitter.guaranteed for hitter in hitters),
+                'bounds_hold': all(
+                    summary.counts[word] - summary.errors[word] <= exact[word] <= summary.counts[word]
+                    for word in summary.counts
+                ) and all(count <= summary.floor for word, count in exact.items() if word not in summary.counts),
+            }
+            if options['processes'] > 1:
+                started = time.perf_counter()
+                topk.count_words(topk.corpus_texts(chunk_size), capacity, chunk_size, options['processes'])
+                result['parallel_seconds'] = round(time.perf_counter() - started, 3)
+            report[f'capacity_{capacity}'] = result
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote the report to {options['output']}."))
+        else:
+            self.stdout.write(output)
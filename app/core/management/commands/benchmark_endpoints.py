@@ -0,0 +1,242 @@
+"""
+Django command to measure the latency, SQL queries and memory of the paragraph endpoints.
+"""
+import json
+import random
+import time
+import tracemalloc
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connection
+from django.test import (
+    Client,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from core.benchmarking import (
+    get_commit,
+    summarize,
+)
+from core.models import (
+    SEARCH_CONFIG,
+    Paragraph,
+    WordFrequency,
+)
+from paragraph import cache
+
+# Words matching a search, the most frequent for broad searches and the least frequent for narrow ones. Stop words
+# are left out, they never match.
+WORD_POOL_SQL = """
+    SELECT word FROM core_wordfrequency WHERE numnode(plainto_tsquery(%s, word)) > 0
+    ORDER BY doc_count {order}, word LIMIT %s
+"""
+
+
+class QueryTimer:
+    """Database execute wrapper counting the queries run and the time spent in them."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    """
+    Django command to drive the search and dictionary endpoints through the Django test client.
+
+    Each scenario sends `--requests` requests after `--warmup` unmeasured ones and reports the latency percentiles,
+    the number and duration of the SQL queries per request and the peak memory allocated by a request, measured
+    with `tracemalloc` over `--memory-samples` separate requests so tracing does not slow the timed ones. Search
+    scenarios combine each operator with few or many words drawn from the most (broad) or least (narrow) frequent
+    words of the corpus. The report is written as JSON, with the git commit, so runs can be compared across
+    commits, and compared to the report of an earlier run given with `--baseline`.
+
+    Definitions missing from the cache are fetched from the dictionary API during the warmup of the dictionary
+    scenario. Scenarios whose first warmup request fails are reported with its status code instead of being timed.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100, help='Number of measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=5, help='Number of unmeasured requests per scenario.')
+        parser.add_argument('--memory-samples', type=int, default=10,
+                            help='Number of requests per scenario traced for their peak memory.')
+        parser.add_argument('--few', type=int, default=2, help='Number of words of the few words scenarios.')
+        parser.add_argument('--many', type=int, default=6, help='Number of words of the many words scenarios.')
+        parser.add_argument('--pool', type=int, default=200,
+                            help='Number of most or least frequent words the search words are drawn from.')
+        parser.add_argument('--cold', action='store_true',
+                            help='Empty the search result cache before every request.')
+        parser.add_argument('--scenario', action='append',
+                            help='Only run the scenarios whose name starts with this prefix. Repeatable.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random word picks.')
+        parser.add_argument('--output', help='Write the report to this file instead of the standard output.')
+        parser.add_argument('--baseline', help='Report of an earlier run to compare the latencies with.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['requests'] < 1:
+            raise CommandError('--requests must be positive.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        scenarios = self._get_scenarios(options)
+        if options['scenario']:
+            scenarios = {
+                name: scenario for name, scenario in scenarios.items()
+                if any(name.startswith(prefix) for prefix in options['scenario'])
+            }
+        if not scenarios:
+            raise CommandError('No scenario to run.')
+
+        report = {
+            'commit': get_commit(),
+            'created': timezone.now().isoformat(),
+            'paragraphs': Paragraph.objects.count(),
+            'words': WordFrequency.objects.count(),
+            'search_backend': settings.PARAGRAPH_SEARCH['BACKEND'],
+            'search_cache': settings.PARAGRAPH_SEARCH_CACHE['ENABLED'] and not options['cold'],
+            'scenarios': {},
+        }
+        # The test client sends requests for the "testserver" host.
+        with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+            client = Client(raise_request_exception=False)
+            for name, scenario in scenarios.items():
+                cache.search_results.clear()
+                cache.definitions.clear()
+                report['scenarios'][name] = self._run(client, scenario, options)
+
+        if baseline is not None:
+            report['baseline'] = {'commit': baseline.get('commit'), 'ratios': self._compare(report, baseline)}
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote the report to {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    def _get_word_pool(order, size):
+        with connection.cursor() as cursor:
+            cursor.execute(WORD_POOL_SQL.format(order=order), [SEARCH_CONFIG, size])
+            return [word for word, in cursor.fetchall()]
+
+    def _get_scenarios(self, options):
+        """Return the scenarios by name, as functions returning the path, query and headers of a request."""
+        rng = random.Random(options['seed'])
+        pools = {
+            'broad': self._get_word_pool('DESC', options['pool']),
+            'narrow': self._get_word_pool('ASC', options['pool']),
+        }
+        if not pools['broad']:
+            raise CommandError('No words to search for, store some paragraphs first.')
+        search_path = reverse('paragraph:paragraph-list')
+
+        def search(operator, count, pool, **params):
+            def request():
+                words = rng.sample(pools[pool], min(count, len(pools[pool])))
+                return search_path, {'words': ','.join(words), 'operator': operator, **params}, {}
+            return request
+
+        scenarios = {}
+        for operator in ('and', 'or'):
+            for size in ('few', 'many'):
+                for pool in ('broad', 'narrow'):
+                    scenarios[f'search_{operator}_{size}_{pool}'] = search(operator, options[size], pool)
+        scenarios['search_ranked'] = search('or', options['few'], 'broad', rank='true')
+        scenarios['search_facets'] = search('or', options['few'], 'broad', facets='words')
+
+        revalidated = {'words': ','.join(pools['broad'][:options['few']]), 'operator': 'or'}
+        etags = []
+
+        def revalidate():
+            # The ETag is fetched once, by the first warmup request.
+            if not etags:
+                etags.append(Client().get(search_path, revalidated).get('ETag', ''))
+            return search_path, revalidated, {'HTTP_IF_NONE_MATCH': etags[0]}
+        scenarios['search_revalidate'] = revalidate
+        scenarios['dictionary'] = lambda: (reverse('paragraph:dict'), {}, {})
+        return scenarios
+
+    @staticmethod
+    def _request(client, scenario, cold):
+        if cold:
+            cache.search_results.clear()
+        path, query, headers = scenario()
+        response = client.get(path, query, **headers)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def _run(self, client, scenario, options):
+        cold = options['cold']
+        for index in range(options['warmup']):
+            response = self._request(client, scenario, cold)
+            if index == 0 and response.status_code not in (200, 304):
+                return {'error': f'HTTP {response.status_code} during warmup'}
+
+        latencies = []
+        query_counts = []
+        sql_times = []
+        errors = 0
+        for _ in range(options['requests']):
+            timer = QueryTimer()
+            with connection.execute_wrapper(timer):
+                started = time.perf_counter()
+                response = self._request(client, scenario, cold)
+                latencies.append((time.perf_counter() - started) * 1000)
+            errors += response.status_code not in (200, 304)
+            query_counts.append(timer.count)
+            sql_times.append(timer.seconds * 1000)
+
+        peak = 0
+        tracemalloc.start()
+        try:
+            for _ in range(options['memory_samples']):
+                tracemalloc.reset_peak()
+                current = tracemalloc.get_traced_memory()[0]
+                self._request(client, scenario, cold)
+                peak = max(peak, tracemalloc.get_traced_memory()[1] - current)
+        finally:
+            tracemalloc.stop()
+
+        return {
+            'requests': len(latencies),
+            'errors': errors,
+            **summarize(latencies),
+            'queries_mean': round(sum(query_counts) / len(query_counts), 2),
+            'queries_max': max(query_counts),
+            'sql_mean_ms': round(sum(sql_times) / len(sql_times), 3),
+            'peak_memory_kib': round(peak / 1024, 1) if options['memory_samples'] else None,
+        }
+
+    @staticmethod
+    def _compare(report, baseline):
+        """Return the ratios of the latency percentiles of each scenario to those of the baseline."""
+        ratios = {}
+        for name, results in report['scenarios'].items():
+            previous = baseline.get('scenarios', {}).get(name)
+            if previous is None or 'error' in previous or 'error' in results:
+                continue
+            ratios[name] = {
+                key: round(results[key] / previous[key], 3) if previous[key] else None
+                for key in ('p50_ms', 'p95_ms', 'p99_ms')
+            }
+        return ratios
@@ -0,0 +1,70 @@
+"""
+Django command to compare the latency of the search backends.
+"""
+import json
+import random
+import time
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core.benchmarking import summarize
+from core.models import (
+    Paragraph,
+    WordFrequency,
+)
+from paragraph.search import (
+    InvertedIndexSearchBackend,
+    PostgresSearchBackend,
+)
+
+
+class Command(BaseCommand):
+    """
+    Django command to time the same random queries against the SQL and the in-memory search backends.
+
+    Each query fetches the ids of the first page of results, like `/paragraph/search` does.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=200, help='Number of queries per operator.')
+        parser.add_argument('--words', type=int, default=2, help='Number of words per query.')
+        parser.add_argument('--vocabulary', type=int, default=1000, help='Pick words among the N most frequent.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random word picks.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        vocabulary = list(
+            WordFrequency.objects.order_by('-count', 'word').values_list('word', flat=True)[:options['vocabulary']]
+        )
+        if not vocabulary:
+            raise CommandError('No words to query, store some paragraphs first.')
+
+        rng = random.Random(options['seed'])
+        queries = [
+            (operator, rng.sample(vocabulary, min(options['words'], len(vocabulary))))
+            for operator in ('and', 'or')
+            for _ in range(options['queries'])
+        ]
+
+        index_backend = InvertedIndexSearchBackend()
+        started = time.monotonic()
+        index_backend.index
+        build_seconds = time.monotonic() - started
+
+        page_size = settings.PARAGRAPH_SEARCH['PAGE_SIZE']
+        report = {'paragraphs': Paragraph.objects.count(), 'index_build_seconds': round(build_seconds, 3)}
+        for name, backend in (('postgres', PostgresSearchBackend()), ('inverted_index', index_backend)):
+            latencies = {'and': [], 'or': []}
+            for operator, words in queries:
+                started = time.monotonic()
+                paragraphs = backend.filter(Paragraph.objects.all(), words, operator).order_by('id')
+                list(paragraphs.values_list('id', flat=True)[:page_size])
+                latencies[operator].append((time.monotonic() - started) * 1000)
+
+            report[name] = {operator: summarize(samples) for operator, samples in latencies.items()}
+
+        self.stdout.write(json.dumps(report, indent=4))
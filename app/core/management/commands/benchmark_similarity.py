@@ -0,0 +1,139 @@
+"""
+Django command to measure the recall and latency of the MinHash LSH similarity lookups.
+"""
+import json
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core import minhash
+from core.benchmarking import summarize
+from core.models import (
+    Paragraph,
+    ParagraphSignature,
+)
+
+
+class Command(BaseCommand):
+    """
+    Django command to compare LSH lookups of similar paragraphs with an exhaustive scan.
+
+    Random stored paragraphs are looked up against all the others. The paragraphs whose exact Jaccard similarity
+    of word shingles reaches `--threshold` are found by comparing every pair, then each band/row shape is timed on
+    an in-memory LSH index and scored by the share of them it finds. The stored index of the configured shape is
+    timed as well.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=100, help='Number of paragraphs looked up.')
+        parser.add_argument('--threshold', type=float, default=0.5, help='Minimum Jaccard similarity.')
+        parser.add_argument(
+            '--shape',
+            action='append',
+            help='Band and row counts to evaluate as BANDSxROWS, e.g. 32x4. Repeat for several shapes.',
+        )
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random paragraph picks.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        shapes = []
+        for shape in options['shape'] or ['16x8', '32x4', '64x2']:
+            try:
+                bands, rows = (int(value) for value in shape.split('x'))
+            except ValueError:
+                raise CommandError(f"Invalid shape '{shape}', expected BANDSxROWS.")
+            shapes.append((bands, rows))
+
+        shingle_size = settings.PARAGRAPH_SIMILARITY['SHINGLE_SIZE']
+        paragraphs = [
+            (paragraph_id, text) for paragraph_id, text in Paragraph.objects.order_by('id').values_list('id', 'text')
+            if len(minhash.shingle_hashes(text, shingle_size))
+        ]
+        if len(paragraphs) < 2:
+            raise CommandError('Not enough paragraphs to compare, store some paragraphs first.')
+
+        rng = random.Random(options['seed'])
+        queries = rng.sample(range(len(paragraphs)), min(options['queries'], len(paragraphs)))
+        threshold = options['threshold']
+
+        # Exhaustive scan, the ground truth.
+        shingles = [set(minhash.shingle_hashes(text, shingle_size).tolist()) for paragraph_id, text in paragraphs]
+        expected = {}
+        latencies = []
+        for query in queries:
+            started = time.monotonic()
+            expected[query] = {
+                other for other, other_shingles in enumerate(shingles)
+                if other != query
+                and len(shingles[query] & other_shingles) >= threshold * len(shingles[query] | other_shingles)
+            }
+            latencies.append((time.monotonic() - started) * 1000)
+        relevant = sum(len(matches) for matches in expected.values())
+
+        report = {
+            'paragraphs': len(paragraphs),
+            'queries': len(queries),
+            'threshold': threshold,
+            'similar_pairs': relevant,
+            'exhaustive': summarize(latencies),
+        }
+        for bands, rows in shapes:
+            report[f'lsh_{bands}x{rows}'] = self._evaluate(paragraphs, queries, expected, bands, rows, threshold)
+
+        # The stored index, as read by /paragraph/<id>/similar.
+        latencies = []
+        for query in queries:
+            paragraph_id = paragraphs[query][0]
+            started = time.monotonic()
+            signature = ParagraphSignature.objects.filter(paragraph_id=paragraph_id) \
+                .values_list('signature', flat=True).first()
+            if signature is not None:
+                ParagraphSignature.objects.similar(
+                    minhash.from_bytes(signature), threshold, limit=len(paragraphs), exclude_id=paragraph_id,
+                )
+            latencies.append((time.monotonic() - started) * 1000)
+        report['lsh_database'] = summarize(latencies)
+
+        self.stdout.write(json.dumps(report, indent=4))
+
+    @staticmethod
+    def _evaluate(paragraphs, queries, expected, bands, rows, threshold):
+        started = time.monotonic()
+        signatures = np.stack([minhash.signature(text, bands, rows) for paragraph_id, text in paragraphs])
+        buckets = defaultdict(list)
+        for position, signature in enumerate(signatures):
+            for band, bucket in enumerate(minhash.band_buckets(signature, bands, rows).tolist()):
+                buckets[(band, bucket)].append(position)
+        build_seconds = time.monotonic() - started
+
+        latencies = []
+        candidates = 0
+        found = 0
+        for query in queries:
+            started = time.monotonic()
+            band_buckets = minhash.band_buckets(signatures[query], bands, rows).tolist()
+            matches = sorted({
+                position for band, bucket in enumerate(band_buckets) for position in buckets[(band, bucket)]
+                if position != query
+            })
+            scores = minhash.similarities(signatures[query], signatures[matches])
+            similar = {position for position, score in zip(matches, scores) if score >= threshold}
+            latencies.append((time.monotonic() - started) * 1000)
+
+            candidates += len(matches)
+            found += len(similar & expected[query])
+
+        relevant = sum(len(matches) for matches in expected.values())
+        return {
+            'build_seconds': round(build_seconds, 3),
+            'recall': round(found / relevant, 4) if relevant else None,
+            'mean_candidates': round(candidates / len(queries), 1),
+            **summarize(latencies),
+        }
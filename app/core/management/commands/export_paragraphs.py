@@ -0,0 +1,88 @@
+"""
+Django command to dump the stored paragraphs to a file with COPY.
+"""
+import io
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import sharding
+from core.management.commands.import_paragraphs import (
+    FORMATS,
+    get_format,
+    rate,
+)
+from core.models import Paragraph
+
+# Rows are built by Postgres and written out as is: the CSV format of COPY only quotes values holding its
+# delimiter, quote character or line breaks, and neither JSON nor the flattened text holds any of them.
+COPY_SQL = {
+    'ndjson': "SELECT json_build_object('id', id, 'text', text) FROM {table} ORDER BY id",
+    'text': r"SELECT regexp_replace(text, '[\r\n\x01\x02]+', ' ', 'g') FROM {table} ORDER BY id",
+}
+COPY_OPTIONS = "FORMAT csv, DELIMITER E'\\x02', QUOTE E'\\x01'"
+
+
+class ProgressWriter(io.TextIOBase):
+    """Text stream passing what COPY writes on to `write`, reporting the rows written every `every` rows."""
+
+    def __init__(self, write, report, every):
+        self._write = write
+        self._report = report
+        self.every = every
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def write(self, data):
+        self._write(data)
+        rows = self.rows + data.count('\n')
+        if rows // self.every > self.rows // self.every:
+            self._report(f'Wrote {rows} paragraphs ({rate(rows, time.perf_counter() - self.started)}).')
+        self.rows = rows
+        return len(data)
+
+
+class Command(BaseCommand):
+    """
+    Django command to write the stored paragraphs to an NDJSON file, one `{"id": ..., "text": ...}` object per
+    line, or to a plain text file, one paragraph per line with its line breaks replaced by spaces.
+
+    Rows are serialized by Postgres and streamed from `COPY` to the file, in id order. When paragraphs are sharded,
+    the shards are written one after the other. Progress is reported on the standard error when writing to the
+    standard output.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to write paragraphs to, "-" for the standard output.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Format of the file, NDJSON for .ndjson and .jsonl files and plain text otherwise.')
+        parser.add_argument('--progress-every', type=int, default=100000,
+                            help='Number of paragraphs written between progress reports.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        file_format = get_format(options['path'], options['format'])
+        sql = COPY_SQL[file_format].format(table=Paragraph._meta.db_table)
+
+        if options['path'] == '-':
+            log = self.stderr
+            writer = ProgressWriter(lambda data: self.stdout.write(data, ending=''), log.write,
+                                    max(options['progress_every'], 1))
+            self._copy(sql, writer)
+        else:
+            log = self.stdout
+            with open(options['path'], 'w', encoding='utf-8') as output:
+                writer = ProgressWriter(output.write, log.write, max(options['progress_every'], 1))
+                self._copy(sql, writer)
+
+        seconds = time.perf_counter() - writer.started
+        log.write(self.style.SUCCESS(
+            f'Exported {writer.rows} paragraphs in {seconds:.1f}s ({rate(writer.rows, seconds)}).'
+        ))
+
+    @staticmethod
+    def _copy(sql, writer):
+        for alias in sharding.get_shards():
+            with connections[alias].cursor() as cursor:
+                cursor.copy_expert(f'COPY ({sql}) TO STDOUT WITH ({COPY_OPTIONS})', writer)
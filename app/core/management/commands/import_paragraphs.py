@@ -0,0 +1,185 @@
+"""
+Django command to bulk load paragraphs from a file with COPY.
+"""
+import json
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import (
+    connections,
+    transaction,
+)
+
+from core import (
+    sharding,
+    signals,
+)
+from core.generation import bump_generation
+from core.models import (
+    Paragraph,
+    ParagraphSignature,
+    SignatureBucket,
+    WordFrequency,
+    copy_rows,
+)
+
+FORMATS = ('ndjson', 'text')
+
+# Indexes updated row by row during the import, much cheaper to build once afterwards.
+BULK_INDEXES = [
+    index.name for model in (Paragraph, SignatureBucket) for index in model._meta.indexes
+]
+
+
+def get_format(path, file_format):
+    """Return the format of the file at `path`: `file_format` if given, else NDJSON for .ndjson and .jsonl files."""
+    if file_format:
+        return file_format
+    return 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'text'
+
+
+def rate(rows, seconds):
+    return f'{rows / seconds if seconds > 0 else 0:.0f} rows/s'
+
+
+class Command(BaseCommand):
+    """
+    Django command to store the paragraphs of an NDJSON file, one `{"text": ...}` object per line, or of a plain
+    text file, one paragraph per line, without going through the ORM.
+
+    The file is read `--chunk-size` paragraphs at a time. Each chunk is allocated ids and sent to the shard of its
+    ids with `COPY`, in one transaction per shard, along with the signatures and word counts of its paragraphs, and
+    the corpus generation is advanced and `paragraphs_added` sent like for `bulk_create`, so an interrupted import
+    leaves the data derived from the paragraphs it stored consistent. Search vectors are computed by the database
+    trigger as rows are copied, as rewriting every row afterwards would write the table twice. Near-duplicates are
+    not rejected.
+
+    `--drop-indexes` drops the full text search and LSH bucket indexes before the import and builds them again
+    afterwards, even if the import fails. Searches are slow meanwhile, it is meant for loads into an idle database.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to read paragraphs from, "-" for the standard input.')
+        parser.add_argument('--format', choices=FORMATS,
+                            help='Format of the file, NDJSON for .ndjson and .jsonl files and plain text otherwise.')
+        parser.add_argument('--chunk-size', type=int, default=10000,
+                            help='Number of paragraphs copied per statement.')
+        parser.add_argument('--drop-indexes', action='store_true',
+                            help='Drop the search indexes during the import and rebuild them afterwards.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['chunk_size'] < 1:
+            raise CommandError('--chunk-size must be positive.')
+        file_format = get_format(options['path'], options['format'])
+
+        with self._open(options['path']) as lines:
+            texts = self._read(lines, file_format)
+            if options['drop_indexes']:
+                with self._dropped_indexes():
+                    imported, seconds = self._import(texts, options['chunk_size'])
+            else:
+                imported, seconds = self._import(texts, options['chunk_size'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} paragraphs in {seconds:.1f}s ({rate(imported, seconds)}).'
+        ))
+
+    @staticmethod
+    @contextmanager
+    def _open(path):
+        if path == '-':
+            yield sys.stdin
+            return
+        try:
+            lines = open(path, encoding='utf-8')
+        except FileNotFoundError:
+            raise CommandError(f'No such file: {path}')
+        with lines:
+            yield lines
+
+    @staticmethod
+    def _read(lines, file_format):
+        """Yield the text of every paragraph of `lines`, skipping blank lines."""
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            if file_format == 'text':
+                yield line.rstrip('\r\n')
+                continue
+            try:
+                text = json.loads(line)['text']
+            except (ValueError, TypeError, KeyError):
+                raise CommandError(f'Line {number} is not a JSON object with a "text" field.')
+            if not isinstance(text, str):
+                raise CommandError(f'Line {number} is not a JSON object with a "text" field.')
+            yield text
+
+    def _import(self, texts, chunk_size):
+        """Copy `texts` to the shards, returning the number of paragraphs imported and the time it took."""
+        aliases = set()
+        imported = 0
+        started = time.perf_counter()
+
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if not chunk:
+                break
+            paragraphs = [Paragraph(id=paragraph_id, text=text)
+                          for paragraph_id, text in zip(sharding.allocate_ids(len(chunk)), chunk)]
+            by_shard = defaultdict(list)
+            for paragraph in paragraphs:
+                by_shard[sharding.shard_for(paragraph.id)].append(paragraph)
+
+            for alias, shard_paragraphs in by_shard.items():
+                with transaction.atomic(using=alias):
+                    with connections[alias].cursor() as cursor:
+                        copy_rows(cursor, Paragraph._meta.db_table, ['id', 'text'],
+                                  [(paragraph.id, paragraph.text) for paragraph in shard_paragraphs])
+                    ParagraphSignature.objects.db_manager(alias).add_paragraphs(shard_paragraphs, copy=True)
+                    WordFrequency.objects.db_manager(alias).add_texts(paragraph.text for paragraph in shard_paragraphs)
+                    bump_generation(alias)
+                    signals.paragraphs_added.send(sender=Paragraph, paragraphs=shard_paragraphs, using=alias)
+                aliases.add(alias)
+
+            imported += len(chunk)
+            seconds = time.perf_counter() - started
+            self.stdout.write(f'Copied {imported} paragraphs ({rate(imported, seconds)}).')
+
+        for alias in aliases:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f'ANALYZE {Paragraph._meta.db_table}')
+        return imported, time.perf_counter() - started
+
+    @contextmanager
+    def _dropped_indexes(self):
+        """Drop the `BULK_INDEXES` of every shard, and create them again on the way out."""
+        definitions = {}
+        for alias in sharding.get_shards():
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    'SELECT indexname, indexdef FROM pg_indexes WHERE indexname = ANY(%s)', [BULK_INDEXES],
+                )
+                definitions[alias] = cursor.fetchall()
+                for name, definition in definitions[alias]:
+                    self.stdout.write(f'Dropping index {name} on {alias}...')
+                    cursor.execute(f'DROP INDEX {name}')
+        try:
+            yield
+        finally:
+            for alias, indexes in definitions.items():
+                with connections[alias].cursor() as cursor:
+                    # Indexes cannot be built while foreign key checks of earlier writes in a transaction are pending.
+                    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                    for name, definition in indexes:
+                        self.stdout.write(f'Building index {name} on {alias}...')
+                        started = time.perf_counter()
+                        cursor.execute(definition)
+                        self.stdout.write(f'Built index {name} in {time.perf_counter() - started:.1f}s.')
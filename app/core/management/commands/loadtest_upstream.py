@@ -0,0 +1,223 @@
+"""
+Django command to compare the throughput of the sync and async views waiting on the external APIs.
+"""
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from unittest.mock import patch
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+from django.db import connections
+from django.test import (
+    AsyncClient,
+    Client,
+    override_settings,
+)
+from django.test.utils import (
+    setup_databases,
+    teardown_databases,
+)
+from django.urls import reverse
+
+from core.benchmarking import (
+    DEFINITION_PATH,
+    PARAGRAPH_PATH,
+    UpstreamStubProcess,
+    get_commit,
+    summarize,
+)
+from core.models import Paragraph
+from paragraph import (
+    cache,
+    upstream,
+)
+
+# URL names of the sync and async views of each endpoint.
+ENDPOINTS = {
+    'get': ('paragraph:create', 'paragraph:async-create'),
+    'dictionary': ('paragraph:dict', 'paragraph:async-dict'),
+}
+MODES = ('async', 'sync_asgi', 'sync_threads')
+
+# Text of the paragraph stored in the temporary database, whose words the dictionary endpoint looks up.
+DICTIONARY_TEXT = 'river stone forest cloud meadow harbor lantern orchard canyon glacier'
+
+
+class Command(BaseCommand):
+    """
+    Django command to load the paragraph creation and dictionary endpoints, their answers waiting on a local stub of
+    the external APIs which delays every response by `--delay` seconds.
+
+    Each endpoint is served in each of three modes: `async` sends `--concurrency` concurrent requests at a time to
+    the async views through the ASGI handler, `sync_asgi` does the same with the sync views, which the ASGI handler
+    runs one at a time on its thread, and `sync_threads` sends requests to the sync views from `--threads` threads,
+    like a threaded WSGI server. The report gives the throughput and latency percentiles of each, as JSON.
+
+    Paragraphs are stored in a temporary database unless `--current-database` is given. Near-duplicates are not
+    rejected and definitions are not cached, so every request reaches the stub.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help='Number of measured requests per run.')
+        parser.add_argument('--warmup', type=int, default=5, help='Number of unmeasured requests per run.')
+        parser.add_argument('--concurrency', type=int, default=200,
+                            help='Number of requests in flight at once in the ASGI modes.')
+        parser.add_argument('--threads', type=int, default=20, help='Number of threads of the sync_threads mode.')
+        parser.add_argument('--delay', type=float, default=0.5, help='Seconds the stub waits before answering.')
+        parser.add_argument('--endpoint', action='append', choices=ENDPOINTS,
+                            help='Endpoint to load, all of them by default. Repeatable.')
+        parser.add_argument('--mode', action='append', choices=MODES,
+                            help='Mode to serve requests in, all of them by default. Repeatable.')
+        parser.add_argument('--current-database', action='store_true',
+                            help='Store paragraphs in the configured database instead of a temporary one.')
+        parser.add_argument('--output', help='Write the report to this file instead of the standard output.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['requests'] < 1 or options['concurrency'] < 1 or options['threads'] < 1:
+            raise CommandError('--requests, --concurrency and --threads must be positive.')
+
+        old_config = None
+        if not options['current_database']:
+            old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with UpstreamStubProcess(delay=options['delay']) as stub, self._settings(stub):
+                if old_config is not None:
+                    Paragraph.objects.create(text=DICTIONARY_TEXT)
+                report = self._run_all(options)
+        finally:
+            if old_config is not None:
+                connections.close_all()
+                teardown_databases(old_config, verbosity=0)
+
+        output = json.dumps(report, indent=4)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output + '\n')
+            self.stdout.write(self.style.SUCCESS(f"Wrote the report to {options['output']}."))
+        else:
+            self.stdout.write(output)
+
+    @staticmethod
+    @contextmanager
+    def _settings(stub):
+        """Point the API client at the stub and let every request reach it."""
+        overrides = override_settings(
+            # The test clients send requests for the "testserver" host.
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            PARAGRAPH_SIMILARITY={**settings.PARAGRAPH_SIMILARITY, 'REJECT_DUPLICATES': False},
+            DEFINITION_CACHE={**settings.DEFINITION_CACHE, 'TTL': 0, 'NEGATIVE_TTL': 0},
+        )
+        urls = patch.multiple(
+            'paragraph.api_client', PARAGRAPH_URL=stub.url + PARAGRAPH_PATH, DEFINITION_URL=stub.url + DEFINITION_PATH,
+        )
+        with overrides, urls:
+            upstream.client.reset()
+            try:
+                yield
+            finally:
+                upstream.client.reset()
+
+    def _run_all(self, options):
+        report = {
+            'commit': get_commit(),
+            'delay_s': options['delay'],
+            'concurrency': options['concurrency'],
+            'threads': options['threads'],
+            'runs': {},
+        }
+        for endpoint in options['endpoint'] or ENDPOINTS:
+            sync_url, async_url = (reverse(name) for name in ENDPOINTS[endpoint])
+            report['runs'][endpoint] = {}
+            for mode in options['mode'] or MODES:
+                cache.definitions.clear()
+                if mode == 'sync_threads':
+                    run = self._run_threads(sync_url, options)
+                else:
+                    run = asyncio.run(self._run_asgi(async_url if mode == 'async' else sync_url, options))
+                report['runs'][endpoint][mode] = run
+                self.stderr.write(f"{endpoint} {mode}: {run['throughput_rps']} requests/s")
+        return report
+
+    @staticmethod
+    def _summarize(latencies, statuses, elapsed):
+        return {
+            'requests': len(latencies),
+            'errors': sum(count for code, count in statuses.items() if code >= 400),
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'elapsed_s': round(elapsed, 3),
+            'throughput_rps': round(len(latencies) / elapsed, 1),
+            **summarize(latencies),
+        }
+
+    async def _run_asgi(self, url, options):
+        """Send the requests through the ASGI handler, `--concurrency` of them in flight at once."""
+        client = AsyncClient(raise_request_exception=False)
+        semaphore = asyncio.Semaphore(options['concurrency'])
+        latencies = []
+        statuses = Counter()
+
+        async def request():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.get(url)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses[response.status_code] += 1
+
+        try:
+            for _ in range(options['warmup']):
+                await client.get(url)
+            started = time.perf_counter()
+            await asyncio.gather(*[request() for _ in range(options['requests'])])
+            elapsed = time.perf_counter() - started
+        finally:
+            await upstream.client.aclose()
+            # The ORM ran on the thread of `sync_to_async`, its connection is not reused by the next run.
+            await sync_to_async(connections.close_all)()
+        return self._summarize(latencies, statuses, elapsed)
+
+    def _run_threads(self, url, options):
+        """Send the requests from `--threads` threads, each serving one request at a time."""
+        client = Client(raise_request_exception=False)
+        for _ in range(options['warmup']):
+            client.get(url)
+
+        latencies = []
+        statuses = Counter()
+        remaining = [options['requests']]
+        lock = threading.Lock()
+
+        def take():
+            with lock:
+                remaining[0] -= 1
+                return remaining[0] >= 0
+
+        def work():
+            thread_client = Client(raise_request_exception=False)
+            try:
+                while take():
+                    started = time.perf_counter()
+                    response = thread_client.get(url)
+                    latency = (time.perf_counter() - started) * 1000
+                    with lock:
+                        latencies.append(latency)
+                        statuses[response.status_code] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=work) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        return self._summarize(latencies, statuses, elapsed)
@@ -0,0 +1,61 @@
+"""
+Django command to run the worker processing the queued paragraph ingestions.
+"""
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from paragraph import ingest
+
+
+class Command(BaseCommand):
+    """
+    Django command to claim queued ingestion jobs in batches, fetch their paragraphs and store them.
+
+    Jobs are claimed with `SELECT ... FOR UPDATE SKIP LOCKED`, so any number of workers can run side by side. The
+    worker stops after the batch in progress on SIGINT or SIGTERM, or once the queue is empty with `--once`.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Number of jobs claimed at a time.')
+        parser.add_argument('--poll-interval', type=float, help='Seconds to wait for new jobs when idle.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is left to run.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        config = settings.PARAGRAPH_INGEST
+        batch_size = options['batch_size'] or config['CLAIM_BATCH']
+        poll_interval = options['poll_interval'] if options['poll_interval'] is not None else config['POLL_INTERVAL']
+
+        self.stopping = False
+        previous_handlers = {
+            signum: signal.signal(signum, self._stop) for signum in (signal.SIGINT, signal.SIGTERM)
+        }
+        worker = ingest.get_worker_name()
+        self.stdout.write(f'Worker {worker} waiting for ingestion jobs...')
+        processed = 0
+        try:
+            while not self.stopping:
+                # Long running workers must not hold on to connections the database closed or that are too old.
+                close_old_connections()
+                jobs = ingest.run_jobs(batch_size, worker)
+                for job in jobs:
+                    self.stdout.write(
+                        f'Job {job.id}: {job.status}, stored {job.stored} of {job.requested} paragraphs.'
+                    )
+                processed += len(jobs)
+                if not jobs:
+                    if options['once']:
+                        break
+                    time.sleep(poll_interval)
+        finally:
+            for signum, handler in previous_handlers.items():
+                signal.signal(signum, handler)
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} ingestion jobs.'))
+
+    def _stop(self, signum, frame):
+        self.stopping = True
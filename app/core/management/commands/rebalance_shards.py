@@ -0,0 +1,70 @@
+"""
+Django command to move paragraphs to the shard of their id, after shards were added.
+"""
+from collections import Counter
+
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core import sharding
+from core.models import Paragraph
+
+
+class Command(BaseCommand):
+    """
+    Django command to move the paragraphs stored on another shard than the one of their id, see `core.sharding`.
+
+    Every shard is scanned in id order, `--batch-size` paragraphs at a time. Misplaced paragraphs are inserted on
+    their shard, with their derived data, then deleted from the shard they were on, so searches keep finding them
+    while they move, at worst on both shards. Paragraphs already copied by an interrupted run are only deleted,
+    so the command can be run again until it moves nothing.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of paragraphs read at a time.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Count the misplaced paragraphs without moving them.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive.')
+
+        moves = Counter()
+        for source in sharding.get_shards():
+            self.stdout.write(f'Scanning {source}...')
+            last_id = 0
+            while True:
+                rows = list(
+                    Paragraph.objects.using(source).filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'text')[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                misplaced = [(paragraph_id, text) for paragraph_id, text in rows
+                             if sharding.shard_for(paragraph_id) != source]
+                for paragraph_id, text in misplaced:
+                    moves[source, sharding.shard_for(paragraph_id)] += 1
+                if misplaced and not options['dry_run']:
+                    self._move(source, misplaced)
+
+        verb = 'Would move' if options['dry_run'] else 'Moved'
+        for (source, target), count in sorted(moves.items()):
+            self.stdout.write(f'{verb} {count} paragraphs from {source} to {target}.')
+        self.stdout.write(self.style.SUCCESS(f'{verb} {sum(moves.values())} paragraphs.'))
+
+    @staticmethod
+    def _move(source, rows):
+        ids = [paragraph_id for paragraph_id, text in rows]
+        copied = set()
+        for target, target_ids in sharding.group_by_shard(ids).items():
+            copied.update(Paragraph.objects.using(target).filter(id__in=target_ids).values_list('id', flat=True))
+        # Inserted on the shard of their id, in one transaction per shard.
+        Paragraph.objects.bulk_create([
+            Paragraph(id=paragraph_id, text=text) for paragraph_id, text in rows if paragraph_id not in copied
+        ])
+        Paragraph.objects.using(source).filter(id__in=ids).delete()
@@ -0,0 +1,50 @@
+"""
+Django command to rebuild the MinHash signatures and LSH buckets of the stored paragraphs.
+"""
+from django.core.management.base import BaseCommand
+from django.db import (
+    connections,
+    transaction,
+)
+
+from core import sharding
+from core.models import (
+    Paragraph,
+    ParagraphSignature,
+    SignatureBucket,
+)
+
+
+class Command(BaseCommand):
+    """Django command to recompute the signatures of all paragraphs, e.g. after changing their shape."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of paragraphs fetched from the database per round trip.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write('Rebuilding paragraph signatures...')
+        chunk_size = options['chunk_size']
+        # Every shard signs its own paragraphs.
+        for alias in sharding.get_shards():
+            signatures = ParagraphSignature.objects.db_manager(alias)
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                # As for word frequencies, TRUNCATE makes concurrent writers wait for the rebuild to commit. It
+                # refuses to run while foreign key checks of earlier writes in the transaction are pending.
+                cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                cursor.execute(f'TRUNCATE {ParagraphSignature._meta.db_table}, {SignatureBucket._meta.db_table}')
+                chunk = []
+                rows = Paragraph.objects.using(alias).values_list('id', 'text').iterator(chunk_size=chunk_size)
+                for paragraph_id, text in rows:
+                    chunk.append(Paragraph(id=paragraph_id, text=text))
+                    if len(chunk) == chunk_size:
+                        signatures.add_paragraphs(chunk)
+                        chunk = []
+                signatures.add_paragraphs(chunk)
+
+            self.stdout.write(self.style.SUCCESS(f'Signed {signatures.count()} paragraphs on {alias}.'))
@@ -0,0 +1,42 @@
+"""
+Django command to rebuild the word frequency table from the stored paragraphs.
+"""
+from django.core.management.base import BaseCommand
+from django.db import (
+    connections,
+    transaction,
+)
+
+from core import sharding
+from core.models import (
+    Paragraph,
+    WordFrequency,
+)
+
+
+class Command(BaseCommand):
+    """Django command to recount the words of all paragraphs, e.g. after a bulk load."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Number of paragraphs fetched from the database per round trip.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        self.stdout.write('Rebuilding word frequencies...')
+        # Every shard counts the words of its own paragraphs.
+        for alias in sharding.get_shards():
+            with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+                # TRUNCATE holds an exclusive lock until commit, so paragraphs written concurrently
+                # apply their counts after the rebuild instead of being lost or counted twice.
+                cursor.execute(f'TRUNCATE {WordFrequency._meta.db_table}')
+                texts = Paragraph.objects.using(alias).values_list('text', flat=True) \
+                    .iterator(chunk_size=options['chunk_size'])
+                WordFrequency.objects.db_manager(alias).add_texts(texts)
+
+            count = WordFrequency.objects.using(alias).count()
+            self.stdout.write(self.style.SUCCESS(f'Counted {count} distinct words on {alias}.'))
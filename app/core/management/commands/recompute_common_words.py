@@ -0,0 +1,58 @@
+"""
+Django command to estimate the most common words of the corpus in bounded memory.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core.models import CommonWord
+
+
+class Command(BaseCommand):
+    """
+    Django command to recount the most common words of all paragraphs with `core.topk`, replacing the ones served
+    by `/paragraph/dictionary` when `COMMON_WORDS['SOURCE']` is 'sketch'.
+
+    Paragraphs are read `--chunk-size` at a time through server-side cursors and counted by `--processes`
+    processes in a Space-Saving summary of `--capacity` words. The `--limit` most common words are stored with
+    the bound of the error of their count, and the `--show` most common ones are printed.
+    """
+
+    def add_arguments(self, parser):
+        config = settings.COMMON_WORDS
+        parser.add_argument('--capacity', type=int, default=config['CAPACITY'],
+                            help='Number of words kept in the summary.')
+        parser.add_argument('--processes', type=int, default=config['PROCESSES'],
+                            help='Number of processes counting words.')
+        parser.add_argument('--chunk-size', type=int, default=config['CHUNK_SIZE'],
+                            help='Number of paragraphs fetched from the database and counted at a time.')
+        parser.add_argument('--limit', type=int, default=config['LIMIT'], help='Number of words stored.')
+        parser.add_argument('--show', type=int, default=10, help='Number of words printed.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        for option in ('capacity', 'processes', 'chunk_size', 'limit'):
+            if options[option] < 1:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive.")
+        if options['limit'] > options['capacity']:
+            raise CommandError('--limit cannot exceed --capacity.')
+
+        self.stdout.write('Counting words...')
+        started = time.perf_counter()
+        summary = CommonWord.objects.recompute(
+            options['capacity'], options['chunk_size'], options['processes'], options['limit'],
+        )
+        seconds = time.perf_counter() - started
+
+        for hitter in summary.top(options['show']):
+            count = f'{hitter.count - hitter.error} to {hitter.count}' if hitter.error else hitter.count
+            certainty = '' if hitter.guaranteed else ', may not be among the most common'
+            self.stdout.write(f'{hitter.word}: {count}{certainty}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Counted {summary.total} words in {seconds:.1f}s, kept {len(summary)}, words missing from the summary '
+            f'occur at most {summary.floor} times. Stored {CommonWord.objects.count()} common words.'
+        ))
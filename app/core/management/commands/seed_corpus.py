@@ -0,0 +1,110 @@
+"""
+Django command to store a synthetic corpus of paragraphs, for benchmarks at scale.
+"""
+import numpy as np
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from core import sharding
+from core.models import Paragraph
+
+# The most frequent words of the generated text, in rank order, like the articles, verbs and prepositions joining
+# the nouns and adjectives of metaphorpsum.com sentences.
+FUNCTION_WORDS = [
+    'the', 'a', 'is', 'of', 'to', 'and', 'are', 'in', 'that', 'as', 'an', 'be', 'their', 'we', 'they', 'can',
+    'with', 'from', 'our', 'this', 'by', 'his', 'her', 'one', 'no', 'some', 'was', 'it', 'without', 'though',
+]
+SYLLABLES = [
+    consonant + vowel
+    for consonant in ('b', 'c', 'd', 'f', 'g', 'l', 'm', 'n', 'p', 'r', 's', 't', 'v', 'w', 'z', 'br', 'st', 'tr')
+    for vowel in ('a', 'e', 'i', 'o', 'u', 'ea', 'ou')
+]
+
+
+def make_vocabulary(size, rng):
+    """Return `size` distinct words, the function words first and then made up words of 2 to 4 syllables."""
+    words = FUNCTION_WORDS[:size]
+    seen = set(words)
+    while len(words) < size:
+        word = ''.join(rng.choice(SYLLABLES, size=rng.integers(2, 5)))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def zipf_weights(size, exponent):
+    """Return the probabilities of the words of each rank under Zipf's law."""
+    weights = 1.0 / np.arange(1, size + 1) ** exponent
+    return weights / weights.sum()
+
+
+def make_texts(count, vocabulary, weights, sentences, sentence_words, rng):
+    """Return `count` paragraph texts of `sentences` sentences of `sentence_words` words drawn from `weights`."""
+    sentence_counts = rng.integers(sentences[0], sentences[1] + 1, size=count)
+    word_counts = rng.integers(sentence_words[0], sentence_words[1] + 1, size=int(sentence_counts.sum()))
+    ranks = iter(rng.choice(len(vocabulary), size=int(word_counts.sum()), p=weights).tolist())
+    word_counts = iter(word_counts.tolist())
+
+    texts = []
+    for sentence_count in sentence_counts.tolist():
+        text = []
+        for _ in range(sentence_count):
+            words = [vocabulary[next(ranks)] for _ in range(next(word_counts))]
+            text.append(' '.join(words).capitalize() + '.')
+        texts.append(' '.join(text))
+    return texts
+
+
+class Command(BaseCommand):
+    """
+    Django command to generate paragraphs offline and store them with bulk inserts.
+
+    Words are drawn from a made up vocabulary following Zipf's law, so a few words occur in most paragraphs and
+    most words in very few, as in natural text. Paragraphs are stored through `Paragraph.objects.bulk_create`, so
+    word frequencies, signatures and search indexes are maintained as for paragraphs fetched from the API. The
+    same seed and options always generate the same corpus.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paragraphs', type=int, default=10000, help='Number of paragraphs to store.')
+        parser.add_argument('--vocabulary', type=int, default=20000, help='Number of distinct words.')
+        parser.add_argument('--exponent', type=float, default=1.1, help='Exponent of the Zipf distribution.')
+        parser.add_argument('--sentences', type=int, nargs=2, default=[3, 6], metavar=('MIN', 'MAX'),
+                            help='Range of the number of sentences per paragraph.')
+        parser.add_argument('--sentence-words', type=int, nargs=2, default=[6, 14], metavar=('MIN', 'MAX'),
+                            help='Range of the number of words per sentence.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of paragraphs per transaction.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+        parser.add_argument('--clear', action='store_true', help='Delete the stored paragraphs first.')
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        for name in ('sentences', 'sentence_words'):
+            low, high = options[name]
+            if low < 1 or high < low:
+                raise CommandError(f"Invalid --{name.replace('_', '-')} range {low} {high}.")
+        if options['vocabulary'] < 1 or options['batch_size'] < 1:
+            raise CommandError('--vocabulary and --batch-size must be positive.')
+
+        if options['clear']:
+            self.stdout.write('Deleting stored paragraphs...')
+            for alias in sharding.get_shards():
+                Paragraph.objects.using(alias).all().delete()
+
+        rng = np.random.default_rng(options['seed'])
+        vocabulary = make_vocabulary(options['vocabulary'], rng)
+        weights = zipf_weights(len(vocabulary), options['exponent'])
+
+        stored = 0
+        while stored < options['paragraphs']:
+            count = min(options['batch_size'], options['paragraphs'] - stored)
+            texts = make_texts(count, vocabulary, weights, options['sentences'], options['sentence_words'], rng)
+            Paragraph.objects.bulk_create([Paragraph(text=text) for text in texts])
+            stored += count
+            if options['verbosity'] > 1:
+                self.stdout.write(f'Stored {stored}/{options["paragraphs"]} paragraphs.')
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {stored} synthetic paragraphs.'))
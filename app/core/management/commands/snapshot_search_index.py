@@ -0,0 +1,38 @@
+"""
+Django command to snapshot the in-memory search index to disk.
+"""
+import time
+
+from django.conf import settings
+from django.core.management.base import (
+    BaseCommand,
+    CommandError,
+)
+
+from paragraph.search import InvertedIndexSearchBackend
+
+
+class Command(BaseCommand):
+    """Django command to build the inverted index from the database and write it to a snapshot file."""
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=settings.PARAGRAPH_SEARCH.get('INDEX_SNAPSHOT'),
+            help='Snapshot file to write, defaults to the PARAGRAPH_SEARCH_INDEX_SNAPSHOT setting.',
+        )
+
+    def handle(self, *args, **options):
+        """Entrypoint for command."""
+        if not options['path']:
+            raise CommandError('No snapshot path given and PARAGRAPH_SEARCH_INDEX_SNAPSHOT is not set.')
+
+        self.stdout.write('Building search index...')
+        started = time.monotonic()
+        index = InvertedIndexSearchBackend().build()
+        index.dump(options['path'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {index.size} paragraphs and {len(index.postings)} lexemes '
+            f'into {options["path"]} in {time.monotonic() - started:.1f}s.'
+        ))
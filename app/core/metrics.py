@@ -0,0 +1,230 @@
+"""
+In-process metrics exposed on `/metrics` in the Prometheus text format.
+
+Metrics are kept per process, each worker serving its own. Histograms and counters are updated as requests are
+served, callbacks registered with `registry.register_callback` are read when the metrics are rendered.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """Metric whose samples are labelled with the values of `labels`."""
+
+    type = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labels):
+            raise ValueError(f'{self.name} is labelled with {self.labels}, got {tuple(labels)}.')
+        return tuple(labels[name] for name in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.extend(self._samples(list(zip(self.labels, key)), value))
+        return lines
+
+    def _samples(self, labels, value):
+        return [f'{self.name}{_format_labels(labels)} {_format_value(value)}']
+
+
+class Counter(Metric):
+    """Monotonically increasing count."""
+
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Histogram(Metric):
+    """Distribution of observed values, counted in cumulative buckets."""
+
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = (*sorted(float(bound) for bound in buckets), float('inf'))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def count(self, **labels):
+        with self._lock:
+            counts, total = self._values.get(self._key(labels), ([0], 0))
+        return counts[-1]
+
+    def _samples(self, labels, value):
+        counts, total = value
+        lines = [
+            f'{self.name}_bucket{_format_labels([*labels, ("le", _format_value(bound))])} {count}'
+            for bound, count in zip(self.buckets, counts)
+        ]
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(float(total))}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {counts[-1]}')
+        return lines
+
+
+class CallbackMetric(Metric):
+    """Metric read from a callback returning `(labels, value)` pairs, `labels` being a dict."""
+
+    def __init__(self, name, documentation, type, callback):
+        super().__init__(name, documentation)
+        self.type = type
+        self.callback = callback
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+        for labels, value in self.callback():
+            lines.extend(self._samples(sorted(labels.items()), value))
+        return lines
+
+
+class Registry:
+    """Metrics of the process, by name."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f'Metric {metric.name} is already registered.')
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def register_callback(self, name, documentation, type, callback):
+        return self.register(CallbackMetric(name, documentation, type, callback))
+
+    def clear(self):
+        """Reset the values of every metric."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for metric in metrics:
+            metric.clear()
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        return ''.join(line + '\n' for metric in metrics for line in metric.render())
+
+
+registry = Registry()
+
+REQUEST_DURATION = registry.histogram(
+    'http_request_duration_seconds', 'Time spent serving requests.', ['method', 'endpoint', 'status'],
+)
+REQUEST_STAGE_DURATION = registry.histogram(
+    'http_request_stage_duration_seconds', 'Time spent in a stage of serving requests.', ['endpoint', 'stage'],
+)
+REQUEST_QUERIES = registry.histogram(
+    'http_request_db_queries', 'Number of SQL queries run to serve a request.', ['endpoint'], QUERY_COUNT_BUCKETS,
+)
+QUERY_DURATION = registry.histogram(
+    'db_query_duration_seconds', 'Time spent running SQL queries.', ['endpoint'], QUERY_LATENCY_BUCKETS,
+)
+UPSTREAM_DURATION = registry.histogram(
+    'upstream_request_duration_seconds', 'Time spent in attempts of requests to the external APIs.', ['host'],
+)
+UPSTREAM_ERRORS = registry.counter(
+    'upstream_errors_total', 'Failed attempts of requests to the external APIs.', ['host', 'reason'],
+)
+
+
+class RequestState:
+    """Measurements of the request being served."""
+
+    def __init__(self):
+        self.endpoint = 'unmatched'
+        self.query_count = 0
+        self.query_seconds = 0.0
+        # `(seconds, sql, params, alias)` of the queries run, kept for the slow request log.
+        self.queries = []
+
+
+_request_state = ContextVar('request_state', default=None)
+
+
+def get_request_state():
+    """Return the measurements of the request being served, or None outside of requests."""
+    return _request_state.get()
+
+
+@contextmanager
+def track_request():
+    """Collect the measurements of a request in a new `RequestState`, returned by `get_request_state`."""
+    state = RequestState()
+    token = _request_state.set(state)
+    try:
+        yield state
+    finally:
+        _request_state.reset(token)
+
+
+@contextmanager
+def timer(stage):
+    """Time a stage of the request being served, like fetching definitions or serializing results."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        state = get_request_state()
+        if state is not None:
+            REQUEST_STAGE_DURATION.observe(time.perf_counter() - started, endpoint=state.endpoint, stage=stage)
@@ -0,0 +1,130 @@
+"""
+Middleware measuring the requests served, see `core.metrics`.
+"""
+import asyncio
+import logging
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import (
+    DatabaseError,
+    connections,
+)
+from django.utils.deprecation import MiddlewareMixin
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def record_query(execute, sql, params, many, context):
+    """Database execute wrapper adding the queries run while serving a request to its `RequestState`."""
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        seconds = time.perf_counter() - started
+        state = metrics.get_request_state()
+        if state is not None:
+            state.query_count += 1
+            state.query_seconds += seconds
+            metrics.QUERY_DURATION.observe(seconds, endpoint=state.endpoint)
+            if settings.REQUEST_METRICS['SLOW_REQUEST_MS'] and not many:
+                state.queries.append((seconds, sql, params, context['connection'].alias))
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Install `record_query` on a new database connection, receiver of the `connection_created` signal.
+
+    The wrapper stays installed for good rather than around each request: the queries of requests served by async
+    views run on other threads, through `sync_to_async`, which carry the `RequestState` of the request along.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class RequestMetricsMiddleware(MiddlewareMixin):
+    """
+    Record the latency, SQL queries and stage timings of every request, configured by the `REQUEST_METRICS` setting.
+
+    Requests are labelled with the name of the URL pattern they matched. Requests slower than `SLOW_REQUEST_MS`
+    are logged with their slowest SQL queries and, if `SLOW_REQUEST_EXPLAIN` is set, the plan of the slowest one.
+    The time spent streaming a response body is not measured. Both sync and async requests are supported, so async
+    views are not run on a thread under ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    @property
+    def config(self):
+        return settings.REQUEST_METRICS
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        if not self.config['ENABLED']:
+            return self.get_response(request)
+
+        with metrics.track_request() as state:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            duration = time.perf_counter() - started
+
+        if self._record(request, response, duration, state):
+            self._log_slow_request(request, response, duration, state)
+        return response
+
+    async def __acall__(self, request):
+        if not self.config['ENABLED']:
+            return await self.get_response(request)
+
+        with metrics.track_request() as state:
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            duration = time.perf_counter() - started
+
+        if self._record(request, response, duration, state):
+            await sync_to_async(self._log_slow_request)(request, response, duration, state)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        state = metrics.get_request_state()
+        if state is not None and request.resolver_match is not None:
+            state.endpoint = request.resolver_match.view_name
+
+    def _record(self, request, response, duration, state):
+        """Record the measurements of a request, returning whether it is slow."""
+        metrics.REQUEST_DURATION.observe(
+            duration, method=request.method, endpoint=state.endpoint, status=str(response.status_code),
+        )
+        metrics.REQUEST_STAGE_DURATION.observe(state.query_seconds, endpoint=state.endpoint, stage='sql')
+        metrics.REQUEST_QUERIES.observe(state.query_count, endpoint=state.endpoint)
+
+        threshold = self.config['SLOW_REQUEST_MS']
+        return bool(threshold) and duration * 1000 >= threshold
+
+    def _log_slow_request(self, request, response, duration, state):
+        slowest = sorted(state.queries, key=lambda query: query[0], reverse=True)[:self.config['SLOW_REQUEST_QUERIES']]
+        lines = [
+            f'Slow request {request.method} {request.get_full_path()} ({state.endpoint}): {response.status_code} in '
+            f'{duration * 1000:.1f} ms, {state.query_count} SQL queries in {state.query_seconds * 1000:.1f} ms.'
+        ]
+        lines.extend(f'{seconds * 1000:.1f} ms: {sql}' for seconds, sql, params, alias in slowest)
+        if slowest and self.config['SLOW_REQUEST_EXPLAIN']:
+            lines.append(self._explain(*slowest[0][1:]))
+        logger.warning('\n'.join(lines))
+
+    @staticmethod
+    def _explain(sql, params, alias):
+        """Return the plan of a query, without running it again."""
+        if not sql.lstrip().upper().startswith(('SELECT', 'WITH')):
+            return 'No plan, the slowest query is not a SELECT.'
+        try:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(f'EXPLAIN {sql}', params)
+                return 'Plan of the slowest query:\n' + '\n'.join(row for row, in cursor.fetchall())
+        except DatabaseError as err:
+            return f'No plan: {err}'
@@ -0,0 +1,63 @@
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.contrib.postgres.search import SearchVectorField
+from django.db import migrations, transaction
+
+BACKFILL_BATCH_SIZE = 1000
+
+CREATE_TRIGGER_SQL = """
+CREATE TRIGGER core_paragraph_search_vector_update
+BEFORE INSERT OR UPDATE ON core_paragraph
+FOR EACH ROW EXECUTE FUNCTION
+tsvector_update_trigger(search_vector, 'pg_catalog.english', text);
+"""
+
+DROP_TRIGGER_SQL = "DROP TRIGGER IF EXISTS core_paragraph_search_vector_update ON core_paragraph;"
+
+
+BACKFILL_SQL = """
+WITH batch AS (SELECT id FROM core_paragraph WHERE id > %s ORDER BY id LIMIT %s)
+UPDATE core_paragraph
+SET search_vector = to_tsvector('pg_catalog.english', coalesce(text, ''))
+FROM batch WHERE core_paragraph.id = batch.id
+RETURNING core_paragraph.id
+"""
+
+
+def backfill_search_vector(apps, schema_editor):
+    """Populate the search vector of existing rows, one batch of the next ids per transaction."""
+    connection = schema_editor.connection
+    # Batches follow the ids actually stored, so sparse or large ids cost no empty batches.
+    last_id = 0
+    while True:
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(BACKFILL_SQL, [last_id, BACKFILL_BATCH_SIZE])
+            ids = [row[0] for row in cursor.fetchall()]
+        if not ids:
+            return
+        last_id = max(ids)
+
+
+class Migration(migrations.Migration):
+
+    # Backfill batches commit independently and the index is built concurrently,
+    # so the table is never locked for the duration of the whole migration.
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paragraph',
+            name='search_vector',
+            field=SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER_SQL, DROP_TRIGGER_SQL),
+        migrations.RunPython(backfill_search_vector, migrations.RunPython.noop),
+        AddIndexConcurrently(
+            model_name='paragraph',
+            index=GinIndex(fields=['search_vector'], name='core_paragraph_search_gin'),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:11
+
+import re
+from collections import Counter
+
+from django.db import migrations, models
+
+# Copy of the tokenizer of `core.models` when this migration was written, so later changes do not alter it.
+WORD_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text)
+
+
+def populate_word_frequencies(apps, schema_editor):
+    """Count the words of the paragraphs stored before the table existed."""
+    Paragraph = apps.get_model('core', 'Paragraph')
+    WordFrequency = apps.get_model('core', 'WordFrequency')
+
+    counts = Counter()
+    doc_counts = Counter()
+    for text in Paragraph.objects.values_list('text', flat=True).iterator(chunk_size=2000):
+        words = Counter(tokenize(text))
+        counts.update(words)
+        doc_counts.update(words.keys())
+
+    WordFrequency.objects.bulk_create(
+        (WordFrequency(word=word, count=count, doc_count=doc_counts[word]) for word, count in counts.items()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_paragraph_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordFrequency',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.TextField(unique=True)),
+                ('count', models.BigIntegerField(default=0)),
+                ('doc_count', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='wordfrequency',
+            index=models.Index(fields=['-count', 'word'], name='core_wordfreq_count_idx'),
+        ),
+        migrations.RunPython(populate_word_frequencies, migrations.RunPython.noop),
+    ]
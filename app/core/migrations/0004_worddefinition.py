@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_wordfrequency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WordDefinition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.TextField(unique=True)),
+                ('payload', models.JSONField()),
+                ('status', models.CharField(choices=[('found', 'Found'), ('not_found', 'Not Found')], max_length=16)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
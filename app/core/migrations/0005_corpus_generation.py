@@ -0,0 +1,15 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_worddefinition'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            'CREATE SEQUENCE core_corpus_generation',
+            'DROP SEQUENCE core_corpus_generation',
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:33
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from core import minhash
+
+
+def populate_signatures(apps, schema_editor):
+    """Compute the signatures and buckets of the paragraphs stored before the tables existed."""
+    Paragraph = apps.get_model('core', 'Paragraph')
+    ParagraphSignature = apps.get_model('core', 'ParagraphSignature')
+    SignatureBucket = apps.get_model('core', 'SignatureBucket')
+
+    signatures = []
+    buckets = []
+    for paragraph_id, text in Paragraph.objects.values_list('id', 'text').iterator(chunk_size=2000):
+        signature = minhash.signature(text)
+        if signature is None:
+            continue
+        signatures.append(ParagraphSignature(paragraph_id=paragraph_id, signature=minhash.to_bytes(signature)))
+        buckets.extend(
+            SignatureBucket(paragraph_id=paragraph_id, band=band, bucket=bucket)
+            for band, bucket in enumerate(minhash.band_buckets(signature).tolist())
+        )
+        if len(signatures) >= 1000:
+            ParagraphSignature.objects.bulk_create(signatures)
+            SignatureBucket.objects.bulk_create(buckets, batch_size=1000)
+            signatures, buckets = [], []
+    ParagraphSignature.objects.bulk_create(signatures)
+    SignatureBucket.objects.bulk_create(buckets, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_corpus_generation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParagraphSignature',
+            fields=[
+                ('paragraph', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='core.paragraph')),
+                ('signature', models.BinaryField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SignatureBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('paragraph', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.paragraph')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='signaturebucket',
+            index=models.Index(fields=['band', 'bucket'], name='core_sigbucket_lookup_idx'),
+        ),
+        migrations.RunPython(populate_signatures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:38
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import (
+    AddIndexConcurrently,
+    TrigramExtension,
+)
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    # Build the index without blocking word frequency updates on a live database.
+    atomic = False
+
+    dependencies = [
+        ('core', '0006_paragraphsignature'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        AddIndexConcurrently(
+            model_name='wordfrequency',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['word'], name='core_wordfreq_word_trgm', opclasses=['gin_trgm_ops']),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_ingestjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CommonWord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('word', models.TextField(unique=True)),
+                ('count', models.BigIntegerField()),
+                ('error', models.BigIntegerField()),
+                ('guaranteed', models.BooleanField()),
+                ('generation', models.BigIntegerField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_commonword'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingestjob',
+            name='paragraphs',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
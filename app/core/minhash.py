@@ -0,0 +1,102 @@
+"""
+MinHash signatures and locality sensitive hashing of paragraph texts, configured by the `PARAGRAPH_SIMILARITY`
+setting.
+
+The signature of a text holds, for each of `BANDS * ROWS` random hash functions, the minimum hash of the word
+shingles of the text. The share of positions two signatures agree on estimates the Jaccard similarity of their
+shingle sets. Signatures are cut into `BANDS` bands of `ROWS` values and each band is hashed into a bucket, texts
+sharing a bucket in any band are candidate near-duplicates. Signatures change with the settings, the
+`rebuild_paragraph_signatures` command recomputes the stored ones.
+"""
+import zlib
+
+import numpy as np
+from django.conf import settings
+
+from core.models import tokenize
+
+# Hash values are kept below this Mersenne prime so products of two of them fit in 64 bits.
+PRIME = (1 << 31) - 1
+SEED = 20211
+
+_parameters = {}
+
+
+def get_config():
+    config = settings.PARAGRAPH_SIMILARITY
+    return config['BANDS'], config['ROWS'], config['SHINGLE_SIZE']
+
+
+def _get_parameters(bands, rows):
+    """Return the coefficients of the hash functions, identical in every process for the same shape."""
+    if (bands, rows) not in _parameters:
+        state = np.random.RandomState(SEED)
+        size = bands * rows
+        _parameters[(bands, rows)] = (
+            state.randint(1, PRIME, size=size, dtype=np.uint64),
+            state.randint(0, PRIME, size=size, dtype=np.uint64),
+            np.uint64(state.randint(1, PRIME)),
+            # Odd 64 bit multipliers mixing the rows of a band into its bucket.
+            state.randint(0, 1 << 62, size=rows, dtype=np.uint64) * np.uint64(2) + np.uint64(1),
+        )
+    return _parameters[(bands, rows)]
+
+
+def shingle_hashes(text, shingle_size, base=None):
+    """Return the distinct hashes of the runs of `shingle_size` consecutive lowercased words of `text`."""
+    words = tokenize(text.lower())
+    if not words:
+        return np.empty(0, dtype=np.uint64)
+    word_hashes = np.fromiter((zlib.crc32(word.encode()) for word in words), dtype=np.uint64, count=len(words))
+    word_hashes %= np.uint64(PRIME)
+    if base is None:
+        base = _get_parameters(*get_config()[:2])[2]
+
+    # Texts shorter than a shingle make up a single shingle of all their words.
+    width = min(shingle_size, len(words))
+    count = len(words) - width + 1
+    # Polynomial hash of every window at once, one word offset at a time.
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(width):
+        hashes = (hashes * base + word_hashes[offset:offset + count]) % np.uint64(PRIME)
+    return np.unique(hashes)
+
+
+def signature(text, bands=None, rows=None, shingle_size=None):
+    """Return the MinHash signature of `text` as an array of `bands * rows` unsigned 32 bit integers, or None."""
+    default_bands, default_rows, default_shingle_size = get_config()
+    bands, rows = bands or default_bands, rows or default_rows
+    a, b, base, _ = _get_parameters(bands, rows)
+
+    hashes = shingle_hashes(text, shingle_size or default_shingle_size, base)
+    if not len(hashes):
+        return None
+    # One row per hash function, one column per shingle: the minimum of each row is one value of the signature.
+    permuted = (np.outer(a, hashes) + b[:, np.newaxis]) % np.uint64(PRIME)
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+def band_buckets(signature, bands=None, rows=None):
+    """Return the bucket of each band of `signature`, as signed 64 bit integers."""
+    default_bands, default_rows, _ = get_config()
+    bands, rows = bands or default_bands, rows or default_rows
+    multipliers = _get_parameters(bands, rows)[3]
+    # Products and sums wrap around modulo 2 ** 64, which is fine for hashing.
+    with np.errstate(over='ignore'):
+        buckets = (signature.reshape(bands, rows).astype(np.uint64) * multipliers).sum(axis=1, dtype=np.uint64)
+    return buckets.view(np.int64)
+
+
+def similarities(signature, signatures):
+    """Return the estimated Jaccard similarity of `signature` with each row of the 2D array `signatures`."""
+    if not len(signatures):
+        return np.empty(0)
+    return (signatures == signature).mean(axis=1)
+
+
+def to_bytes(signature):
+    return signature.astype('<u4').tobytes()
+
+
+def from_bytes(data):
+    return np.frombuffer(bytes(data), dtype='<u4')
@@ -1,9 +1,641 @@
 """
 Database models.
 """
-from django.db import models
+import io
+import re
+from collections import Counter
+
+import numpy as np
+from psycopg2.extras import (
+    Json,
+    execute_values,
+)
+
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
+from django.db import (
+    connections,
+    models,
+    router,
+    transaction,
+)
+from django.utils import timezone
+
+from core import (
+    metrics,
+    sharding,
+    signals,
+)
+from core.generation import (
+    bump_generation,
+    get_generation,
+)
+
+# Text search configuration used to build and query `Paragraph.search_vector`.
+# The database trigger installed by migration 0002 is bound to the same configuration.
+SEARCH_CONFIG = 'english'
+
+WORD_PATTERN = re.compile(r'\w+')
+
+
+# Characters escaped by the text format of COPY, which cannot hold NUL characters.
+COPY_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r', '\0': ''})
+
+
+def tokenize(text):
+    """Split text into words, dropping leading and trailing special characters like , ! & $ etc."""
+    return WORD_PATTERN.findall(text)
+
+
+# Formatting of values in the text format of COPY, by type.
+COPY_FORMATTERS = {
+    int: str,
+    str: lambda value: value.translate(COPY_ESCAPES),
+    bytes: lambda value: '\\\\x' + value.hex(),
+}
+
+
+def copy_rows(cursor, table, columns, rows):
+    """
+    Insert `rows` of integers, strings and bytes into the `columns` of `table` with a single `COPY`.
+
+    Columns are formatted according to the types of the first row, every row must hold values of the same types.
+    """
+    if not rows:
+        return
+    formatters = [COPY_FORMATTERS[type(value)] for value in rows[0]]
+    data = ''.join(
+        '\t'.join([format_value(value) for format_value, value in zip(formatters, row)]) + '\n' for row in rows
+    )
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", io.StringIO(data))
+
+
+def _paragraphs_added(using, paragraphs):
+    """Add stored paragraphs to their derived data, within the transaction storing them."""
+    WordFrequency.objects.db_manager(using).add_texts(paragraph.text for paragraph in paragraphs)
+    ParagraphSignature.objects.db_manager(using).add_paragraphs(paragraphs)
+    bump_generation(using)
+    signals.paragraphs_added.send(sender=Paragraph, paragraphs=paragraphs, using=using)
+
+
+def _paragraphs_removed(using, paragraphs):
+    """Remove deleted paragraphs from their derived data, within the transaction deleting them."""
+    WordFrequency.objects.db_manager(using).remove_texts(paragraph.text for paragraph in paragraphs)
+    ParagraphSignature.objects.db_manager(using).remove_paragraphs(paragraphs)
+    bump_generation(using)
+    signals.paragraphs_removed.send(sender=Paragraph, paragraphs=paragraphs, using=using)
+
+
+class ParagraphQuerySet(models.QuerySet):
+    """Queryset keeping the data derived from paragraphs in sync with bulk inserts and deletes."""
+
+    def bulk_create(self, objs, batch_size=None, ignore_conflicts=False):
+        """
+        Insert the paragraphs and update their derived data in one transaction.
+
+        When paragraphs are sharded, they are allocated ids and inserted on the shard of their id, in one
+        transaction per shard.
+        """
+        self._for_write = True
+        if not sharding.is_sharded():
+            return self._bulk_create_on(self.db, objs, batch_size, ignore_conflicts)
+
+        objs = list(objs)
+        new_objs = [obj for obj in objs if obj.pk is None]
+        for obj, paragraph_id in zip(new_objs, sharding.allocate_ids(len(new_objs))):
+            obj.pk = paragraph_id
+        by_shard = {}
+        for obj in objs:
+            by_shard.setdefault(sharding.shard_for(obj.pk), []).append(obj)
+        for alias, shard_objs in by_shard.items():
+            self._bulk_create_on(alias, shard_objs, batch_size, ignore_conflicts)
+        return objs
+
+    def _bulk_create_on(self, using, objs, batch_size, ignore_conflicts):
+        with transaction.atomic(using=using):
+            objs = super(ParagraphQuerySet, self.using(using)).bulk_create(
+                objs, batch_size=batch_size, ignore_conflicts=ignore_conflicts,
+            )
+            _paragraphs_added(using, objs)
+        return objs
+
+    def delete(self):
+        """
+        Delete the paragraphs and update their derived data in one transaction.
+
+        Paragraphs are deleted in chunks of the `BATCH_SIZE` of the `PARAGRAPH_BULK` setting, in id order, so only
+        the texts of a chunk are held in memory at once. When paragraphs are sharded and no database is given, the
+        paragraphs are deleted from every shard, in one transaction per shard, and the counts of deleted objects are
+        summed.
+        """
+        self._for_write = True
+        if self._db is None and sharding.is_sharded():
+            total, counts = 0, Counter()
+            for shard_total, shard_counts in sharding.scatter(lambda alias: self.using(alias).delete()):
+                total += shard_total
+                counts.update(shard_counts)
+            return total, dict(counts)
+
+        if self.query.is_sliced:
+            raise TypeError("Cannot use 'limit' or 'offset' with delete.")
+        batch_size = settings.PARAGRAPH_BULK['BATCH_SIZE']
+        total, counts = 0, Counter()
+        with transaction.atomic(using=self.db):
+            last_id = None
+            while True:
+                # Chunks start after the last id deleted rather than at the start of the index.
+                chunk = self.order_by('id') if last_id is None else self.order_by('id').filter(id__gt=last_id)
+                rows = list(chunk.select_for_update().values_list('id', 'text')[:batch_size])
+                if not rows:
+                    break
+                ids = [paragraph_id for paragraph_id, text in rows]
+                last_id = ids[-1]
+                _paragraphs_removed(self.db, [Paragraph(id=paragraph_id, text=text) for paragraph_id, text in rows])
+                chunk_total, chunk_counts = models.QuerySet.delete(self.model.objects.using(self.db).filter(id__in=ids))
+                total += chunk_total
+                counts.update(chunk_counts)
+        return total, dict(counts)
+
+    delete.alters_data = True
+    delete.queryset_only = True
 
 
 class Paragraph(models.Model):
     """Paragraphs in the system."""
     text = models.TextField()
+    # Populated by a database trigger on every insert and update, never written by Django.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = ParagraphQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='core_paragraph_search_gin'),
+        ]
+
+    def save(self, *args, **kwargs):
+        """
+        Save the paragraph and update its derived data in the same transaction.
+
+        When paragraphs are sharded, new paragraphs are allocated an id and every paragraph is saved on the shard
+        of its id, whatever database is asked for.
+        """
+        adding = self.pk is None
+        if sharding.is_sharded():
+            if adding:
+                self.pk = sharding.allocate_ids(1)[0]
+                kwargs['force_insert'] = True
+            kwargs['using'] = sharding.shard_for(self.pk)
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        update_fields = kwargs.get('update_fields')
+        text_saved = update_fields is None or 'text' in update_fields
+
+        with transaction.atomic(using=using):
+            previous_text = None
+            if not adding and text_saved:
+                previous_text = type(self).objects.using(using).select_for_update() \
+                    .filter(pk=self.pk).values_list('text', flat=True).first()
+
+            super().save(*args, **kwargs)
+
+            if text_saved and previous_text != self.text:
+                if previous_text is not None:
+                    _paragraphs_removed(using, [Paragraph(id=self.pk, text=previous_text)])
+                _paragraphs_added(using, [self])
+
+    def delete(self, using=None, keep_parents=False):
+        """Delete through the queryset so the derived data is updated as well."""
+        if sharding.is_sharded():
+            using = sharding.shard_for(self.pk)
+        using = using or router.db_for_write(type(self), instance=self)
+        deleted = type(self).objects.using(using).filter(pk=self.pk).delete()
+        self.pk = None
+        return deleted
+
+
+class WordFrequencyManager(models.Manager):
+    """Manager applying paragraph inserts and deletes to the word frequencies with bulk upserts."""
+
+    UPSERT_SQL = (
+        "INSERT INTO core_wordfrequency (word, count, doc_count) VALUES %s "
+        "ON CONFLICT (word) DO UPDATE SET "
+        "count = core_wordfrequency.count + EXCLUDED.count, "
+        "doc_count = core_wordfrequency.doc_count + EXCLUDED.doc_count"
+    )
+    UPSERT_PAGE_SIZE = 1000
+
+    def add_texts(self, texts):
+        """Count the words of newly stored paragraph texts."""
+        self._apply(texts, sign=1)
+
+    def remove_texts(self, texts):
+        """Discount the words of deleted paragraph texts."""
+        self._apply(texts, sign=-1)
+
+    def most_common(self, limit):
+        """
+        Return the `(word, count)` pairs of the `limit` most frequent words, most frequent first.
+
+        When paragraphs are sharded and no database is given, the counts of the shards are summed with the
+        threshold algorithm: the shards are read top down, deeper and deeper, until the least frequent word kept
+        is more frequent than any word not read yet can be, the sum of the last counts read from each shard.
+        """
+        if self._db is not None or not sharding.is_sharded():
+            return list(self.order_by('-count', 'word').values_list('word', 'count')[:limit])
+
+        depth = limit
+        while True:
+            tops = sharding.scatter(lambda alias: self.db_manager(alias).most_common(depth))
+            words = sorted({word for top in tops for word, count in top})
+            totals = Counter()
+            for counts in sharding.scatter(
+                lambda alias: list(self.db_manager(alias).filter(word__in=words).values_list('word', 'count')),
+            ):
+                totals.update(dict(counts))
+            ranked = sorted(totals.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+            unread = [top[-1][1] for top in tops if len(top) == depth]
+            if not unread or (len(ranked) == limit and ranked[-1][1] > sum(unread)):
+                return ranked
+            depth *= 2
+
+    @staticmethod
+    def count_words(texts, counts, doc_counts):
+        """Add the occurrences and paragraphs of every word of `texts` to the `counts` and `doc_counts` counters."""
+        for text in texts:
+            words = Counter(tokenize(text))
+            counts.update(words)
+            doc_counts.update(words.keys())
+
+    def _apply(self, texts, sign):
+        counts = Counter()
+        doc_counts = Counter()
+        self.count_words(texts, counts, doc_counts)
+        self._upsert(counts, doc_counts, sign)
+
+    def _upsert(self, counts, doc_counts, sign):
+        if not counts:
+            return
+
+        using = self._db or router.db_for_write(self.model)
+        # Upsert in a stable order so concurrent writers lock the shared rows in the same order.
+        rows = [(word, sign * counts[word], sign * doc_counts[word]) for word in sorted(counts)]
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            execute_values(cursor, self.UPSERT_SQL, rows, page_size=self.UPSERT_PAGE_SIZE)
+            if sign < 0:
+                self.db_manager(using).filter(word__in=list(counts), count__lte=0).delete()
+
+
+class WordFrequency(models.Model):
+    """Number of occurrences of every word across all paragraphs."""
+    word = models.TextField(unique=True)
+    count = models.BigIntegerField(default=0)
+    doc_count = models.BigIntegerField(default=0)
+
+    objects = WordFrequencyManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-count', 'word'], name='core_wordfreq_count_idx'),
+            # Trigram index serving the fuzzy matching of search words against the vocabulary of the corpus.
+            GinIndex(fields=['word'], opclasses=['gin_trgm_ops'], name='core_wordfreq_word_trgm'),
+        ]
+
+
+COMMON_WORDS_FALLBACKS = metrics.registry.counter(
+    'common_words_fallbacks_total',
+    'Lookups of the estimated most common words answered from the exact word counts, as none were stored or they '
+    'were stale.',
+    ['reason'],
+)
+
+
+class CommonWordManager(models.Manager):
+    """Manager storing the most common words estimated by `core.topk`."""
+
+    def most_common(self, limit):
+        """
+        Return the `(word, count)` pairs of the `limit` most common words estimated, most common first.
+
+        Estimates are only recomputed by the `recompute_common_words` command. Until they are stored, or once the
+        corpus moved more than `COMMON_WORDS['MAX_LAG']` generations past the one they were counted at, the exact
+        counts of `WordFrequency` are returned instead.
+        """
+        rows = list(self.order_by('-count', 'word').values_list('word', 'count', 'generation')[:limit])
+        if not rows:
+            reason = 'missing'
+        elif get_generation() - min(generation for word, count, generation in rows) > \
+                settings.COMMON_WORDS['MAX_LAG']:
+            reason = 'stale'
+        else:
+            return [(word, count) for word, count, generation in rows]
+        COMMON_WORDS_FALLBACKS.inc(reason=reason)
+        return WordFrequency.objects.db_manager(self._db).most_common(limit)
+
+    def recompute(self, capacity=None, chunk_size=None, processes=None, limit=None):
+        """
+        Estimate the most common words of the corpus and store the `limit` most common of them, replacing the
+        stored ones. Settings default to the `COMMON_WORDS` setting. Returns the summary of the words counted.
+        """
+        from core import topk
+
+        config = settings.COMMON_WORDS
+        chunk_size = chunk_size or config['CHUNK_SIZE']
+        generation = get_generation()
+        summary = topk.count_words(
+            topk.corpus_texts(chunk_size),
+            capacity or config['CAPACITY'],
+            chunk_size,
+            processes or config['PROCESSES'],
+        )
+
+        using = self._db or router.db_for_write(self.model)
+        with transaction.atomic(using=using):
+            self.db_manager(using).all().delete()
+            self.db_manager(using).bulk_create([
+                self.model(word=hitter.word, count=hitter.count, error=hitter.error,
+                           guaranteed=hitter.guaranteed, generation=generation)
+                for hitter in summary.top(limit or config['LIMIT'])
+            ])
+        return summary
+
+
+class CommonWord(models.Model):
+    """
+    Word among the most common of the corpus, with its estimated number of occurrences, which may exceed the true
+    one by at most `error`, as of corpus generation `generation`. `guaranteed` words are certainly more common
+    than any word not stored.
+    """
+    word = models.TextField(unique=True)
+    count = models.BigIntegerField()
+    error = models.BigIntegerField()
+    guaranteed = models.BooleanField()
+    generation = models.BigIntegerField()
+
+    objects = CommonWordManager()
+
+
+class WordDefinitionManager(models.Manager):
+    """Manager storing the responses of the dictionary API with bulk upserts."""
+
+    UPSERT_SQL = (
+        "INSERT INTO core_worddefinition (word, payload, status, fetched_at) VALUES %s "
+        "ON CONFLICT (word) DO UPDATE SET "
+        "payload = EXCLUDED.payload, status = EXCLUDED.status, fetched_at = EXCLUDED.fetched_at"
+    )
+
+    def store(self, definitions):
+        """Store the `(payload, status)` pairs of `definitions`, by word, replacing earlier responses."""
+        if not definitions:
+            return
+        using = self._db or router.db_for_write(self.model)
+        now = timezone.now()
+        # Upsert in a stable order so concurrent writers lock the shared rows in the same order.
+        rows = [(word, Json(payload), status, now) for word, (payload, status) in sorted(definitions.items())]
+        with connections[using].cursor() as cursor:
+            execute_values(cursor, self.UPSERT_SQL, rows)
+
+
+class WordDefinition(models.Model):
+    """Response of the dictionary API for a word, kept as the persisted tier of the definitions cache."""
+
+    class Status(models.TextChoices):
+        FOUND = 'found'
+        NOT_FOUND = 'not_found'
+
+    word = models.TextField(unique=True)
+    payload = models.JSONField()
+    status = models.CharField(max_length=16, choices=Status.choices)
+    fetched_at = models.DateTimeField()
+
+    objects = WordDefinitionManager()
+
+
+class ParagraphSignatureManager(models.Manager):
+    """Manager maintaining the MinHash signatures and LSH buckets of paragraphs, see `core.minhash`."""
+
+    BATCH_SIZE = 1000
+    # Every signature has one bucket per band, too many rows to build model instances for.
+    BUCKET_INSERT_SQL = "INSERT INTO core_signaturebucket (paragraph_id, band, bucket) VALUES %s"
+
+    def add_paragraphs(self, paragraphs, copy=False):
+        """
+        Store the signatures and buckets of newly stored paragraphs.
+
+        With `copy`, rows are sent with `COPY` rather than as `INSERT` statements, much faster for bulk imports.
+        """
+        from core import minhash
+
+        using = self._db or router.db_for_write(self.model)
+        signatures = []
+        buckets = []
+        for paragraph in paragraphs:
+            signature = minhash.signature(paragraph.text)
+            if signature is None:
+                continue
+            signatures.append(self.model(paragraph_id=paragraph.id, signature=minhash.to_bytes(signature)))
+            buckets.extend(
+                (paragraph.id, band, bucket) for band, bucket in enumerate(minhash.band_buckets(signature).tolist())
+            )
+        with transaction.atomic(using=using), connections[using].cursor() as cursor:
+            if copy:
+                copy_rows(cursor, self.model._meta.db_table, ['paragraph_id', 'signature'],
+                          [(row.paragraph_id, row.signature) for row in signatures])
+                copy_rows(cursor, SignatureBucket._meta.db_table, ['paragraph_id', 'band', 'bucket'], buckets)
+                return
+            self.db_manager(using).bulk_create(signatures, batch_size=self.BATCH_SIZE)
+            execute_values(cursor, self.BUCKET_INSERT_SQL, buckets, page_size=self.BATCH_SIZE)
+
+    def remove_paragraphs(self, paragraphs):
+        """Drop the signatures and buckets of deleted paragraphs."""
+        using = self._db or router.db_for_write(self.model)
+        ids = [paragraph.id for paragraph in paragraphs]
+        SignatureBucket.objects.db_manager(using).filter(paragraph_id__in=ids).delete()
+        self.db_manager(using).filter(paragraph_id__in=ids).delete()
+
+    def similar(self, signature, min_similarity, limit, exclude_id=None):
+        """
+        Return up to `limit` `(paragraph id, similarity)` pairs of the paragraphs whose signature is at least
+        `min_similarity` similar to `signature`, most similar first.
+
+        Only the paragraphs sharing an LSH bucket with `signature` are compared, so very dissimilar paragraphs are
+        never read and some paragraphs of similarity close to `min_similarity` can be missed. When paragraphs are
+        sharded and no database is given, every shard is searched.
+        """
+        from core import minhash
+
+        if self._db is None and sharding.is_sharded():
+            matches = sharding.scatter(
+                lambda alias: self.db_manager(alias).similar(signature, min_similarity, limit, exclude_id),
+            )
+            return sharding.merge(matches, key=lambda match: (-match[1], match[0]), limit=limit)
+
+        buckets = minhash.band_buckets(signature).tolist()
+        using = self._db or router.db_for_read(self.model)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT s.paragraph_id, s.signature FROM core_paragraphsignature AS s
+                WHERE s.paragraph_id IN (
+                    SELECT b.paragraph_id FROM core_signaturebucket AS b
+                    JOIN unnest(%s::smallint[], %s::bigint[]) AS q(band, bucket)
+                    ON b.band = q.band AND b.bucket = q.bucket
+                ) AND s.paragraph_id IS DISTINCT FROM %s
+                """,
+                [list(range(len(buckets))), buckets, exclude_id],
+            )
+            # Signatures of another shape were computed with other settings and cannot be compared.
+            rows = [(paragraph_id, minhash.from_bytes(data)) for paragraph_id, data in cursor.fetchall()]
+            rows = [(paragraph_id, candidate) for paragraph_id, candidate in rows if len(candidate) == len(signature)]
+
+        if not rows:
+            return []
+        scores = minhash.similarities(signature, np.stack([candidate for paragraph_id, candidate in rows]))
+        matches = [(paragraph_id, float(score)) for (paragraph_id, _), score in zip(rows, scores)
+                   if score >= min_similarity]
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return matches[:limit]
+
+    def best_matches(self, signatures, min_similarity):
+        """
+        Return, for each of `signatures`, the `(paragraph id, similarity)` pair of the stored paragraph most similar
+        to it, at least `min_similarity` similar, or None.
+
+        The buckets of all the signatures are looked up in a single statement, candidates are then compared in
+        NumPy. Like `similar`, only paragraphs sharing an LSH bucket are compared, and every shard is searched when
+        paragraphs are sharded and no database is given.
+        """
+        from core import minhash
+
+        def rank(match):
+            return -match[1], match[0]
+
+        if not signatures:
+            return []
+        if self._db is None and sharding.is_sharded():
+            shard_matches = sharding.scatter(
+                lambda alias: self.db_manager(alias).best_matches(signatures, min_similarity),
+            )
+            return [
+                min([match for match in matches if match is not None], key=rank, default=None)
+                for matches in zip(*shard_matches)
+            ]
+
+        positions, bands, buckets = [], [], []
+        for position, signature in enumerate(signatures):
+            signature_buckets = minhash.band_buckets(signature).tolist()
+            positions.extend([position] * len(signature_buckets))
+            bands.extend(range(len(signature_buckets)))
+            buckets.extend(signature_buckets)
+
+        using = self._db or router.db_for_read(self.model)
+        candidates = {}
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT DISTINCT q.position, s.paragraph_id, s.signature
+                FROM unnest(%s::int[], %s::smallint[], %s::bigint[]) AS q(position, band, bucket)
+                JOIN core_signaturebucket AS b ON b.band = q.band AND b.bucket = q.bucket
+                JOIN core_paragraphsignature AS s ON s.paragraph_id = b.paragraph_id
+                """,
+                [positions, bands, buckets],
+            )
+            for position, paragraph_id, data in cursor.fetchall():
+                candidate = minhash.from_bytes(data)
+                # Signatures of another shape were computed with other settings and cannot be compared.
+                if len(candidate) == len(signatures[position]):
+                    candidates.setdefault(position, []).append((paragraph_id, candidate))
+
+        best = [None] * len(signatures)
+        for position, rows in candidates.items():
+            scores = minhash.similarities(signatures[position], np.stack([candidate for _, candidate in rows]))
+            matches = [(paragraph_id, float(score)) for (paragraph_id, _), score in zip(rows, scores)
+                       if score >= min_similarity]
+            best[position] = min(matches, key=rank, default=None)
+        return best
+
+
+class ParagraphSignature(models.Model):
+    """MinHash signature of the word shingles of a paragraph, maintained on every paragraph write."""
+    paragraph = models.OneToOneField(Paragraph, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    signature = models.BinaryField()
+
+    objects = ParagraphSignatureManager()
+
+
+class SignatureBucket(models.Model):
+    """LSH bucket of one band of the signature of a paragraph."""
+    paragraph = models.ForeignKey(Paragraph, on_delete=models.CASCADE, related_name='+')
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='core_sigbucket_lookup_idx'),
+        ]
+
+
+class IngestJobManager(models.Manager):
+    """Manager handing out queued ingestion jobs to concurrent workers."""
+
+    CLAIM_SQL = """
+        UPDATE core_ingestjob SET status = %s, attempts = attempts + 1, started_at = now(), worker = %s
+        WHERE id IN (
+            SELECT id FROM core_ingestjob
+            WHERE (status = %s AND run_after <= now())
+            OR (status = %s AND started_at < now() - make_interval(secs => %s))
+            ORDER BY id LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING id
+    """
+
+    def claim(self, limit, worker, lease):
+        """
+        Mark up to `limit` queued jobs due to run as running for `worker` and return them, oldest first.
+
+        Jobs locked by concurrent claims are skipped rather than waited for, so workers never claim the same job.
+        Jobs running for more than `lease` seconds are claimed again, their worker is assumed to be gone.
+        """
+        using = self._db or router.db_for_write(self.model)
+        status = self.model.Status
+        with connections[using].cursor() as cursor:
+            cursor.execute(self.CLAIM_SQL, [status.RUNNING, worker, status.PENDING, status.RUNNING, lease, limit])
+            ids = [job_id for job_id, in cursor.fetchall()]
+        return list(self.db_manager(using).filter(id__in=ids).order_by('id'))
+
+
+class IngestJob(models.Model):
+    """Request to fetch paragraphs from the external API and store them, run by the `process_ingest_jobs` worker."""
+
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        RUNNING = 'running'
+        DONE = 'done'
+        FAILED = 'failed'
+
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    requested = models.PositiveIntegerField()
+    stored = models.PositiveIntegerField(default=0)
+    duplicates = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    # Jobs are not claimed before this time, which is pushed back when they are retried.
+    run_after = models.DateTimeField(default=timezone.now)
+    # Host and process id of the worker running or last running the job.
+    worker = models.CharField(max_length=255, blank=True)
+    # `[id, text]` pairs of the paragraphs a job is storing when paragraphs are sharded, recorded before they are
+    # written to their shards, so an attempt interrupted halfway is retried with the same paragraphs.
+    paragraphs = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+
+    objects = IngestJobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='core_ingestjob_queue_idx'),
+        ]
@@ -0,0 +1,102 @@
+"""
+Database router spreading the reads of the read-heavy views over the replicas, see the `DATABASE_REPLICAS` setting.
+
+Reads go to the primary unless made by a view decorated with `reads_from_replicas`, which picks a random replica for
+the whole request. Clients that wrote through a view decorated with `pins_to_primary` carry a cookie for
+`STICKY_SECONDS` afterwards, during which their reads go to the primary, so they see their own writes whatever the
+replication lag.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+_read_alias = ContextVar('read_alias', default=None)
+
+
+def get_replicas():
+    """Return the aliases of the replica databases."""
+    return settings.DATABASE_REPLICAS['ALIASES']
+
+
+def get_read_replica():
+    """Return the alias of the replica the reads made here go to, or None if they go to the primary."""
+    return _read_alias.get()
+
+
+def is_pinned(request):
+    """Return whether the client of `request` wrote recently, and must read from the primary."""
+    return settings.DATABASE_REPLICAS['STICKY_COOKIE'] in request.COOKIES
+
+
+def pin_to_primary(response):
+    """Have the client read from the primary for the next `STICKY_SECONDS`, by setting the sticky cookie."""
+    config = settings.DATABASE_REPLICAS
+    if config['ALIASES']:
+        response.set_cookie(
+            config['STICKY_COOKIE'], '1', max_age=config['STICKY_SECONDS'], httponly=True, samesite='Lax',
+        )
+    return response
+
+
+@contextmanager
+def replica_reads(request):
+    """Send the reads made within the block to a random replica, unless the client of `request` is pinned."""
+    replicas = get_replicas()
+    alias = random.choice(replicas) if replicas and not is_pinned(request) else None
+    token = _read_alias.set(alias)
+    try:
+        yield alias
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_from_replicas(view_method):
+    """Serve a view from a random replica, unless the client wrote recently, see `replica_reads`."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        with replica_reads(request):
+            return view_method(self, request, *args, **kwargs)
+
+    return wrapper
+
+
+def pins_to_primary(view_method):
+    """Pin the client of a view writing to the database to the primary after every successful request."""
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        response = view_method(self, request, *args, **kwargs)
+        if response.status_code < 400:
+            pin_to_primary(response)
+        return response
+
+    return wrapper
+
+
+class ReplicaRouter:
+    """Route the reads made within `replica_reads` to its replica, and everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        return get_read_replica()
+
+    def db_for_write(self, model, **hints):
+        # Instances read from a replica are saved to the primary all the same.
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in get_replicas():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas follow the schema of the primary.
+        if db in get_replicas():
+            return False
+        return None
@@ -0,0 +1,173 @@
+"""
+Distribution of paragraphs over the databases of the `PARAGRAPH_SHARDS` setting.
+
+Every paragraph lives on the shard picked by a jump consistent hash of its id, along with its word counts,
+signature and LSH buckets. Appending a shard only moves the paragraphs the new shard takes over, about one in
+every new shard count, see the `rebalance_shards` command. Ids are allocated from the paragraph id sequence of the
+primary, so they are unique across shards. Reads spanning every shard run on all of them at once, each on its own
+thread and connection, and their results, sorted alike, are merged.
+"""
+import heapq
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    connections,
+)
+
+_UINT64 = (1 << 64) - 1
+
+
+def get_shards():
+    """Return the aliases of the databases holding paragraphs, in the order they were added."""
+    return settings.PARAGRAPH_SHARDS['ALIASES']
+
+
+def is_sharded():
+    """Return whether paragraphs are spread over other databases than the primary."""
+    return get_shards() != [DEFAULT_DB_ALIAS]
+
+
+def jump_hash(key, buckets):
+    """
+    Return the bucket of integer `key` among `buckets` buckets, with the jump consistent hash of Lamping and Veach.
+
+    Growing from n to n + 1 buckets only moves keys to the new bucket, about one key in n + 1.
+    """
+    key &= _UINT64
+    bucket, candidate = -1, 0
+    while candidate < buckets:
+        bucket = candidate
+        key = (key * 2862933555777941757 + 1) & _UINT64
+        candidate = int((bucket + 1) * ((1 << 31) / ((key >> 33) + 1)))
+    return bucket
+
+
+def shard_for(paragraph_id, shards=None):
+    """Return the alias of the shard holding the paragraph with `paragraph_id`."""
+    shards = shards or get_shards()
+    return shards[jump_hash(paragraph_id, len(shards))]
+
+
+def group_by_shard(ids):
+    """Return the paragraph `ids` grouped by the alias of their shard."""
+    groups = defaultdict(list)
+    for paragraph_id in ids:
+        groups[shard_for(paragraph_id)].append(paragraph_id)
+    return groups
+
+
+def allocate_ids(count):
+    """Return `count` new paragraph ids in ascending order, drawn from the id sequence of the primary."""
+    if count < 1:
+        return []
+    with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+        cursor.execute(
+            "SELECT nextval(pg_get_serial_sequence('core_paragraph', 'id')) FROM generate_series(1, %s)", [count],
+        )
+        return sorted(paragraph_id for paragraph_id, in cursor.fetchall())
+
+
+def scatter(function, shards=None):
+    """
+    Return the results of `function(alias)` for every shard, in shard order, calling it on all shards at once.
+
+    Calls run on threads of their own, at most `MAX_WORKERS` at a time, with the context of the caller, so their
+    queries count towards the request being served. Their connections are closed afterwards unless persistent
+    connections are configured, as Django does at the end of a request.
+    """
+    shards = shards or get_shards()
+    if len(shards) == 1:
+        return [function(shards[0])]
+
+    def call(alias):
+        try:
+            return function(alias)
+        finally:
+            for connection in connections.all():
+                connection.close_if_unusable_or_obsolete()
+
+    with ThreadPoolExecutor(max_workers=min(len(shards), settings.PARAGRAPH_SHARDS['MAX_WORKERS'])) as executor:
+        futures = [executor.submit(copy_context().run, call, alias) for alias in shards]
+        return [future.result() for future in futures]
+
+
+def merge(results, key=None, reverse=False, limit=None):
+    """
+    Return the k-way merge of `results`, iterables sorted by `key`, keeping the first `limit` items.
+
+    Items of equal key found on several shards are kept once: they are the same paragraph, read from both shards
+    while `rebalance_shards` moves it.
+    """
+    key = key or (lambda item: item)
+    merged = []
+    previous = object()
+    for item in heapq.merge(*results, key=key, reverse=reverse):
+        if limit is not None and len(merged) >= limit:
+            break
+        item_key = key(item)
+        if item_key != previous:
+            merged.append(item)
+            previous = item_key
+    return merged
+
+
+def imerge(results, key=None):
+    """Yield the items of `results`, iterables sorted by `key`, in order and lazily, see `merge`."""
+    key = key or (lambda item: item)
+    previous = object()
+    for item in heapq.merge(*results, key=key):
+        item_key = key(item)
+        if item_key != previous:
+            yield item
+            previous = item_key
+
+
+class ShardedQuerySet:
+    """
+    Paragraph queryset spanning every shard, answering the few queryset operations of the cursor pagination.
+
+    Filters and orderings apply to the queryset of every shard. Slices run on all shards at once, each shard
+    returning up to the end of the slice, and the rows of the shards are merged by the ordering, which must be a
+    single field, before the slice applies.
+    """
+
+    def __init__(self, queryset, shards=None):
+        self.queryset = queryset
+        self.shards = shards or get_shards()
+
+    def _clone(self, queryset):
+        return type(self)(queryset, self.shards)
+
+    def order_by(self, *fields):
+        return self._clone(self.queryset.order_by(*fields))
+
+    def filter(self, *args, **kwargs):
+        return self._clone(self.queryset.filter(*args, **kwargs))
+
+    def count(self):
+        return sum(scatter(lambda alias: self.queryset.using(alias).count(), self.shards))
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError('Sharded querysets only support slices.')
+        start, stop = item.start or 0, item.stop
+        ordering = self.queryset.query.order_by
+        if len(ordering) != 1:
+            raise TypeError('Sharded querysets are merged by a single ordering field.')
+        field = ordering[0].lstrip('-')
+
+        def fetch(alias):
+            queryset = self.queryset.using(alias)
+            return list(queryset[:stop] if stop is not None else queryset)
+
+        rows = merge(
+            scatter(fetch, self.shards),
+            key=lambda row: getattr(row, field),
+            reverse=ordering[0].startswith('-'),
+            limit=stop,
+        )
+        return rows[start:]
@@ -0,0 +1,12 @@
+"""
+Signals sent when paragraphs are stored or deleted, whichever way it happens.
+
+Unlike `post_save` and `post_delete`, these are also sent for bulk inserts and queryset deletes. They are sent
+within the transaction writing the paragraphs, with the list of affected `paragraphs` (only `id` and `text` are
+guaranteed to be loaded) and the database alias in `using`. An update of the text of a paragraph is sent as the
+removal of its previous text followed by the addition of the new one.
+"""
+from django.dispatch import Signal
+
+paragraphs_added = Signal()
+paragraphs_removed = Signal()
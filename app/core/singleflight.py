@@ -0,0 +1,199 @@
+"""
+Single-flight execution of identical concurrent computations, configured by the `SINGLE_FLIGHT` setting.
+
+Within a process, concurrent calls with the same key share one execution: the first caller, the leader, runs the
+computation while the others wait for its outcome, result or exception, for at most `TIMEOUT` seconds. Callers
+giving up on waiting run the computation themselves. Outcomes are shared as is, callers must not modify them.
+
+Processes cannot share outcomes, but they can avoid computing them at the same time. With `DATABASE_LOCKS`, leaders
+hold a Postgres advisory lock derived from the key while they run, so the leader of another process runs after
+them and finds what they cached. Leaders poll for the lock every `LOCK_POLL_INTERVAL` seconds, for at most `TIMEOUT`
+seconds, and run without it afterwards. Computations are expected to check the caches they fill again, once they
+hold the lock.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from hashlib import sha1
+
+from django.conf import settings
+from django.db import (
+    DEFAULT_DB_ALIAS,
+    connections,
+)
+
+from core import metrics
+
+CALLS = metrics.registry.counter(
+    'single_flight_calls_total',
+    'Calls of coalesced computations: led, shared with a concurrent call, or given up on after a timeout.',
+    ['name', 'outcome'],
+)
+LOCK_TIMEOUTS = metrics.registry.counter(
+    'single_flight_lock_timeouts_total',
+    'Computations run without their advisory lock, held by another process for too long.',
+    ['name'],
+)
+
+
+def lock_id(key):
+    """Return the advisory lock id of `key`, a signed 64-bit integer."""
+    return int.from_bytes(sha1(key.encode()).digest()[:8], 'big', signed=True)
+
+
+class _Call:
+    """Outcome of an in-flight computation, set once `done` is."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.exception = None
+
+
+class SingleFlight:
+    """Computations coalesced by key, named `name` in advisory locks and metrics."""
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return settings.SINGLE_FLIGHT
+
+    def do(self, key, function):
+        """Return `function()`, run once for the concurrent calls with the same `key`."""
+        if not self.config['ENABLED']:
+            return function()
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leading = True
+            else:
+                leading = False
+
+        if not leading:
+            if not call.done.wait(self.config['TIMEOUT']):
+                CALLS.inc(name=self.name, outcome='timeout')
+                return function()
+            CALLS.inc(name=self.name, outcome='shared')
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        CALLS.inc(name=self.name, outcome='led')
+        try:
+            with self.database_lock([key]):
+                call.result = function()
+            return call.result
+        except Exception as exception:
+            call.exception = exception
+            raise
+        finally:
+            self._finish({key: call})
+
+    def do_many(self, keys, function):
+        """
+        Return a `(results, errors)` pair of dicts keyed by the `keys` whose computation succeeded or failed.
+
+        `function` is called with the list of keys no concurrent call is computing and returns such a pair as well,
+        the outcomes of the other keys are waited for. Keys whose wait times out are computed by a second call.
+        """
+        keys = list(dict.fromkeys(keys))
+        if not self.config['ENABLED']:
+            return function(keys)
+
+        led = {}
+        shared = {}
+        with self._lock:
+            for key in keys:
+                call = self._calls.get(key)
+                if call is None:
+                    led[key] = self._calls[key] = _Call()
+                else:
+                    shared[key] = call
+
+        results = {}
+        errors = {}
+        if led:
+            CALLS.inc(len(led), name=self.name, outcome='led')
+            led_results, led_errors = {}, {}
+            try:
+                with self.database_lock(led):
+                    led_results, led_errors = function(list(led))
+            except Exception as exception:
+                for call in led.values():
+                    call.exception = exception
+                raise
+            finally:
+                for key, call in led.items():
+                    if call.exception is None:
+                        call.result = led_results.get(key)
+                        call.error = led_errors.get(key)
+                self._finish(led)
+            results.update(led_results)
+            errors.update(led_errors)
+
+        deadline = time.monotonic() + self.config['TIMEOUT']
+        timed_out = []
+        for key, call in shared.items():
+            if not call.done.wait(max(deadline - time.monotonic(), 0)):
+                timed_out.append(key)
+                continue
+            if call.exception is not None:
+                raise call.exception
+            if call.result is not None:
+                results[key] = call.result
+            if call.error is not None:
+                errors[key] = call.error
+        if shared:
+            CALLS.inc(len(shared) - len(timed_out), name=self.name, outcome='shared')
+        if timed_out:
+            CALLS.inc(len(timed_out), name=self.name, outcome='timeout')
+            fallback_results, fallback_errors = function(timed_out)
+            results.update(fallback_results)
+            errors.update(fallback_errors)
+        return results, errors
+
+    def _finish(self, calls):
+        with self._lock:
+            for key in calls:
+                del self._calls[key]
+        for call in calls.values():
+            call.done.set()
+
+    @contextmanager
+    def database_lock(self, keys):
+        """Hold the advisory locks of `keys` on the default database, or as many as could be taken in time."""
+        if not self.config['DATABASE_LOCKS']:
+            yield
+            return
+
+        pending = sorted({lock_id(f'{self.name}:{key}') for key in keys})
+        held = []
+        deadline = time.monotonic() + self.config['TIMEOUT']
+        connection = connections[DEFAULT_DB_ALIAS]
+        try:
+            with connection.cursor() as cursor:
+                while True:
+                    cursor.execute(
+                        'SELECT id FROM unnest(%s::bigint[]) AS id WHERE pg_try_advisory_lock(id)', [pending],
+                    )
+                    taken = {row[0] for row in cursor.fetchall()}
+                    held.extend(taken)
+                    pending = [lock for lock in pending if lock not in taken]
+                    if not pending:
+                        break
+                    if time.monotonic() >= deadline:
+                        LOCK_TIMEOUTS.inc(name=self.name)
+                        break
+                    time.sleep(self.config['LOCK_POLL_INTERVAL'])
+            yield
+        finally:
+            if held:
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_advisory_unlock(id) FROM unnest(%s::bigint[]) AS id', [held])
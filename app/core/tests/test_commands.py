@@ -1,13 +1,48 @@
 """
 Test custom Django management commands.
 """
+import json
+import os
+import tempfile
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2OpError
 
+from django.conf import settings
 from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import (
+    DatabaseError,
+    connection,
+)
+from django.db.models import F
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.utils import timezone
+
+from core import (
+    minhash,
+    signals,
+)
+from core.management.commands.import_paragraphs import BULK_INDEXES
+from core.generation import get_generation
+from core.models import (
+    CommonWord,
+    IngestJob,
+    Paragraph,
+    ParagraphSignature,
+    SignatureBucket,
+    WordDefinition,
+    WordFrequency,
+    copy_rows,
+)
+from paragraph import ingest
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -32,3 +67,378 @@ class CommandTests(SimpleTestCase):
 
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class RebuildWordFrequenciesCommandTests(TestCase):
+    """Test the word frequency rebuild command."""
+
+    def test_rebuild_word_frequencies(self):
+        """Test the table is recounted from the stored paragraphs."""
+        Paragraph.objects.create(text='this this test')
+        Paragraph.objects.create(text='this paragraph')
+        WordFrequency.objects.update(count=0)
+        WordFrequency.objects.create(word='stale', count=7, doc_count=1)
+
+        call_command('rebuild_word_frequencies', stdout=StringIO())
+
+        frequencies = {w.word: (w.count, w.doc_count) for w in WordFrequency.objects.all()}
+        self.assertEqual(frequencies, {'this': (3, 2), 'test': (1, 1), 'paragraph': (1, 1)})
+
+
+class RecomputeCommonWordsCommandTests(TestCase):
+    """Test the common words estimation command."""
+
+    def test_recompute_common_words(self):
+        """Test the most common words are stored with the bounds of their counts."""
+        Paragraph.objects.create(text='this this test')
+        Paragraph.objects.create(text='this paragraph test')
+        Paragraph.objects.create(text='another paragraph of words')
+        CommonWord.objects.create(word='stale', count=7, error=0, guaranteed=True, generation=0)
+        out = StringIO()
+
+        call_command('recompute_common_words', '--capacity', '2', '--chunk-size', '1', '--processes', '1',
+                     '--limit', '2', stdout=out)
+
+        # Words are dropped from the summary as soon as it holds more than 2 words, counts are overestimated.
+        common_words = list(CommonWord.objects.order_by('-count', 'word').values_list('word', 'count', 'error'))
+        self.assertEqual(len(common_words), 2)
+        word, count, error = common_words[0]
+        self.assertEqual(word, 'this')
+        self.assertLessEqual(count - error, 3)
+        self.assertLessEqual(3, count)
+        self.assertEqual(set(CommonWord.objects.values_list('generation', flat=True)), {get_generation()})
+        self.assertIn(f'this: {count - error} to {count}', out.getvalue())
+        self.assertIn('Counted 10 words', out.getvalue())
+
+        call_command('recompute_common_words', '--processes', '1', stdout=StringIO())
+
+        self.assertEqual(CommonWord.objects.order_by('-count', 'word').values_list('word', 'count', 'error')[0],
+                         ('this', 3, 0))
+
+    def test_limit_above_capacity(self):
+        with self.assertRaises(CommandError):
+            call_command('recompute_common_words', '--capacity', '2', '--limit', '3', stdout=StringIO())
+
+
+class BenchmarkCommonWordsCommandTests(TestCase):
+    """Test the common words benchmark command."""
+
+    def test_benchmark_common_words(self):
+        Paragraph.objects.create(text='this this test paragraph')
+        Paragraph.objects.create(text='this paragraph of many different words')
+        out = StringIO()
+
+        call_command('benchmark_common_words', '--capacity', '2', '--capacity', '20', '--top', '2',
+                     '--chunk-size', '1', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['distinct_words'], 7)
+        self.assertIn('peak_bytes', report['exact'])
+        self.assertEqual(report['capacity_20']['recall'], 1.0)
+        self.assertEqual(report['capacity_20']['max_overcount'], 0)
+        self.assertTrue(report['capacity_2']['bounds_hold'])
+
+
+class RebuildParagraphSignaturesCommandTests(TestCase):
+    """Test the paragraph signatures rebuild command."""
+
+    def test_rebuild_paragraph_signatures(self):
+        """Test signatures and buckets are recomputed from the stored paragraphs."""
+        first = Paragraph.objects.create(text='the quick brown fox')
+        Paragraph.objects.create(text='jumps over the lazy dog')
+        expected = {row.paragraph_id: row.signature.tobytes() for row in ParagraphSignature.objects.all()}
+        ParagraphSignature.objects.filter(paragraph=first).delete()
+        SignatureBucket.objects.filter(paragraph=first).delete()
+
+        call_command('rebuild_paragraph_signatures', '--chunk-size', '1', stdout=StringIO())
+
+        signatures = {row.paragraph_id: row.signature.tobytes() for row in ParagraphSignature.objects.all()}
+        self.assertEqual(signatures, expected)
+        self.assertEqual(SignatureBucket.objects.filter(paragraph=first).count(), SignatureBucket.objects.count() / 2)
+
+
+class BenchmarkSimilarityCommandTests(TestCase):
+    """Test the similarity benchmark command."""
+
+    def test_benchmark_similarity(self):
+        Paragraph.objects.create(text='the quick brown fox jumps over the lazy dog today')
+        Paragraph.objects.create(text='the quick brown fox jumps over the lazy dog tonight')
+        Paragraph.objects.create(text='something completely different written here')
+        out = StringIO()
+
+        call_command('benchmark_similarity', '--shape', '32x4', '--queries', '3', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['similar_pairs'], 2)
+        self.assertEqual(report['lsh_32x4']['recall'], 1.0)
+        self.assertIn('p95_ms', report['lsh_database'])
+
+
+class SeedCorpusCommandTests(TestCase):
+    """Test the synthetic corpus command."""
+
+    def test_seed_corpus(self):
+        """Test paragraphs are stored with their derived data, the function words being the most frequent."""
+        call_command('seed_corpus', '--paragraphs', '25', '--batch-size', '10', stdout=StringIO())
+
+        self.assertEqual(Paragraph.objects.count(), 25)
+        self.assertEqual(ParagraphSignature.objects.count(), 25)
+        self.assertEqual(WordFrequency.objects.order_by('-count').first().word, 'the')
+
+    def test_seed_corpus_is_reproducible(self):
+        """Test the same seed generates the same paragraphs."""
+        call_command('seed_corpus', '--paragraphs', '5', '--seed', '7', stdout=StringIO())
+        texts = list(Paragraph.objects.order_by('id').values_list('text', flat=True))
+
+        call_command('seed_corpus', '--paragraphs', '5', '--seed', '7', '--clear', stdout=StringIO())
+
+        self.assertEqual(list(Paragraph.objects.order_by('id').values_list('text', flat=True)), texts)
+
+
+class ImportExportParagraphsCommandTests(TestCase):
+    """Test the COPY based import and export commands."""
+
+    TEXTS = ['plain words here', 'tabs\tand\\backslashes', 'two\nlines of words', 'plain words again']
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def write(self, name, lines):
+        with open(self.path(name), 'w', encoding='utf-8') as output:
+            output.write('\n'.join(lines) + '\n')
+        return self.path(name)
+
+    def test_import_ndjson(self):
+        """Test paragraphs are copied as is, with their search vector, signature and word counts."""
+        Paragraph.objects.create(text='plain existing paragraph')
+        path = self.write('corpus.ndjson', [json.dumps({'text': text}) for text in self.TEXTS] + [''])
+        out = StringIO()
+
+        call_command('import_paragraphs', path, '--chunk-size', '3', stdout=out)
+
+        texts = list(Paragraph.objects.order_by('id').values_list('text', flat=True))
+        self.assertEqual(texts, ['plain existing paragraph', *self.TEXTS])
+        self.assertEqual(Paragraph.objects.filter(search_vector__isnull=True).count(), 0)
+        self.assertEqual(ParagraphSignature.objects.count(), 5)
+        imported = Paragraph.objects.get(text=self.TEXTS[1])
+        self.assertEqual(ingest.find_duplicate(minhash.signature(self.TEXTS[1])), imported.id)
+        self.assertEqual(WordFrequency.objects.get(word='plain').count, 3)
+        self.assertEqual(WordFrequency.objects.get(word='words').doc_count, 3)
+        self.assertIn('Copied 3 paragraphs', out.getvalue())
+        self.assertIn('Imported 4 paragraphs', out.getvalue())
+        self.assertIn('rows/s', out.getvalue())
+
+    def test_import_text_dropping_indexes(self):
+        """Test every line is a paragraph and the dropped indexes are built again."""
+        path = self.write('corpus.txt', ['first paragraph', '', 'second paragraph'])
+
+        call_command('import_paragraphs', path, '--drop-indexes', stdout=StringIO())
+
+        self.assertEqual(list(Paragraph.objects.order_by('id').values_list('text', flat=True)),
+                         ['first paragraph', 'second paragraph'])
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT indexname FROM pg_indexes WHERE indexname = ANY(%s)', [BULK_INDEXES])
+            self.assertEqual(sorted(name for name, in cursor.fetchall()), sorted(BULK_INDEXES))
+        self.assertEqual(len(BULK_INDEXES), 2)
+
+    def test_interrupted_import_keeps_derived_data(self):
+        """Test the chunks copied before a failure are stored with their word counts and announced."""
+        path = self.write('corpus.txt', ['plain first', 'plain second', 'plain third'])
+        generation = get_generation()
+        added = []
+
+        def receive(sender, paragraphs, using, **kwargs):
+            added.extend(paragraph.text for paragraph in paragraphs)
+
+        signals.paragraphs_added.connect(receive, sender=Paragraph)
+        self.addCleanup(signals.paragraphs_added.disconnect, receive, sender=Paragraph)
+        copies = []
+
+        def copy_once(*args):
+            copies.append(args)
+            if len(copies) > 1:
+                raise DatabaseError('connection lost')
+            copy_rows(*args)
+
+        with patch('core.management.commands.import_paragraphs.copy_rows', side_effect=copy_once):
+            with self.assertRaises(DatabaseError):
+                call_command('import_paragraphs', path, '--chunk-size', '2', stdout=StringIO())
+
+        self.assertEqual(sorted(Paragraph.objects.values_list('text', flat=True)), ['plain first', 'plain second'])
+        self.assertEqual(WordFrequency.objects.get(word='plain').count, 2)
+        self.assertFalse(WordFrequency.objects.filter(word='third').exists())
+        self.assertGreater(get_generation(), generation)
+        self.assertEqual(added, ['plain first', 'plain second'])
+
+    def test_import_invalid_line(self):
+        path = self.write('corpus.ndjson', [json.dumps({'text': 'fine'}), json.dumps({'body': 'wrong'})])
+
+        with self.assertRaisesMessage(CommandError, 'Line 2'):
+            call_command('import_paragraphs', path, stdout=StringIO())
+
+    def test_export_ndjson_round_trip(self):
+        """Test exported paragraphs import back to the same texts."""
+        paragraphs = [Paragraph.objects.create(text=text) for text in self.TEXTS]
+        out = StringIO()
+
+        call_command('export_paragraphs', self.path('dump.ndjson'), '--progress-every', '2', stdout=out)
+
+        with open(self.path('dump.ndjson'), encoding='utf-8') as dump:
+            rows = [json.loads(line) for line in dump]
+        self.assertEqual(rows, [{'id': paragraph.id, 'text': paragraph.text} for paragraph in paragraphs])
+        self.assertIn('Wrote 2 paragraphs', out.getvalue())
+        self.assertIn('Exported 4 paragraphs', out.getvalue())
+
+        Paragraph.objects.all().delete()
+        call_command('import_paragraphs', self.path('dump.ndjson'), stdout=StringIO())
+        self.assertEqual(list(Paragraph.objects.order_by('id').values_list('text', flat=True)), self.TEXTS)
+
+    def test_export_text_to_stdout(self):
+        Paragraph.objects.create(text='two\r\nlines')
+        Paragraph.objects.create(text='one line, with "quotes"')
+        out = StringIO()
+
+        call_command('export_paragraphs', '-', stdout=out, stderr=StringIO())
+
+        self.assertEqual(out.getvalue(), 'two lines\none line, with "quotes"\n')
+
+
+class BenchmarkEndpointsCommandTests(TestCase):
+    """Test the endpoint benchmark command."""
+
+    def setUp(self):
+        call_command('seed_corpus', '--paragraphs', '30', '--vocabulary', '200', stdout=StringIO())
+        # Definitions of the most common words are served from the database instead of the dictionary API.
+        for word in WordFrequency.objects.values_list('word', flat=True):
+            WordDefinition.objects.create(
+                word=word, payload=[{'word': word}], status=WordDefinition.Status.FOUND, fetched_at=timezone.now(),
+            )
+
+    def test_benchmark_endpoints(self):
+        """Test every scenario is measured and reported as JSON."""
+        out = StringIO()
+
+        call_command('benchmark_endpoints', '--requests', '2', '--warmup', '1', '--memory-samples', '1', stdout=out)
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['paragraphs'], 30)
+        self.assertEqual(len(report['scenarios']), 12)
+        for name, results in report['scenarios'].items():
+            self.assertEqual(results['errors'], 0, name)
+            self.assertGreater(results['queries_mean'], 0, name)
+            self.assertIn('p99_ms', results)
+        self.assertEqual(report['scenarios']['search_revalidate']['queries_max'], 1)
+
+    def test_benchmark_endpoints_baseline(self):
+        """Test the selected scenarios are written to a file and compared with an earlier report."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'report.json')
+            options = ['--requests', '2', '--warmup', '1', '--scenario', 'dictionary', '--output', path]
+            call_command('benchmark_endpoints', *options, stdout=StringIO())
+            call_command('benchmark_endpoints', *options, '--baseline', path, stdout=StringIO())
+
+            with open(path) as report_file:
+                report = json.load(report_file)
+        self.assertEqual(list(report['scenarios']), ['dictionary'])
+        self.assertEqual(list(report['baseline']['ratios']), ['dictionary'])
+
+
+class ProcessIngestJobsCommandTests(TransactionTestCase):
+    """Test the ingestion worker command."""
+
+    @patch('paragraph.api_client.get_paragraph', side_effect=['first text', 'second text', 'third text'])
+    def test_process_ingest_jobs(self, patched_get_paragraph):
+        """Test queued jobs are run in one batch and their paragraphs stored."""
+        first = IngestJob.objects.create(requested=2)
+        second = IngestJob.objects.create(requested=1)
+
+        call_command('process_ingest_jobs', '--once', stdout=StringIO())
+
+        self.assertEqual(
+            sorted(Paragraph.objects.values_list('text', flat=True)), ['first text', 'second text', 'third text'],
+        )
+        for job, stored in ((first, 2), (second, 1)):
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.stored, job.failed, job.attempts), ('done', stored, 0, 1))
+            self.assertIsNotNone(job.finished_at)
+
+    @patch('paragraph.api_client.get_paragraph', side_effect=Exception('unavailable'))
+    def test_failed_jobs_are_retried(self, patched_get_paragraph):
+        """Test jobs without any fetched paragraph are retried later, then given up."""
+        job = IngestJob.objects.create(requested=2)
+
+        call_command('process_ingest_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), ('pending', 1, 'unavailable'))
+        self.assertGreater(job.run_after, job.started_at)
+
+        IngestJob.objects.update(run_after=job.started_at)
+        with override_settings(PARAGRAPH_INGEST={**settings.PARAGRAPH_INGEST, 'MAX_ATTEMPTS': 2}):
+            call_command('process_ingest_jobs', '--once', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.failed), ('failed', 2, 2))
+        self.assertFalse(Paragraph.objects.exists())
+
+    @override_settings(PARAGRAPH_INGEST={**settings.PARAGRAPH_INGEST, 'MAX_WORKERS': 1})
+    @patch('paragraph.api_client.get_paragraph',
+           side_effect=['first text', Exception('unavailable'), 'third text', Exception('timed out')])
+    def test_jobs_record_their_own_errors(self, patched_get_paragraph):
+        """Test each job records the errors of its own fetches only."""
+        first = IngestJob.objects.create(requested=1)
+        second = IngestJob.objects.create(requested=1)
+        third = IngestJob.objects.create(requested=2)
+
+        ingest.run_jobs(10)
+
+        for job in (first, second, third):
+            job.refresh_from_db()
+        self.assertEqual((first.status, first.stored, first.error), ('done', 1, ''))
+        self.assertEqual((second.status, second.stored, second.error), ('pending', 0, 'unavailable'))
+        self.assertEqual((third.status, third.stored, third.failed, third.error), ('done', 1, 1, 'timed out'))
+
+    def test_jobs_taken_over_are_not_stored(self):
+        """Test a worker whose job was claimed again by another worker drops its results."""
+        job = IngestJob.objects.create(requested=1)
+
+        def take_over():
+            IngestJob.objects.filter(id=job.id).update(attempts=F('attempts') + 1)
+            return 'late text'
+
+        with patch('paragraph.api_client.get_paragraph', side_effect=take_over):
+            ingest.run_jobs(10)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.stored), ('running', 0))
+        self.assertFalse(Paragraph.objects.exists())
+
+
+class LoadtestUpstreamCommandTests(TransactionTestCase):
+    """Test the command comparing the sync and async views under load."""
+
+    def test_loadtest_upstream(self):
+        """Test every endpoint is loaded in every mode against the stub, storing the fetched paragraphs."""
+        Paragraph.objects.create(text='alpha beta')
+        out = StringIO()
+
+        call_command(
+            'loadtest_upstream', '--current-database', '--requests', '4', '--warmup', '1', '--concurrency', '2',
+            '--threads', '2', '--delay', '0', stdout=out, stderr=StringIO(),
+        )
+
+        report = json.loads(out.getvalue())
+        self.assertEqual(list(report['runs']), ['get', 'dictionary'])
+        for endpoint, status in (('get', '201'), ('dictionary', '200')):
+            for mode in ('async', 'sync_asgi', 'sync_threads'):
+                run = report['runs'][endpoint][mode]
+                self.assertEqual((run['requests'], run['errors'], run['statuses']), (4, 0, {status: 4}))
+                self.assertGreater(run['throughput_rps'], 0)
+        self.assertEqual(Paragraph.objects.count(), 1 + 3 * (4 + 1))
+        self.assertEqual(
+            set(WordDefinition.objects.values_list('word', flat=True)), {'alpha', 'beta', 'stub', 'paragraph', 'text'},
+        )
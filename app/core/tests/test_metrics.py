@@ -0,0 +1,112 @@
+"""
+Tests for the request metrics and the /metrics endpoint.
+"""
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core import metrics
+from core.models import Paragraph
+
+METRICS_URL = reverse('metrics')
+SEARCH_URL = reverse('paragraph:paragraph-list')
+SEARCH_ENDPOINT = 'paragraph:paragraph-list'
+
+SLOW_REQUEST_SETTINGS = {
+    'ENABLED': True,
+    'SLOW_REQUEST_MS': 0.001,
+    'SLOW_REQUEST_QUERIES': 2,
+    'SLOW_REQUEST_EXPLAIN': True,
+}
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """Test the rendering of metrics in the Prometheus text format."""
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('latency_seconds', 'Latency.', ['endpoint'], buckets=(0.1, 1))
+        histogram.observe(0.05, endpoint='a')
+        histogram.observe(0.5, endpoint='a')
+
+        self.assertEqual(self.registry.render(), (
+            '# HELP latency_seconds Latency.\n'
+            '# TYPE latency_seconds histogram\n'
+            'latency_seconds_bucket{endpoint="a",le="0.1"} 1\n'
+            'latency_seconds_bucket{endpoint="a",le="1.0"} 2\n'
+            'latency_seconds_bucket{endpoint="a",le="+Inf"} 2\n'
+            'latency_seconds_sum{endpoint="a"} 0.55\n'
+            'latency_seconds_count{endpoint="a"} 2\n'
+        ))
+
+    def test_counter_escapes_labels(self):
+        counter = self.registry.counter('errors_total', 'Errors.', ['reason'])
+        counter.inc(reason='say "hi"\n')
+        counter.inc(2, reason='say "hi"\n')
+
+        self.assertIn('errors_total{reason="say \\"hi\\"\\n"} 3\n', self.registry.render())
+
+    def test_labels_must_match(self):
+        counter = self.registry.counter('errors_total', 'Errors.', ['reason'])
+
+        with self.assertRaises(ValueError):
+            counter.inc(host='a')
+
+    def test_callback(self):
+        self.registry.register_callback('open', 'Open.', 'gauge', lambda: [({'host': 'a'}, 1)])
+
+        self.assertIn('open{host="a"} 1\n', self.registry.render())
+
+
+class RequestMetricsTests(TestCase):
+    """Test the metrics recorded by the middleware and served on /metrics."""
+
+    def setUp(self):
+        self.client = APIClient()
+        metrics.registry.clear()
+        Paragraph.objects.create(text='metrics are recorded')
+
+    def test_request_metrics(self):
+        self.client.get(SEARCH_URL, {'words': 'metrics', 'operator': 'or'})
+
+        response = self.client.get(METRICS_URL)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertIn(
+            f'http_request_duration_seconds_count{{method="GET",endpoint="{SEARCH_ENDPOINT}",status="200"}} 1\n', body,
+        )
+        for stage in ('query', 'serialize', 'sql'):
+            self.assertIn(
+                f'http_request_stage_duration_seconds_count{{endpoint="{SEARCH_ENDPOINT}",stage="{stage}"}} 1\n', body,
+            )
+        self.assertIn(f'http_request_db_queries_count{{endpoint="{SEARCH_ENDPOINT}"}} 1\n', body)
+        self.assertIn('search_cache_lookups_total{result="misses"} 1\n', body)
+        self.assertGreater(metrics.QUERY_DURATION.count(endpoint=SEARCH_ENDPOINT), 0)
+
+    def test_unmatched_requests(self):
+        self.client.get('/missing')
+
+        self.assertEqual(metrics.REQUEST_DURATION.count(method='GET', endpoint='unmatched', status='404'), 1)
+
+    @override_settings(REQUEST_METRICS={**SLOW_REQUEST_SETTINGS, 'ENABLED': False})
+    def test_disabled(self):
+        self.client.get(SEARCH_URL)
+
+        self.assertEqual(metrics.REQUEST_DURATION.count(method='GET', endpoint=SEARCH_ENDPOINT, status='200'), 0)
+
+    @override_settings(REQUEST_METRICS=SLOW_REQUEST_SETTINGS)
+    def test_slow_request_log(self):
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get(SEARCH_URL, {'words': 'metrics', 'operator': 'or'})
+
+        message = logs.output[0]
+        self.assertIn(f'Slow request GET /paragraph/search/?words=metrics&operator=or ({SEARCH_ENDPOINT})', message)
+        self.assertIn('Plan of the slowest query:', message)
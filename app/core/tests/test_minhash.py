@@ -0,0 +1,48 @@
+"""
+Tests for MinHash signatures.
+"""
+import numpy as np
+from django.test import SimpleTestCase
+
+from core import minhash
+
+TEXT = "The quick brown fox jumps over the lazy dog and runs straight into the dark forest before nightfall"
+
+
+class MinHashTests(SimpleTestCase):
+    """Test MinHash signatures and LSH buckets."""
+
+    def test_signature_shape_and_stability(self):
+        signature = minhash.signature(TEXT, bands=8, rows=4)
+
+        self.assertEqual(signature.shape, (32,))
+        self.assertEqual(signature.dtype, np.uint32)
+        np.testing.assert_array_equal(signature, minhash.signature(TEXT.upper(), bands=8, rows=4))
+        np.testing.assert_array_equal(minhash.from_bytes(minhash.to_bytes(signature)), signature)
+
+    def test_similarity_estimates_jaccard(self):
+        near = TEXT.replace('nightfall', 'sunset')
+        other = "Something completely different is written in this other paragraph of text about cooking"
+        signatures = np.stack([minhash.signature(text, bands=32, rows=4) for text in (near, other)])
+
+        scores = minhash.similarities(minhash.signature(TEXT, bands=32, rows=4), signatures)
+
+        # 15 of the 17 shingles are shared by the near-duplicate, none by the other paragraph.
+        self.assertAlmostEqual(scores[0], 15 / 17, delta=0.15)
+        self.assertLess(scores[1], 0.1)
+
+    def test_band_buckets(self):
+        signature = minhash.signature(TEXT, bands=8, rows=4)
+        buckets = minhash.band_buckets(signature, bands=8, rows=4)
+
+        self.assertEqual(buckets.shape, (8,))
+        self.assertEqual(buckets.dtype, np.int64)
+        changed = signature.copy()
+        changed[0] += 1
+        changed_buckets = minhash.band_buckets(changed, bands=8, rows=4)
+        self.assertNotEqual(changed_buckets[0], buckets[0])
+        np.testing.assert_array_equal(changed_buckets[1:], buckets[1:])
+
+    def test_short_and_empty_texts(self):
+        self.assertEqual(len(minhash.shingle_hashes('one text', 3)), 1)
+        self.assertIsNone(minhash.signature('!!', bands=8, rows=4))
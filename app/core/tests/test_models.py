@@ -1,8 +1,26 @@
 """
 Tests for models.
 """
-from core import models
-from django.test import TestCase
+import threading
+from datetime import timedelta
+
+from core import (
+    minhash,
+    models,
+)
+from core.generation import get_generation
+from django.conf import settings
+from django.db import (
+    connection,
+    transaction,
+)
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
 
 
 class ModelTests(TestCase):
@@ -12,3 +30,145 @@ class ModelTests(TestCase):
         """Test creating a paragraph is successful."""
         paragraph = models.Paragraph.objects.create(text='text')
         self.assertEqual(paragraph.text, 'text')
+
+    def test_paragraph_search_vector_maintained(self):
+        """Test the search vector is populated on insert and kept in sync on update."""
+        paragraph = models.Paragraph.objects.create(text='sample paragraph')
+        self.assertTrue(
+            models.Paragraph.objects.filter(id=paragraph.id, search_vector='sample').exists()
+        )
+
+        paragraph.text = 'another text'
+        paragraph.save()
+        self.assertFalse(
+            models.Paragraph.objects.filter(id=paragraph.id, search_vector='sample').exists()
+        )
+        self.assertTrue(
+            models.Paragraph.objects.filter(id=paragraph.id, search_vector='another').exists()
+        )
+
+    def test_word_frequencies_follow_paragraph_writes(self):
+        """Test word frequencies are updated on paragraph insert, update and delete."""
+        first = models.Paragraph.objects.create(text='this this test')
+        models.Paragraph.objects.create(text='this paragraph')
+        frequencies = {w.word: (w.count, w.doc_count) for w in models.WordFrequency.objects.all()}
+        self.assertEqual(frequencies, {'this': (3, 2), 'test': (1, 1), 'paragraph': (1, 1)})
+
+        first.text = 'sample'
+        first.save()
+        frequencies = {w.word: (w.count, w.doc_count) for w in models.WordFrequency.objects.all()}
+        self.assertEqual(frequencies, {'this': (1, 1), 'paragraph': (1, 1), 'sample': (1, 1)})
+
+        models.Paragraph.objects.filter(text='this paragraph').delete()
+        first.delete()
+        self.assertFalse(models.WordFrequency.objects.exists())
+
+    @override_settings(PARAGRAPH_BULK={**settings.PARAGRAPH_BULK, 'BATCH_SIZE': 2})
+    def test_queryset_delete_in_chunks(self):
+        """Test large deletes read the texts of a chunk of paragraphs at a time."""
+        models.Paragraph.objects.bulk_create([models.Paragraph(text=f'text {word}') for word in 'abcde'])
+        models.Paragraph.objects.create(text='kept text')
+
+        with CaptureQueriesContext(connection) as queries:
+            deleted = models.Paragraph.objects.exclude(text='kept text').delete()
+
+        self.assertEqual(deleted, (5, {'core.Paragraph': 5}))
+        text_reads = [query['sql'] for query in queries if query['sql'].endswith('FOR UPDATE')]
+        self.assertEqual(len(text_reads), 4)
+        self.assertTrue(all('LIMIT 2' in sql for sql in text_reads))
+        frequencies = {w.word: (w.count, w.doc_count) for w in models.WordFrequency.objects.all()}
+        self.assertEqual(frequencies, {'kept': (1, 1), 'text': (1, 1)})
+
+    def test_corpus_generation_advances_on_writes(self):
+        """Test the corpus generation advances when paragraphs are added or removed, and once more on commit."""
+        generation = get_generation()
+        with self.captureOnCommitCallbacks(execute=True):
+            paragraph = models.Paragraph.objects.create(text='text')
+        self.assertEqual(get_generation(), generation + 2)
+
+        paragraph.delete()
+        self.assertEqual(get_generation(), generation + 3)
+
+    def test_paragraph_signatures_follow_paragraph_writes(self):
+        """Test signatures and LSH buckets are stored on insert, recomputed on update and dropped on delete."""
+        paragraph = models.Paragraph.objects.create(text='the quick brown fox jumps over the lazy dog')
+        models.Paragraph.objects.bulk_create([models.Paragraph(text='a lazy dog'), models.Paragraph(text='!!')])
+        self.assertEqual(models.ParagraphSignature.objects.count(), 2)
+        signature = models.ParagraphSignature.objects.get(paragraph=paragraph).signature.tobytes()
+        buckets = models.SignatureBucket.objects.filter(paragraph=paragraph)
+        self.assertEqual(buckets.count(), settings.PARAGRAPH_SIMILARITY['BANDS'])
+
+        paragraph.text = 'something else entirely'
+        paragraph.save()
+        self.assertNotEqual(models.ParagraphSignature.objects.get(paragraph=paragraph).signature.tobytes(), signature)
+        self.assertEqual(buckets.count(), settings.PARAGRAPH_SIMILARITY['BANDS'])
+
+        paragraph.delete()
+        self.assertEqual(models.ParagraphSignature.objects.count(), 1)
+        self.assertEqual(models.SignatureBucket.objects.count(), settings.PARAGRAPH_SIMILARITY['BANDS'])
+
+    def test_best_matches_of_many_signatures(self):
+        """Test the stored near-duplicates of several signatures are found in a single query."""
+        text = 'the quick brown fox jumps over the lazy dog and runs straight into the dark forest'
+        paragraph = models.Paragraph.objects.create(text=text)
+        signatures = [minhash.signature(text.upper()), minhash.signature('an unrelated sentence about cats')]
+
+        with self.assertNumQueries(1):
+            matches = models.ParagraphSignature.objects.best_matches(signatures, 0.8)
+
+        self.assertEqual(matches, [(paragraph.id, 1.0), None])
+        self.assertEqual(models.ParagraphSignature.objects.best_matches([], 0.8), [])
+
+
+class IngestJobClaimTests(TransactionTestCase):
+    """Test the claims of queued ingestion jobs by concurrent workers."""
+
+    def test_claim_oldest_jobs(self):
+        first = models.IngestJob.objects.create(requested=1)
+        second = models.IngestJob.objects.create(requested=2)
+        models.IngestJob.objects.create(requested=3)
+
+        jobs = models.IngestJob.objects.claim(2, 'worker', lease=60)
+
+        self.assertEqual([job.id for job in jobs], [first.id, second.id])
+        self.assertEqual({(job.status, job.attempts, job.worker) for job in jobs}, {('running', 1, 'worker')})
+        self.assertEqual(len(models.IngestJob.objects.claim(2, 'other', lease=60)), 1)
+        self.assertEqual(models.IngestJob.objects.claim(2, 'other', lease=60), [])
+
+    def test_claim_skips_locked_jobs(self):
+        """Test jobs being claimed by another worker are skipped instead of waited for."""
+        locked = models.IngestJob.objects.create(requested=1)
+        free = models.IngestJob.objects.create(requested=1)
+        is_locked = threading.Event()
+        release = threading.Event()
+
+        def hold_lock():
+            with transaction.atomic():
+                models.IngestJob.objects.select_for_update().get(id=locked.id)
+                is_locked.set()
+                release.wait(5)
+            connection.close()
+
+        thread = threading.Thread(target=hold_lock)
+        thread.start()
+        is_locked.wait(5)
+        try:
+            jobs = models.IngestJob.objects.claim(10, 'worker', lease=60)
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual([job.id for job in jobs], [free.id])
+
+    def test_claim_due_and_abandoned_jobs(self):
+        """Test retried jobs wait for their delay and jobs running past their lease are claimed again."""
+        later = models.IngestJob.objects.create(requested=1, run_after=timezone.now() + timedelta(minutes=1))
+        abandoned = models.IngestJob.objects.create(
+            requested=1, status='running', attempts=1, started_at=timezone.now() - timedelta(minutes=2),
+        )
+        models.IngestJob.objects.create(requested=1, status='running', attempts=1, started_at=timezone.now())
+
+        jobs = models.IngestJob.objects.claim(10, 'worker', lease=60)
+
+        self.assertEqual([(job.id, job.attempts) for job in jobs], [(abandoned.id, 2)])
+        self.assertEqual(models.IngestJob.objects.get(id=later.id).status, 'pending')
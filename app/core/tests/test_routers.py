@@ -0,0 +1,119 @@
+"""
+Tests for the routing of reads to the read replicas.
+"""
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import router
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (
+    Paragraph,
+    WordFrequency,
+)
+from paragraph import cache
+
+SEARCH_URL = reverse('paragraph:paragraph-list')
+CREATE_URL = reverse('paragraph:create')
+DICTIONARY_URL = reverse('paragraph:dict')
+
+# A second test database stands in for the replica, so tests can tell which database a read went to.
+REPLICA = 'replica_test'
+REPLICA_SETTINGS = {**settings.DATABASE_REPLICAS, 'ALIASES': [REPLICA], 'STICKY_SECONDS': 5}
+
+
+@override_settings(DATABASE_REPLICAS=REPLICA_SETTINGS)
+class ReplicaRoutingTests(TestCase):
+    """Test reads of the search and dictionary views go to the replica, unless the client just wrote."""
+
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.search_results.clear()
+        cache.definitions.clear()
+        Paragraph.objects.create(text='primary only paragraph')
+        Paragraph.objects.using(REPLICA).create(text='replica only paragraph')
+
+    def search(self, word):
+        res = self.client.get(SEARCH_URL, {'words': word, 'operator': 'or'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [paragraph['text'] for paragraph in res.json()['results']]
+
+    def test_search_reads_from_replica(self):
+        self.assertEqual(self.search('replica'), ['replica only paragraph'])
+        self.assertEqual(self.search('primary'), [])
+
+    def test_stream_reads_from_replica(self):
+        res = self.client.get(SEARCH_URL, {'words': 'paragraph', 'operator': 'or', 'stream': 'true'})
+
+        self.assertEqual(b''.join(res.streaming_content).decode().count('\n'), 1)
+
+    @patch('paragraph.api_client.get_word_definition', side_effect=lambda word: f'definition of {word}')
+    def test_dictionary_reads_from_replica(self, patched_get_word_definition):
+        WordFrequency.objects.using(REPLICA).update(count=5)
+
+        res = self.client.get(DICTIONARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('replica', res.json())
+        self.assertNotIn('primary', res.json())
+
+    def test_replica_reads_are_not_cached(self):
+        res = self.client.get(SEARCH_URL, {'words': 'replica', 'operator': 'or'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', res)
+        self.assertEqual(cache.search_results.stats()['misses'], 1)
+
+        # Searches of pinned clients read from the primary, and fill the cache with their results.
+        self.client.cookies[settings.DATABASE_REPLICAS['STICKY_COOKIE']] = '1'
+        res = self.client.get(SEARCH_URL, {'words': 'replica', 'operator': 'or'})
+        self.assertIn('ETag', res)
+        del self.client.cookies[settings.DATABASE_REPLICAS['STICKY_COOKIE']]
+        res = self.client.get(SEARCH_URL, {'words': 'replica', 'operator': 'or'})
+        self.assertEqual(cache.search_results.stats()['hits'], 1)
+        self.assertNotIn('ETag', res)
+
+    @patch('paragraph.api_client.get_paragraph', return_value='fresh written paragraph')
+    def test_writers_read_their_writes(self, patched_get_paragraph):
+        res = self.client.get(CREATE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        cookie = res.cookies[settings.DATABASE_REPLICAS['STICKY_COOKIE']]
+        self.assertEqual(cookie['max-age'], 5)
+        self.assertTrue(Paragraph.objects.filter(text='fresh written paragraph').exists())
+        self.assertFalse(Paragraph.objects.using(REPLICA).filter(text='fresh written paragraph').exists())
+        self.assertEqual(self.search('fresh'), ['fresh written paragraph'])
+
+        # Once the cookie expired, reads go to the replica again.
+        del self.client.cookies[settings.DATABASE_REPLICAS['STICKY_COOKIE']]
+        self.assertEqual(self.search('fresh'), [])
+
+    @patch('paragraph.api_client.get_paragraph', side_effect=Exception('unavailable'))
+    def test_failed_writes_do_not_pin(self, patched_get_paragraph):
+        res = self.client.get(CREATE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertNotIn(settings.DATABASE_REPLICAS['STICKY_COOKIE'], res.cookies)
+
+    def test_writes_go_to_primary(self):
+        paragraph = Paragraph.objects.using(REPLICA).get()
+
+        self.assertEqual(router.db_for_write(Paragraph, instance=paragraph), 'default')
+        self.assertFalse(router.allow_migrate(REPLICA, 'core'))
+        self.assertTrue(router.allow_migrate('default', 'core'))
+
+    @override_settings(DATABASE_REPLICAS={**REPLICA_SETTINGS, 'ALIASES': []})
+    @patch('paragraph.api_client.get_paragraph', return_value='fresh written paragraph')
+    def test_without_replicas(self, patched_get_paragraph):
+        self.assertEqual(self.search('primary'), ['primary only paragraph'])
+
+        res = self.client.get(CREATE_URL)
+        self.assertNotIn(settings.DATABASE_REPLICAS['STICKY_COOKIE'], res.cookies)
@@ -0,0 +1,283 @@
+"""
+Tests for the distribution of paragraphs over shards.
+"""
+from collections import Counter
+from io import StringIO
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import DatabaseError
+from django.test import (
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import (
+    minhash,
+    sharding,
+)
+from core.generation import get_generation
+from core.models import (
+    IngestJob,
+    Paragraph,
+    ParagraphQuerySet,
+    WordFrequency,
+)
+from paragraph import (
+    cache,
+    ingest,
+    search,
+)
+
+SEARCH_URL = reverse('paragraph:paragraph-list')
+DICTIONARY_URL = reverse('paragraph:dict')
+
+# A second test database stands in for the second shard.
+SHARD = 'shard_test'
+SHARD_SETTINGS = {**settings.PARAGRAPH_SHARDS, 'ALIASES': ['default', SHARD], 'MAX_WORKERS': 2}
+
+TEXTS = [f'shared words paragraph {index} with {"rare " * (index % 3)}ending' for index in range(20)]
+
+
+class ShardingHelperTests(SimpleTestCase):
+    """Test the placement and merging helpers."""
+
+    def test_jump_hash_moves_keys_to_new_buckets_only(self):
+        before = [sharding.jump_hash(key, 3) for key in range(3000)]
+        after = [sharding.jump_hash(key, 4) for key in range(3000)]
+
+        moved = [(old, new) for old, new in zip(before, after) if old != new]
+        self.assertTrue(all(new == 3 for old, new in moved))
+        self.assertAlmostEqual(len(moved) / 3000, 1 / 4, delta=0.05)
+        self.assertEqual(set(before), {0, 1, 2})
+
+    def test_merge(self):
+        merged = sharding.merge([[1, 4, 6], [2, 4, 5, 9], []], limit=5)
+
+        self.assertEqual(merged, [1, 2, 4, 5, 6])
+        self.assertEqual(sharding.merge([[6, 4], [5, 1]], reverse=True), [6, 5, 4, 1])
+        self.assertEqual(list(sharding.imerge([[(1, 'a'), (3, 'c')], [(2, 'b')]], key=lambda row: row[0])),
+                         [(1, 'a'), (2, 'b'), (3, 'c')])
+
+
+@override_settings(PARAGRAPH_SHARDS=SHARD_SETTINGS)
+class ShardedParagraphTests(TransactionTestCase):
+    """Test paragraphs are stored on the shard of their id and read back from all shards."""
+
+    databases = {'default', SHARD}
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.search_results.clear()
+        cache.definitions.clear()
+        self.paragraphs = Paragraph.objects.bulk_create([Paragraph(text=text) for text in TEXTS])
+        self.paragraphs.append(Paragraph.objects.create(text='a single rare paragraph'))
+
+    def stored_ids(self, alias):
+        return set(Paragraph.objects.using(alias).values_list('id', flat=True))
+
+    def test_paragraphs_stored_on_their_shard(self):
+        ids = [paragraph.id for paragraph in self.paragraphs]
+        self.assertEqual(len(set(ids)), len(TEXTS) + 1)
+        for alias in SHARD_SETTINGS['ALIASES']:
+            stored = self.stored_ids(alias)
+            self.assertTrue(stored)
+            self.assertEqual(stored, {paragraph_id for paragraph_id in ids
+                                      if sharding.shard_for(paragraph_id) == alias})
+
+        # Derived data follows the paragraphs.
+        counts = Counter()
+        for alias in SHARD_SETTINGS['ALIASES']:
+            counts.update(dict(WordFrequency.objects.using(alias).values_list('word', 'count')))
+        self.assertEqual(counts['shared'], len(TEXTS))
+
+        self.paragraphs[0].delete()
+        self.assertFalse(any(self.paragraphs[0].id in self.stored_ids(alias) for alias in SHARD_SETTINGS['ALIASES']))
+
+    def test_queryset_delete_spans_shards(self):
+        rare = [paragraph.id for paragraph in self.paragraphs if 'rare' in paragraph.text]
+        self.assertEqual({sharding.shard_for(paragraph_id) for paragraph_id in rare}, set(SHARD_SETTINGS['ALIASES']))
+
+        deleted, counts = Paragraph.objects.filter(id__in=rare).delete()
+
+        self.assertEqual(deleted, len(rare))
+        self.assertEqual(counts, {'core.Paragraph': len(rare)})
+        for alias in SHARD_SETTINGS['ALIASES']:
+            self.assertFalse(self.stored_ids(alias) & set(rare))
+            self.assertFalse(WordFrequency.objects.using(alias).filter(word='rare').exists())
+
+        # An explicit database only deletes from that database.
+        remaining = len(self.stored_ids(SHARD))
+        self.assertEqual(Paragraph.objects.using(SHARD).all().delete()[0], remaining)
+        self.assertFalse(self.stored_ids(SHARD))
+        self.assertTrue(self.stored_ids('default'))
+
+    def test_generation_sums_shards(self):
+        generation = get_generation()
+
+        Paragraph.objects.create(text='one more paragraph')
+
+        self.assertEqual(get_generation(), get_generation('default') + get_generation(SHARD))
+        self.assertGreater(get_generation(), generation)
+
+    def test_search_pages_merge_shards(self):
+        expected = sorted(paragraph.id for paragraph in self.paragraphs if 'rare' in paragraph.text)
+
+        ids = []
+        url = f'{SEARCH_URL}?words=rare&operator=or&limit=4&count=exact'
+        while url:
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(res.json()['count'], len(expected))
+            ids.extend(paragraph['id'] for paragraph in res.json()['results'])
+            url = res.json()['next']
+
+        self.assertEqual(ids, expected)
+
+    def test_stream_merges_shards(self):
+        res = self.client.get(SEARCH_URL, {'words': 'shared', 'operator': 'or', 'stream': 'true'})
+
+        lines = b''.join(res.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), len(TEXTS))
+        self.assertEqual(lines, sorted(lines, key=lambda line: int(line.split(',')[0].split(':')[1])))
+
+    def test_rank_merges_shards(self):
+        res = self.client.get(SEARCH_URL, {'words': 'rare', 'operator': 'or', 'rank': 'true', 'k': 3})
+
+        results = res.json()['results']
+        self.assertEqual(len(results), 3)
+        ranks = [paragraph['rank'] for paragraph in results]
+        self.assertEqual(ranks, sorted(ranks, reverse=True))
+        self.assertIn('rare rare', results[0]['text'])
+
+    def test_facets_sum_shards(self):
+        res = self.client.get(SEARCH_URL, {'words': 'shared', 'operator': 'or', 'facets': 'words'})
+
+        facets = dict((facet['word'], facet['count']) for facet in res.json()['facets']['words'])
+        self.assertEqual(facets['share'], len(TEXTS))
+
+    def test_fuzzy_words_expanded_from_all_shards(self):
+        WordFrequency.objects.using(SHARD).create(word='elephant', count=1)
+        WordFrequency.objects.using('default').create(word='elephants', count=2)
+        WordFrequency.objects.using(SHARD).create(word='elephants', count=2)
+
+        self.assertEqual(search.expand_fuzzy(['elephan']), [['elephan', 'elephant', 'elephants']])
+        with override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'FUZZY_EXPANSIONS': 1}):
+            self.assertEqual(search.expand_fuzzy(['elephan']), [['elephan', 'elephant']])
+
+        res = self.client.get(SEARCH_URL, {'words': 'singel', 'operator': 'or', 'match': 'fuzzy'})
+        self.assertEqual([paragraph['id'] for paragraph in res.json()['results']], [self.paragraphs[-1].id])
+
+    def test_batch_search_merges_shards(self):
+        matches = search.batch_search([(['rare'], 'or', 5), (['single'], 'or', 5)])
+
+        expected = sorted(paragraph.id for paragraph in self.paragraphs if 'rare' in paragraph.text)[:5]
+        self.assertEqual(matches[0], expected)
+        self.assertEqual(matches[1], [self.paragraphs[-1].id])
+
+    def test_most_common_sums_shards(self):
+        expected = Counter()
+        for paragraph in self.paragraphs:
+            expected.update(paragraph.text.split())
+
+        common = WordFrequency.objects.most_common(4)
+
+        self.assertEqual(common, sorted(expected.items(), key=lambda item: (-item[1], item[0]))[:4])
+
+    @patch('paragraph.api_client.get_word_definition', side_effect=lambda word: f'definition of {word}')
+    def test_dictionary_sums_shards(self, patched_get_word_definition):
+        res = self.client.get(DICTIONARY_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['shared'], 'definition of shared')
+
+    def test_duplicates_found_on_any_shard(self):
+        for paragraph in self.paragraphs[:5]:
+            signature = minhash.signature(paragraph.text)
+            self.assertEqual(ingest.find_duplicate(signature), paragraph.id)
+
+        self.assertEqual(ingest.drop_duplicates([paragraph.text for paragraph in self.paragraphs[:5]]), [])
+
+
+@override_settings(PARAGRAPH_SHARDS=SHARD_SETTINGS)
+class ShardedIngestJobTests(TransactionTestCase):
+    """Test queued ingestions are stored once on their shards, even when interrupted halfway."""
+
+    databases = {'default', SHARD}
+
+    def stored_texts(self):
+        texts = []
+        for alias in SHARD_SETTINGS['ALIASES']:
+            texts.extend(Paragraph.objects.using(alias).values_list('text', flat=True))
+        return sorted(texts)
+
+    def test_interrupted_job_stores_recorded_paragraphs(self):
+        # One id on each shard, so the job writes to both.
+        ids = {sharding.shard_for(paragraph_id): paragraph_id for paragraph_id in range(10 ** 6, 10 ** 6 + 100)}
+        job = IngestJob.objects.create(requested=2)
+        bulk_create_on = ParagraphQuerySet._bulk_create_on
+        failures = []
+
+        def fail_after_shard(queryset, using, objs, *args):
+            objs = bulk_create_on(queryset, using, objs, *args)
+            if using == SHARD and not failures:
+                failures.append(using)
+                raise DatabaseError('connection lost')
+            return objs
+
+        with patch('paragraph.ingest.sharding.allocate_ids', return_value=sorted(ids.values())), \
+                patch('paragraph.api_client.get_paragraph', side_effect=['first text', 'second text']), \
+                patch.object(ParagraphQuerySet, '_bulk_create_on', fail_after_shard):
+            ingest.run_jobs(10)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, len(job.paragraphs)), ('pending', 'connection lost', 2))
+        self.assertEqual(len(self.stored_texts()), 1)
+
+        # The retry writes the recorded paragraphs missing from their shards instead of fetching new ones.
+        IngestJob.objects.update(run_after=job.started_at)
+        with patch('paragraph.api_client.get_paragraph', side_effect=AssertionError('fetched again')):
+            ingest.run_jobs(10)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.stored, job.error, job.paragraphs), ('done', 2, '', []))
+        self.assertEqual(self.stored_texts(), ['first text', 'second text'])
+        self.assertEqual(sum(WordFrequency.objects.using(alias).filter(word='text').values_list('count', flat=True)
+                             .first() or 0 for alias in SHARD_SETTINGS['ALIASES']), 2)
+
+
+@override_settings(PARAGRAPH_SHARDS={**SHARD_SETTINGS, 'ALIASES': ['default']})
+class RebalanceShardsCommandTests(TransactionTestCase):
+    """Test the rebalancing command moves paragraphs to a new shard."""
+
+    databases = {'default', SHARD}
+
+    def test_rebalance_shards(self):
+        paragraphs = Paragraph.objects.bulk_create([Paragraph(text=text) for text in TEXTS])
+        ids = {paragraph.id for paragraph in paragraphs}
+        words = dict(WordFrequency.objects.values_list('word', 'count'))
+
+        with override_settings(PARAGRAPH_SHARDS=SHARD_SETTINGS):
+            out = StringIO()
+            call_command('rebalance_shards', '--dry-run', stdout=out)
+            moving = {paragraph_id for paragraph_id in ids if sharding.shard_for(paragraph_id) == SHARD}
+            self.assertIn(f'Would move {len(moving)} paragraphs.', out.getvalue())
+            self.assertFalse(Paragraph.objects.using(SHARD).exists())
+
+            call_command('rebalance_shards', '--batch-size', '3', stdout=StringIO())
+
+            self.assertEqual(set(Paragraph.objects.using(SHARD).values_list('id', flat=True)), moving)
+            self.assertEqual(set(Paragraph.objects.values_list('id', flat=True)), ids - moving)
+            counts = Counter()
+            for alias in SHARD_SETTINGS['ALIASES']:
+                counts.update(dict(WordFrequency.objects.using(alias).values_list('word', 'count')))
+            self.assertEqual(dict(counts), words)
+
+            out = StringIO()
+            call_command('rebalance_shards', stdout=out)
+            self.assertIn('Moved 0 paragraphs.', out.getvalue())
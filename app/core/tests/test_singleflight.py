@@ -0,0 +1,181 @@
+"""
+Tests for the single-flight execution of concurrent computations.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.db import (
+    connection,
+    connections,
+)
+from django.test import (
+    SimpleTestCase,
+    TransactionTestCase,
+    override_settings,
+)
+
+from core import (
+    metrics,
+    singleflight,
+)
+from core.singleflight import SingleFlight
+
+IN_PROCESS = {**settings.SINGLE_FLIGHT, 'DATABASE_LOCKS': False}
+
+
+def start(target, *args):
+    """Run `target` on a new thread, returning the thread and the list its result is appended to."""
+    results = []
+
+    def run():
+        try:
+            results.append(target(*args))
+        except Exception as exception:
+            results.append(exception)
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, results
+
+
+class BlockingFunction:
+    """Computation blocking until released, counting its calls."""
+
+    def __init__(self, result='result'):
+        self.result = result
+        self.calls = []
+        self.entered = threading.Event()
+        self.released = threading.Event()
+
+    def __call__(self, *args):
+        self.calls.append(args)
+        self.entered.set()
+        self.released.wait(5)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+@override_settings(SINGLE_FLIGHT=IN_PROCESS)
+class SingleFlightTests(SimpleTestCase):
+    """Test concurrent calls within a process share one execution."""
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.flight = SingleFlight('test')
+
+    def start_waiters(self, count, target, *args):
+        waiters = [start(target, *args) for index in range(count)]
+        # Leave the waiters time to find the call in flight.
+        time.sleep(0.1)
+        return waiters
+
+    def test_concurrent_calls_share_one_execution(self):
+        function = BlockingFunction()
+        leader, leader_results = start(self.flight.do, 'key', function)
+        function.entered.wait(5)
+        waiters = self.start_waiters(5, self.flight.do, 'key', function)
+        other, other_results = start(self.flight.do, 'other key', lambda: 'other result')
+
+        function.released.set()
+        for thread, results in [(leader, leader_results), (other, other_results), *waiters]:
+            thread.join(5)
+
+        self.assertEqual(len(function.calls), 1)
+        self.assertEqual(leader_results, ['result'])
+        self.assertEqual([results for thread, results in waiters], [['result']] * 5)
+        self.assertEqual(other_results, ['other result'])
+        self.assertEqual(singleflight.CALLS.value(name='test', outcome='shared'), 5)
+
+        # Nothing is remembered once the call finished.
+        self.assertEqual(self.flight.do('key', lambda: 'again'), 'again')
+
+    def test_exceptions_are_shared(self):
+        error = ValueError('failed')
+        function = BlockingFunction(error)
+        leader, leader_results = start(self.flight.do, 'key', function)
+        function.entered.wait(5)
+        waiters = self.start_waiters(2, self.flight.do, 'key', function)
+
+        function.released.set()
+        for thread, results in [(leader, leader_results), *waiters]:
+            thread.join(5)
+
+        self.assertEqual(len(function.calls), 1)
+        self.assertEqual([results for thread, results in waiters], [[error]] * 2)
+
+    @override_settings(SINGLE_FLIGHT={**IN_PROCESS, 'TIMEOUT': 0.05})
+    def test_waiters_run_the_computation_after_a_timeout(self):
+        function = BlockingFunction()
+        leader, leader_results = start(self.flight.do, 'key', function)
+        function.entered.wait(5)
+
+        self.assertEqual(self.flight.do('key', lambda: 'fallback'), 'fallback')
+        self.assertEqual(singleflight.CALLS.value(name='test', outcome='timeout'), 1)
+
+        function.released.set()
+        leader.join(5)
+        self.assertEqual(leader_results, ['result'])
+
+    def test_do_many_computes_keys_in_flight_once(self):
+        function = BlockingFunction(({'a': 'A', 'b': 'B'}, {'c': 'failed'}))
+        leader, leader_results = start(self.flight.do_many, ['a', 'b', 'c'], function)
+        function.entered.wait(5)
+        waiters = self.start_waiters(1, self.flight.do_many, ['b', 'c', 'd'], lambda keys: ({'d': 'D'}, {}))
+
+        function.released.set()
+        for thread, results in [(leader, leader_results), *waiters]:
+            thread.join(5)
+
+        self.assertEqual(function.calls, [(['a', 'b', 'c'],)])
+        self.assertEqual(leader_results, [({'a': 'A', 'b': 'B'}, {'c': 'failed'})])
+        self.assertEqual(waiters[0][1], [({'b': 'B', 'd': 'D'}, {'c': 'failed'})])
+
+    @override_settings(SINGLE_FLIGHT={**IN_PROCESS, 'ENABLED': False})
+    def test_disabled(self):
+        calls = []
+
+        self.flight.do('key', lambda: calls.append('do'))
+        self.flight.do_many(['a', 'a'], lambda keys: calls.append(keys) or ({}, {}))
+
+        self.assertEqual(calls, ['do', ['a']])
+
+
+@override_settings(SINGLE_FLIGHT={**settings.SINGLE_FLIGHT, 'TIMEOUT': 5, 'LOCK_POLL_INTERVAL': 0.01})
+class SingleFlightDatabaseLockTests(TransactionTestCase):
+    """Test computations wait for the advisory lock of their key, held by another process."""
+
+    def setUp(self):
+        metrics.registry.clear()
+        self.flight = SingleFlight('test')
+        self.lock = singleflight.lock_id('test:key')
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [self.lock])
+
+    def tearDown(self):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock_all()')
+
+    def test_waits_for_the_lock(self):
+        calls = []
+        thread, results = start(self.flight.do, 'key', lambda: calls.append('called') or 'result')
+
+        time.sleep(0.1)
+        self.assertEqual(calls, [])
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [self.lock])
+        thread.join(5)
+        self.assertEqual(results, ['result'])
+        self.assertEqual(calls, ['called'])
+
+    @override_settings(SINGLE_FLIGHT={**settings.SINGLE_FLIGHT, 'TIMEOUT': 0.05, 'LOCK_POLL_INTERVAL': 0.01})
+    def test_runs_without_the_lock_after_a_timeout(self):
+        thread, results = start(self.flight.do_many, ['key', 'free key'], lambda keys: ({'key': 'result'}, {}))
+        thread.join(5)
+
+        self.assertEqual(results, [({'key': 'result'}, {})])
+        self.assertEqual(singleflight.LOCK_TIMEOUTS.value(name='test'), 1)
@@ -0,0 +1,72 @@
+"""
+Tests for the bounded memory estimation of the most common words.
+"""
+import random
+from collections import Counter
+
+from django.test import SimpleTestCase
+
+from core import topk
+from core.models import tokenize
+
+
+def zipf_texts(count, vocabulary=2000, length=20, seed=0):
+    """Return `count` texts of words drawn from a Zipf distribution over `vocabulary` words."""
+    rng = random.Random(seed)
+    words = [f'w{rank}' for rank in range(vocabulary)]
+    weights = [1 / (rank + 1) for rank in range(vocabulary)]
+    return [' '.join(rng.choices(words, weights, k=length)) for index in range(count)]
+
+
+class SpaceSavingTests(SimpleTestCase):
+    """Test the summaries and their error bounds."""
+
+    def setUp(self):
+        self.texts = zipf_texts(2000)
+        self.exact = Counter(word for text in self.texts for word in tokenize(text))
+
+    def assertBoundsHold(self, summary):
+        self.assertEqual(summary.total, sum(self.exact.values()))
+        for word, count in self.exact.items():
+            if word in summary.counts:
+                self.assertLessEqual(summary.counts[word] - summary.errors[word], count)
+                self.assertLessEqual(count, summary.counts[word])
+            else:
+                self.assertLessEqual(count, summary.floor)
+
+    def test_exact_below_capacity(self):
+        summary = topk.count_words(['b a b', 'c b a'], capacity=10, chunk_size=1)
+
+        self.assertEqual(summary.top(2), [
+            topk.HeavyHitter('b', 3, 0, True),
+            topk.HeavyHitter('a', 2, 0, True),
+        ])
+        self.assertEqual(summary.floor, 0)
+
+    def test_bounds_hold_above_capacity(self):
+        summary = topk.count_words(self.texts, capacity=50, chunk_size=100)
+
+        self.assertEqual(len(summary), 50)
+        self.assertGreater(summary.floor, 0)
+        self.assertBoundsHold(summary)
+
+        expected = [word for word, count in self.exact.most_common(10)]
+        hitters = summary.top(10)
+        self.assertTrue(any(hitter.guaranteed for hitter in hitters))
+        for hitter in hitters:
+            if hitter.guaranteed:
+                self.assertIn(hitter.word, expected)
+
+    def test_merges_in_any_order(self):
+        chunks = [topk.summarize(self.texts[start:start + 100], 50) for start in range(0, len(self.texts), 100)]
+        summary = topk.SpaceSaving(50)
+        for chunk in reversed(chunks):
+            summary.merge(chunk)
+
+        self.assertBoundsHold(summary)
+
+    def test_process_pool_matches_in_process_counts(self):
+        summary = topk.count_words(self.texts, capacity=5000, chunk_size=300, processes=2)
+
+        self.assertEqual(summary.counts, dict(self.exact))
+        self.assertEqual(summary.floor, 0)
@@ -0,0 +1,135 @@
+"""
+Estimation of the most common words of the corpus in bounded memory, configured by the `COMMON_WORDS` setting.
+
+Words are counted with the Space-Saving algorithm in its mergeable form. A summary holds the estimated counts of at
+most `capacity` words, each an overestimate of the true count by at most its `error`, and a `floor` no word left out
+of the summary occurs more often than. Paragraphs are read in chunks, every chunk is counted exactly and cut down to
+a summary, on a pool of processes when there are several, and the summaries are merged as they come: the estimates
+and errors of every word are added up, words missing from a summary counting as its floor, and the `capacity` words
+with the largest estimates are kept. Memory stays bounded by the capacity and the vocabulary of a chunk, however
+large the corpus, and the true count of every word kept lies between its estimate minus its error and its estimate.
+"""
+from collections import (
+    Counter,
+    namedtuple,
+)
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    ProcessPoolExecutor,
+    wait,
+)
+from itertools import islice
+
+from core import sharding
+from core.models import (
+    Paragraph,
+    tokenize,
+)
+
+# Estimated count of a word, `guaranteed` when no word missing from the top can be more common.
+HeavyHitter = namedtuple('HeavyHitter', ['word', 'count', 'error', 'guaranteed'])
+
+
+class SpaceSaving:
+    """Mergeable Space-Saving summary of the most frequent of `total` words counted, keeping `capacity` of them."""
+
+    def __init__(self, capacity):
+        if capacity < 1:
+            raise ValueError('The capacity of a summary must be positive.')
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total = 0
+
+    def __len__(self):
+        return len(self.counts)
+
+    @classmethod
+    def from_counter(cls, counter, capacity):
+        """Return the summary of words counted exactly by `counter`."""
+        summary = cls(capacity)
+        summary.counts = dict(counter)
+        summary.errors = dict.fromkeys(counter, 0)
+        summary.total = sum(counter.values())
+        summary._truncate()
+        return summary
+
+    def merge(self, other):
+        """Add the words counted by the summary `other` to this one."""
+        for word, count in self.counts.items():
+            if word not in other.counts:
+                self.counts[word] = count + other.floor
+                self.errors[word] += other.floor
+        for word, count in other.counts.items():
+            if word in self.counts:
+                self.counts[word] += count
+                self.errors[word] += other.errors[word]
+            else:
+                self.counts[word] = count + self.floor
+                self.errors[word] = other.errors[word] + self.floor
+        self.floor += other.floor
+        self.total += other.total
+        self._truncate()
+
+    def _truncate(self):
+        if len(self.counts) <= self.capacity:
+            return
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        # Dropped words occur at most as often as their estimate.
+        self.floor = max(self.floor, ranked[self.capacity][1])
+        for word, count in ranked[self.capacity:]:
+            del self.counts[word]
+            del self.errors[word]
+
+    def top(self, k):
+        """Return the `HeavyHitter`s of the `k` words with the largest estimates, most common first."""
+        ranked = sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))
+        # No word outside of the top occurs more often than this.
+        bound = max([self.floor] + [count for word, count in ranked[k:k + 1]])
+        return [
+            HeavyHitter(word, count, self.errors[word], count - self.errors[word] >= bound)
+            for word, count in ranked[:k]
+        ]
+
+
+def summarize(texts, capacity):
+    """Return the summary of the words of `texts`, counted exactly, then cut down to `capacity` words."""
+    counter = Counter()
+    for text in texts:
+        counter.update(tokenize(text))
+    return SpaceSaving.from_counter(counter, capacity)
+
+
+def count_words(texts, capacity, chunk_size, processes=1):
+    """
+    Return the summary of the words of `texts`, read `chunk_size` at a time and counted by `processes` processes.
+
+    At most two chunks per process are read ahead of the merged summaries, so memory stays bounded however fast
+    the texts are read.
+    """
+    summary = SpaceSaving(capacity)
+    texts = iter(texts)
+    chunks = iter(lambda: list(islice(texts, chunk_size)), [])
+    if processes <= 1:
+        for chunk in chunks:
+            summary.merge(summarize(chunk, capacity))
+        return summary
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        pending = set()
+        for chunk in chunks:
+            if len(pending) >= 2 * processes:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    summary.merge(future.result())
+            pending.add(executor.submit(summarize, chunk, capacity))
+        for future in pending:
+            summary.merge(future.result())
+    return summary
+
+
+def corpus_texts(chunk_size):
+    """Yield the text of every stored paragraph, read from every shard through server-side cursors."""
+    for alias in sharding.get_shards():
+        yield from Paragraph.objects.using(alias).values_list('text', flat=True).iterator(chunk_size=chunk_size)
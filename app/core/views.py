@@ -0,0 +1,14 @@
+"""
+Views exposing the state of the service.
+"""
+from django.http import HttpResponse
+from django.views import View
+
+from core import metrics
+
+
+class MetricsView(View):
+    """View serving the metrics of the process in the Prometheus text format."""
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.registry.render(), content_type=metrics.CONTENT_TYPE)
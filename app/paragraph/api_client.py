@@ -1,22 +1,197 @@
-import requests
+import asyncio
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    wait,
+)
+
+from django.conf import settings
+
+from paragraph import upstream
 
 PARAGRAPH_URL = "http://metaphorpsum.com/paragraphs/1/50"
 DEFINITION_URL = "https://api.dictionaryapi.dev/api/v2/entries/en/"
 
+DEFINITION_API_ERROR = "Error while processing the API request to https://dictionaryapi.dev/."
+DEFINITION_TIMEOUT_ERROR = "Timed out while processing the API request to https://dictionaryapi.dev/."
+PARAGRAPH_TIMEOUT_ERROR = "Timed out while processing the API request to http://metaphorpsum.com/."
+
 
 def get_paragraph():
     try:
-        response = requests.get(PARAGRAPH_URL)
+        response = upstream.client.get(PARAGRAPH_URL)
         response.raise_for_status()
         return response.text
     except Exception:
         raise
 
 
-def get_word_definition(word):
-    response = requests.get(DEFINITION_URL + word)
+def get_paragraphs(count, max_workers=None, deadline=None):
+    """
+    Fetch `count` paragraphs concurrently, at most `max_workers` at a time and within `deadline` seconds.
+
+    Returns a `(paragraphs, errors)` pair: the list of fetched texts and the list of error messages of the
+    fetches that failed or did not finish in time.
+    """
+    paragraphs, errors = get_paragraphs_by_position(count, max_workers, deadline)
+    return list(paragraphs.values()), list(errors.values())
+
+
+def get_paragraphs_by_position(count, max_workers=None, deadline=None):
+    """Fetch `count` paragraphs like `get_paragraphs`, returning `(paragraphs, errors)` dicts keyed by position."""
+    config = settings.PARAGRAPH_BULK
+    return _map_threaded(
+        lambda index: get_paragraph(),
+        range(count),
+        max_workers or config['MAX_WORKERS'],
+        deadline or config['DEADLINE'],
+        PARAGRAPH_TIMEOUT_ERROR,
+    )
+
+
+async def aget_paragraph():
+    """Asynchronous `get_paragraph`, through the shared async client of the running event loop."""
+    response = await upstream.client.aget(upstream.client.shared_async_client(), PARAGRAPH_URL)
+    response.raise_for_status()
+    return response.text
+
 
-    if response.status_code != 200 and response.status_code != 404:
-        raise Exception("Error while processing the API request to https://dictionaryapi.dev/.")
+async def aget_paragraphs(count, max_workers=None, deadline=None):
+    """Asynchronous `get_paragraphs`, fetching at most `max_workers` paragraphs at a time on the event loop."""
+    config = settings.PARAGRAPH_BULK
+    paragraphs, errors = await _map_async(
+        lambda index: aget_paragraph(),
+        range(count),
+        max_workers or config['MAX_WORKERS'],
+        deadline or config['DEADLINE'],
+        PARAGRAPH_TIMEOUT_ERROR,
+    )
+    return list(paragraphs.values()), list(errors.values())
+
+
+def _parse_definition(status_code, response):
+    if status_code != 200 and status_code != 404:
+        raise Exception(DEFINITION_API_ERROR)
 
     return response.json()
+
+
+def get_word_definition(word):
+    response = upstream.client.get(DEFINITION_URL + word)
+    return _parse_definition(response.status_code, response)
+
+
+async def aget_word_definition(word, client=None):
+    response = await upstream.client.aget(client or upstream.client.shared_async_client(), DEFINITION_URL + word)
+    return _parse_definition(response.status_code, response)
+
+
+def get_word_definitions(words, mode=None, max_workers=None, deadline=None):
+    """
+    Fetch the definitions of `words` concurrently.
+
+    At most `max_workers` lookups are in flight at once, each bounded by the timeouts and retry budget of the
+    `UPSTREAM_HTTP` setting, and the whole batch is bounded by `deadline` seconds. `mode` selects the thread
+    pool ("threads") or the asyncio ("asyncio") implementation. Returns a `(definitions, errors)` pair of dicts
+    keyed by word, lookups that failed or did not finish before the deadline are reported in `errors` instead
+    of failing the batch.
+    """
+    config = settings.DEFINITION_LOOKUP
+    mode = mode or config['MODE']
+    max_workers = max_workers or config['MAX_WORKERS']
+    deadline = deadline or config['DEADLINE']
+    words = list(dict.fromkeys(words))
+
+    if not words:
+        return {}, {}
+    if mode == 'threads':
+        return _get_word_definitions_threaded(words, max_workers, deadline)
+    if mode == 'asyncio':
+        return asyncio.run(_get_word_definitions_async(words, max_workers, deadline))
+    raise ValueError(f"Unknown definition lookup mode '{mode}'.")
+
+
+async def aget_word_definitions(words, max_workers=None, deadline=None):
+    """
+    Asynchronous `get_word_definitions`, for callers already running on an event loop.
+
+    Lookups go through the shared async client of the running event loop, so concurrent callers share its
+    connections.
+    """
+    config = settings.DEFINITION_LOOKUP
+    words = list(dict.fromkeys(words))
+    if not words:
+        return {}, {}
+    return await _map_async(
+        aget_word_definition,
+        words,
+        max_workers or config['MAX_WORKERS'],
+        deadline or config['DEADLINE'],
+        DEFINITION_TIMEOUT_ERROR,
+    )
+
+
+def _get_word_definitions_threaded(words, max_workers, deadline):
+    return _map_threaded(
+        get_word_definition,
+        words,
+        max_workers,
+        deadline,
+        DEFINITION_TIMEOUT_ERROR,
+    )
+
+
+def _map_threaded(func, keys, max_workers, deadline, timeout_error):
+    """Call `func` on each of `keys` on a thread pool, returning `(results, errors)` dicts keyed like `keys`."""
+    keys = list(keys)
+    executor = ThreadPoolExecutor(max_workers=min(max_workers, len(keys)))
+    futures = {executor.submit(func, key): key for key in keys}
+    done, not_done = wait(futures, timeout=deadline)
+    # Do not wait for stragglers, they are bounded by the upstream timeouts and their results are dropped.
+    executor.shutdown(wait=False, cancel_futures=True)
+    return _collect(futures, done, timeout_error)
+
+
+async def _get_word_definitions_async(words, max_workers, deadline):
+    # Each call runs on a new event loop, with a client of its own.
+    async with upstream.client.async_client() as client:
+        return await _map_async(
+            lambda word: aget_word_definition(word, client),
+            words,
+            max_workers,
+            deadline,
+            DEFINITION_TIMEOUT_ERROR,
+        )
+
+
+async def _map_async(func, keys, max_workers, deadline, timeout_error):
+    """Await `func` on each of `keys`, `max_workers` at a time, returning `(results, errors)` dicts like `keys`."""
+    semaphore = asyncio.Semaphore(max_workers)
+
+    async def call(key):
+        async with semaphore:
+            return await func(key)
+
+    tasks = {asyncio.ensure_future(call(key)): key for key in keys}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    return _collect(tasks, done, timeout_error)
+
+
+def _collect(futures, done, timeout_error):
+    results = {}
+    errors = {}
+    for future, key in futures.items():
+        if future not in done:
+            errors[key] = timeout_error
+        elif future.exception() is not None:
+            errors[key] = str(future.exception())
+        else:
+            results[key] = future.result()
+    return results, errors
+
+
+def is_definition_found(definition):
+    """Tell a definition apart from the error object dictionaryapi.dev answers unknown words with."""
+    return not (isinstance(definition, dict) and 'title' in definition)
@@ -0,0 +1,69 @@
+"""
+Asynchronous variants of the views waiting on the external APIs.
+
+Served under ASGI, they wait on the external APIs on the event loop instead of holding a thread each, so a worker
+keeps hundreds of upstream requests in flight. Django REST framework views are synchronous only, these are plain
+Django views answering like their `paragraph.views` counterparts, through the same helpers: the ORM is synchronous
+only as well, database work and the single-flight build of the dictionary run through `sync_to_async`.
+"""
+from asgiref.sync import sync_to_async
+from django.http import (
+    HttpResponseNotAllowed,
+    JsonResponse,
+)
+from django.utils.cache import add_never_cache_headers
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+
+from core import routers
+from paragraph import api_client
+from paragraph.views import (
+    DictionaryRetrieveView,
+    ParagraphCreateView,
+)
+
+
+async def create_paragraph(request):
+    """Fetch and create a new paragraph record, `count` of them at once, or queue their ingestion."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    try:
+        if ParagraphCreateView._is_async(request.GET):
+            data, location = await sync_to_async(ParagraphCreateView._enqueue)(request.GET)
+            response = JsonResponse(data, status=status.HTTP_202_ACCEPTED)
+            response['Location'] = location
+            return routers.pin_to_primary(response)
+        if 'count' in request.GET:
+            count = ParagraphCreateView._get_count(request.GET['count'])
+            texts, errors = await api_client.aget_paragraphs(count)
+            data, status_code = await sync_to_async(ParagraphCreateView._store_many)(texts, errors)
+            return routers.pin_to_primary(JsonResponse(data, status=status_code))
+    except ValidationError as err:
+        return JsonResponse(err.detail, safe=False, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        text = await api_client.aget_paragraph()
+    except Exception as err:
+        return JsonResponse({"error": str(err)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    data, status_code = await sync_to_async(ParagraphCreateView._store)(text)
+    return routers.pin_to_primary(JsonResponse(data, status=status_code))
+
+
+async def dictionary(request):
+    """Return the definitions of the 10 most common words, like `DictionaryRetrieveView` but without ETags."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    # The replica picked for the request is kept by the threads of `sync_to_async` as well. Concurrent requests,
+    # synchronous ones included, share one build of the response.
+    with routers.replica_reads(request):
+        try:
+            data = await sync_to_async(DictionaryRetrieveView.flight.do)('dictionary', DictionaryRetrieveView._build)
+        except Exception as err:
+            return JsonResponse({"error": str(err)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    response = JsonResponse(data, status=status.HTTP_200_OK)
+    if None in data.values():
+        # Failed lookups may succeed on the next request, do not let clients hold on to the response.
+        add_never_cache_headers(response)
+    return response
@@ -0,0 +1,305 @@
+"""
+Caches for data served by the paragraph APIs.
+"""
+import threading
+import time
+from collections import (
+    Counter,
+    OrderedDict,
+)
+from datetime import timedelta
+from hashlib import sha1
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.expressions import RawSQL
+from django.utils import timezone
+
+from core import (
+    metrics,
+    sharding,
+)
+from core.generation import get_generation
+from core.routers import get_read_replica
+from core.singleflight import SingleFlight
+from core.models import (
+    Paragraph,
+    WordDefinition,
+)
+from paragraph import (
+    api_client,
+    search,
+)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread-safe in-process cache evicting the least recently used entry once `max_size` is reached."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Return the value stored for `key` unless it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store `value` for `ttl` seconds."""
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class DefinitionCache:
+    """
+    Two-tier cache of word definitions from https://dictionaryapi.dev/.
+
+    Lookups are served from an in-process LRU first, then from the `WordDefinition` table shared by all
+    workers, and only then from the external API. Words without a definition are cached as well. Concurrent
+    lookups of the same word reach the external API once, see `core.singleflight`.
+    """
+
+    def __init__(self):
+        self._local = None
+        self._stats = Counter()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight('definition')
+
+    @property
+    def local(self):
+        if self._local is None:
+            self._local = LRUCache(settings.DEFINITION_CACHE['MAX_SIZE'])
+        return self._local
+
+    @staticmethod
+    def ttl(status):
+        """Return the number of seconds a definition with the given status stays fresh."""
+        if status == WordDefinition.Status.NOT_FOUND:
+            return settings.DEFINITION_CACHE['NEGATIVE_TTL']
+        return settings.DEFINITION_CACHE['TTL']
+
+    def stats(self):
+        """Return the hit and miss counts of both tiers."""
+        with self._lock:
+            return {key: self._stats[key] for key in ('memory_hits', 'database_hits', 'misses')}
+
+    def clear(self):
+        """Empty the in-process tier and reset the statistics."""
+        self.local.clear()
+        with self._lock:
+            self._stats.clear()
+
+    def _record(self, key, amount):
+        if amount:
+            with self._lock:
+                self._stats[key] += amount
+
+    def get_many(self, words):
+        """
+        Return a `(definitions, errors)` pair of dicts keyed by word.
+
+        Words whose lookup failed are reported in `errors` and are not cached.
+        """
+        definitions = self._get_local(words)
+
+        missing = [word for word in words if word not in definitions]
+        if missing:
+            found = self._get_stored(missing)
+            self._record('database_hits', len(found))
+            definitions.update(found)
+
+        errors = {}
+        missing = [word for word in words if word not in definitions]
+        if missing:
+            self._record('misses', len(missing))
+            fetched, errors = self._flight.do_many(missing, self._fetch)
+            definitions.update(fetched)
+
+        return {word: definitions[word] for word in words if word in definitions}, errors
+
+    def _fetch(self, words):
+        # Definitions stored by another worker while this one waited for the lock of the words are read back.
+        definitions = self._get_stored(words)
+        fetched, errors = api_client.get_word_definitions([word for word in words if word not in definitions])
+        self._store(fetched)
+        definitions.update(fetched)
+        return definitions, errors
+
+    async def aget_many(self, words):
+        """Asynchronous `get_many`, waiting on the database and the external API without blocking the event loop."""
+        definitions = self._get_local(words)
+
+        missing = [word for word in words if word not in definitions]
+        if missing:
+            found = await sync_to_async(self._get_stored)(missing)
+            self._record('database_hits', len(found))
+            definitions.update(found)
+
+        errors = {}
+        missing = [word for word in words if word not in definitions]
+        if missing:
+            self._record('misses', len(missing))
+            fetched, errors = await api_client.aget_word_definitions(missing)
+            await sync_to_async(self._store)(fetched)
+            definitions.update(fetched)
+
+        return {word: definitions[word] for word in words if word in definitions}, errors
+
+    def _get_local(self, words):
+        definitions = {}
+        for word in words:
+            definition = self.local.get(word, _MISSING)
+            if definition is not _MISSING:
+                definitions[word] = definition
+        self._record('memory_hits', len(definitions))
+        return definitions
+
+    def _get_stored(self, words):
+        now = timezone.now()
+        found = {}
+        for row in WordDefinition.objects.filter(word__in=words):
+            remaining = (row.fetched_at + timedelta(seconds=self.ttl(row.status)) - now).total_seconds()
+            if remaining > 0:
+                found[row.word] = row.payload
+                self.local.set(row.word, row.payload, remaining)
+        return found
+
+    def _store(self, fetched):
+        # One upsert for all the fetched words, rather than a read and a write per word.
+        stored = {}
+        for word, definition in fetched.items():
+            if api_client.is_definition_found(definition):
+                status = WordDefinition.Status.FOUND
+            else:
+                status = WordDefinition.Status.NOT_FOUND
+            stored[word] = (definition, status)
+        WordDefinition.objects.store(stored)
+        for word, (definition, status) in stored.items():
+            self.local.set(word, definition, self.ttl(status))
+
+
+class SearchResultCache:
+    """
+    Cache of the ids of the paragraphs matching a search, configured by the `PARAGRAPH_SEARCH_CACHE` setting.
+
+    Entries live in the Django cache named by `ALIAS`, so they are shared by all workers when it points at a
+    shared backend. Searches are keyed by their normalized words and operator together with the corpus
+    generation, so adding or removing paragraphs invalidates every entry at once. Searches matching more than
+    `MAX_IDS` paragraphs are not cached. When paragraphs are sharded, entries hold the ids matching on any shard.
+    Concurrent misses of the same entry run the search once, see `core.singleflight`. Searches reading from a replica
+    use the entries but never fill them, as the replica may lag behind the generation read from the primary.
+    """
+
+    def __init__(self):
+        self._stats = Counter()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight('search')
+
+    @property
+    def config(self):
+        return settings.PARAGRAPH_SEARCH_CACHE
+
+    @property
+    def cache(self):
+        return caches[self.config['ALIAS']]
+
+    @staticmethod
+    def key(words, operator, generation, match='exact'):
+        words = search.normalize_words(words)
+        digest = sha1('\0'.join([operator, match, *words]).encode()).hexdigest()
+        return f'paragraph-search:{generation}:{digest}'
+
+    def stats(self):
+        """Return the hit and miss counts and the hit ratio of the lookups."""
+        with self._lock:
+            hits, misses = self._stats['hits'], self._stats['misses']
+        lookups = hits + misses
+        return {'hits': hits, 'misses': misses, 'hit_ratio': hits / lookups if lookups else 0.0}
+
+    def clear(self):
+        """Empty the cache and reset the statistics."""
+        self.cache.clear()
+        with self._lock:
+            self._stats.clear()
+
+    def _record(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def filter(self, queryset, words, operator, match='exact'):
+        """Narrow `queryset` down to the paragraphs matching `words` combined with `operator`, as `match` says."""
+        if not self.config['ENABLED']:
+            return search.filter_paragraphs(queryset, words, operator, match)
+
+        key = self.key(words, operator, get_generation(), match)
+        ids = self.cache.get(key)
+        if ids is None:
+            self._record('misses')
+            if get_read_replica() is not None:
+                return search.filter_paragraphs(queryset, words, operator, match)
+            ids = self._flight.do(key, lambda: self._fill(key, words, operator, match))
+            if ids is None:
+                return search.filter_paragraphs(queryset, words, operator, match)
+        else:
+            self._record('hits')
+        return queryset.filter(id__in=RawSQL('SELECT unnest(%s::bigint[])', [ids]))
+
+    def _fill(self, key, words, operator, match):
+        """Return the ids cached under `key`, searching and caching them if needed, or None if there are too many."""
+        # Another worker may have cached them while this one waited for the lock of the key.
+        ids = self.cache.get(key)
+        if ids is not None:
+            return ids
+        matches = search.filter_paragraphs(Paragraph.objects.all(), words, operator, match)
+        ids = self._first_ids(matches, self.config['MAX_IDS'] + 1)
+        if len(ids) > self.config['MAX_IDS']:
+            return None
+        self.cache.set(key, ids, self.config['TIMEOUT'])
+        return ids
+
+    @staticmethod
+    def _first_ids(matches, limit):
+        """Return the `limit` lowest ids of the paragraphs of `matches`, read from every shard if sharded."""
+        ids = matches.order_by('id').values_list('id', flat=True)
+        if not sharding.is_sharded():
+            return list(ids[:limit])
+        return sharding.merge(sharding.scatter(lambda alias: list(ids.using(alias)[:limit])), limit=limit)
+
+
+definitions = DefinitionCache()
+search_results = SearchResultCache()
+
+metrics.registry.register_callback(
+    'definition_cache_lookups_total',
+    'Lookups of word definitions by the tier answering them.',
+    'counter',
+    lambda: [({'result': result}, count) for result, count in definitions.stats().items()],
+)
+metrics.registry.register_callback(
+    'search_cache_lookups_total',
+    'Lookups of search results in the search result cache.',
+    'counter',
+    lambda: [({'result': result}, search_results.stats()[result]) for result in ('hits', 'misses')],
+)
@@ -0,0 +1,61 @@
+"""
+HTTP conditional requests for the views serving data derived from the corpus.
+"""
+from functools import wraps
+from hashlib import sha1
+
+from django.conf import settings
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+
+from core.generation import get_generation
+from core.routers import get_read_replica
+from paragraph import search
+
+
+def corpus_etag(request):
+    """
+    Return a strong ETag for `request`, derived from the corpus generation and the normalized request.
+
+    Search words are normalized like the search result cache does, so requests differing only in the case, order
+    or repeats of their words share an ETag.
+    """
+    params = []
+    for name, values in sorted(request.query_params.lists()):
+        if name == 'words':
+            values = [','.join(search.normalize_words(','.join(values).split(',')))]
+        params.append((name, values))
+    state = repr((get_generation(), request.path, params, request.accepted_media_type))
+    return f'"{sha1(state.encode()).hexdigest()}"'
+
+
+def conditional_on_corpus(view_method):
+    """
+    Answer conditional GET requests to a view from the corpus generation alone.
+
+    Requests whose `If-None-Match` header holds the current ETag are answered with `304 Not Modified` before the
+    view runs. Successful responses carry the ETag and `Cache-Control` headers letting clients and reverse proxies
+    reuse them for `HTTP_CACHE['MAX_AGE']` seconds, then revalidate them. Responses already carrying a
+    `Cache-Control` header are left alone, and so are responses read from a replica, which may lag behind the
+    generation read from the primary.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        etag = corpus_etag(request)
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = view_method(self, request, *args, **kwargs)
+            if response.status_code != 200 or response.has_header('Cache-Control') or get_read_replica() is not None:
+                return response
+        elif response.status_code != 304:
+            return response
+
+        response['ETag'] = etag
+        patch_cache_control(response, public=True, max_age=settings.HTTP_CACHE['MAX_AGE'], must_revalidate=True)
+        patch_vary_headers(response, ['Accept'])
+        return response
+
+    return wrapper
@@ -0,0 +1,203 @@
+"""
+Ingestion of paragraphs fetched from the external API, either right away or queued as `IngestJob`s.
+"""
+import os
+import socket
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from core import (
+    minhash,
+    sharding,
+)
+from core.models import (
+    IngestJob,
+    Paragraph,
+    ParagraphSignature,
+)
+from paragraph import api_client
+from paragraph.serializers import ParagraphSerializer
+
+
+def find_duplicate(signature):
+    """Return the id of a stored near-duplicate of the paragraph with `signature`, if duplicates are rejected."""
+    config = settings.PARAGRAPH_SIMILARITY
+    if not config['REJECT_DUPLICATES'] or signature is None:
+        return None
+    # LSH lookups only read the paragraphs sharing a bucket with the new one, not the whole corpus.
+    matches = ParagraphSignature.objects.similar(signature, config['DUPLICATE_THRESHOLD'], limit=1)
+    return matches[0][0] if matches else None
+
+
+def drop_duplicates(texts):
+    """Return the texts that are neither a near-duplicate of a stored paragraph nor of a previous text."""
+    config = settings.PARAGRAPH_SIMILARITY
+    if not config['REJECT_DUPLICATES']:
+        return list(texts)
+
+    threshold = config['DUPLICATE_THRESHOLD']
+    texts = list(texts)
+    signatures = [minhash.signature(text) for text in texts]
+    # The stored near-duplicates of all the texts are looked up at once.
+    signed = [signature for signature in signatures if signature is not None]
+    stored_matches = iter(ParagraphSignature.objects.best_matches(signed, threshold))
+
+    kept = []
+    kept_signatures = []
+    for text, signature in zip(texts, signatures):
+        if signature is not None:
+            if next(stored_matches) is not None:
+                continue
+            if kept_signatures and (minhash.similarities(signature, np.stack(kept_signatures)) >= threshold).any():
+                continue
+            kept_signatures.append(signature)
+        kept.append(text)
+    return kept
+
+
+def store(texts):
+    """Store the texts that are not near-duplicates in batches, returning the stored paragraphs and skipped count."""
+    paragraphs, duplicates = _prepare(texts)
+    paragraphs = Paragraph.objects.bulk_create(paragraphs, batch_size=settings.PARAGRAPH_BULK['BATCH_SIZE'])
+    return paragraphs, duplicates
+
+
+def _prepare(texts):
+    """Return the unsaved paragraphs of the texts that are not near-duplicates, and the number of the others."""
+    unique_texts = drop_duplicates(texts)
+    serializer = ParagraphSerializer(data=[{"text": text} for text in unique_texts], many=True)
+    serializer.is_valid(raise_exception=True)
+    return [Paragraph(**data) for data in serializer.validated_data], len(texts) - len(unique_texts)
+
+
+def enqueue(count):
+    """Queue the ingestion of `count` paragraphs and return its job."""
+    return IngestJob.objects.create(requested=count)
+
+
+def get_worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def run_jobs(limit, worker=None):
+    """
+    Claim up to `limit` queued jobs, fetch all their paragraphs concurrently and store them. Return the jobs.
+
+    Fetches are handed out to the jobs in order, each job recording the first error among its own fetches. Jobs
+    left without any paragraph are retried with exponential backoff, up to `MAX_ATTEMPTS` attempts, the others are
+    done, with a count of failed fetches. Jobs interrupted while storing recorded paragraphs store them again
+    instead of fetching new ones, see `IngestJob.paragraphs`.
+    """
+    config = settings.PARAGRAPH_INGEST
+    jobs = IngestJob.objects.claim(limit, worker or get_worker_name(), config['LEASE'])
+    if not jobs:
+        return []
+
+    fetched = sum(job.requested for job in jobs if not job.paragraphs)
+    texts, errors = {}, {}
+    if fetched:
+        texts, errors = api_client.get_paragraphs_by_position(
+            fetched, max_workers=config['MAX_WORKERS'], deadline=config['DEADLINE'],
+        )
+    offset = 0
+    for job in jobs:
+        positions = range(0)
+        if not job.paragraphs:
+            positions = range(offset, offset + job.requested)
+            offset += job.requested
+        job_texts = [texts[position] for position in positions if position in texts]
+        job_errors = [errors[position] for position in positions if position in errors]
+        try:
+            _finish(job, job_texts, job_errors[0] if job_errors else '')
+        except Exception as err:
+            _finish(job, [], str(err), store_recorded=False)
+    return jobs
+
+
+def _owns(job):
+    """Lock `job` and tell whether this worker still runs it, a job running past its lease may be claimed again."""
+    return IngestJob.objects.select_for_update() \
+        .filter(id=job.id, status=IngestJob.Status.RUNNING, attempts=job.attempts).exists()
+
+
+def _record(job, texts, error):
+    """
+    Record on `job` the paragraphs to store for `texts`, with newly allocated ids, unless all are duplicates.
+
+    Returns whether the job is still owned by this worker.
+    """
+    paragraphs, duplicates = _prepare(texts)
+    if not paragraphs:
+        return True
+    ids = sharding.allocate_ids(len(paragraphs))
+    with transaction.atomic():
+        if not _owns(job):
+            return False
+        job.paragraphs = [[paragraph_id, paragraph.text] for paragraph_id, paragraph in zip(ids, paragraphs)]
+        job.duplicates = duplicates
+        job.failed = job.requested - len(texts)
+        job.error = error if job.failed else ''
+        job.save(update_fields=['paragraphs', 'duplicates', 'failed', 'error'])
+    return True
+
+
+def _store_recorded(paragraphs):
+    """Store the recorded `[id, text]` pairs of a job on their shards, but the ones an earlier attempt stored."""
+    ids = [paragraph_id for paragraph_id, text in paragraphs]
+    stored = set().union(*sharding.scatter(
+        lambda alias: set(Paragraph.objects.using(alias).filter(id__in=ids).values_list('id', flat=True)),
+    ))
+    Paragraph.objects.bulk_create(
+        [Paragraph(id=paragraph_id, text=text) for paragraph_id, text in paragraphs if paragraph_id not in stored],
+        batch_size=settings.PARAGRAPH_BULK['BATCH_SIZE'],
+    )
+
+
+def _finish(job, texts, error, store_recorded=True):
+    """
+    Store the paragraphs fetched for `job` and record its outcome, unless another worker took the job over.
+
+    When paragraphs are sharded, they are written to other databases than the job, outside of its transaction, so
+    they are recorded on the job with their ids first: an attempt failing halfway is retried by writing the
+    paragraphs missing from their shards, the job never stores more paragraphs than it requested.
+    """
+    config = settings.PARAGRAPH_INGEST
+    if texts and sharding.is_sharded() and not _record(job, texts, error):
+        return
+
+    with transaction.atomic():
+        if not _owns(job):
+            return
+
+        if job.paragraphs and store_recorded:
+            _store_recorded(job.paragraphs)
+            job.status = IngestJob.Status.DONE
+            job.stored = len(job.paragraphs)
+            job.paragraphs = []
+            if not job.failed:
+                job.error = ''
+        elif texts:
+            paragraphs, duplicates = store(texts)
+            job.status = IngestJob.Status.DONE
+            job.stored = len(paragraphs)
+            job.duplicates = duplicates
+            job.failed = job.requested - len(texts)
+            job.error = error if job.failed else ''
+        elif job.attempts < config['MAX_ATTEMPTS']:
+            job.error = error
+            job.status = IngestJob.Status.PENDING
+            job.run_after = timezone.now() + timedelta(seconds=config['RETRY_DELAY'] * 2 ** (job.attempts - 1))
+        else:
+            job.error = error
+            job.status = IngestJob.Status.FAILED
+            job.failed = job.requested
+
+        if job.status != IngestJob.Status.PENDING:
+            job.finished_at = timezone.now()
+        job.save(update_fields=[
+            'status', 'stored', 'duplicates', 'failed', 'error', 'run_after', 'finished_at', 'paragraphs',
+        ])
@@ -0,0 +1,97 @@
+"""
+Pagination for the paragraph APIs.
+"""
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connections
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from core import sharding
+
+
+class ParagraphCursorPagination(CursorPagination):
+    """
+    Keyset pagination over paragraph ids.
+
+    Every page is fetched with `WHERE id > <cursor> ORDER BY id LIMIT <limit>`, so deep pages cost the same as
+    the first one. The total number of results is only computed on request, with `count=exact` running a
+    `COUNT(*)` and `count=estimate` reading the row estimate of the query planner. Pages of a
+    `core.sharding.ShardedQuerySet` merge the pages of every shard, and their counts sum the counts of the shards.
+    """
+    ordering = 'id'
+    page_size_query_param = 'limit'
+    count_query_param = 'count'
+    count_modes = ('exact', 'estimate', 'none')
+
+    def get_page_size(self, request):
+        config = settings.PARAGRAPH_SEARCH
+        if self.page_size_query_param not in request.query_params:
+            return config['PAGE_SIZE']
+
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except ValueError:
+            raise ValidationError(detail='Invalid page size limit.')
+        if page_size < 1:
+            raise ValidationError(detail='Invalid page size limit.')
+        return min(page_size, config['MAX_PAGE_SIZE'])
+
+    def paginate_queryset(self, queryset, request, view=None):
+        count_mode = request.query_params.get(self.count_query_param, 'none')
+        if count_mode not in self.count_modes:
+            raise ValidationError(detail='Invalid count mode.')
+
+        self.count = None
+        if count_mode == 'exact':
+            self.count = queryset.count()
+        elif count_mode == 'estimate':
+            self.count = self.estimate_count(queryset)
+        return super().paginate_queryset(queryset, request, view)
+
+    @staticmethod
+    def estimate_count(queryset):
+        """Return the number of rows the query planner expects `queryset` to produce."""
+        if isinstance(queryset, sharding.ShardedQuerySet):
+            return sum(sharding.scatter(
+                lambda alias: ParagraphCursorPagination.estimate_count(queryset.queryset.using(alias)), queryset.shards,
+            ))
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connections[queryset.db].cursor() as cursor:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+            plan = cursor.fetchone()[0]
+        return int(plan[0]['Plan']['Plan Rows'])
+
+    def get_paginated_response(self, data):
+        body = OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ])
+        if self.count is not None:
+            body['count'] = self.count
+        body['results'] = data
+        return Response(body)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count'] = {
+            'type': 'integer',
+            'example': 123,
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'How to count the results: "exact", "estimate" from planner statistics or "none".',
+            'schema': {
+                'type': 'string',
+                'enum': list(self.count_modes),
+            },
+        })
+        return parameters
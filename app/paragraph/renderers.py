@@ -0,0 +1,23 @@
+"""
+Renderers for the paragraph APIs.
+"""
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class NDJSONRenderer(BaseRenderer):
+    """
+    Render newline delimited JSON.
+
+    Search results are streamed by the view itself, this renderer is used for content negotiation and for
+    responses that are not streamed, like errors, which are rendered as a single line.
+    """
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return (json.dumps(data, ensure_ascii=False) + '\n').encode(self.charset)
@@ -0,0 +1,636 @@
+"""
+Search backends for the paragraph search API.
+"""
+import bisect
+import heapq
+import os
+import pickle
+import random
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+from django.conf import settings
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+)
+from django.core.exceptions import (
+    EmptyResultSet,
+    ImproperlyConfigured,
+)
+from django.db import (
+    OperationalError,
+    connections,
+    router,
+    transaction,
+)
+from django.db.models import F
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+from rest_framework.exceptions import ValidationError
+
+from core import sharding
+from core.models import (
+    Paragraph,
+    SEARCH_CONFIG,
+    WordFrequency,
+)
+from core.signals import (
+    paragraphs_added,
+    paragraphs_removed,
+)
+
+OPERATORS = ('or', 'and')
+MATCHES = ('exact', 'prefix', 'fuzzy')
+
+# Options of the `ts_headline` snippets returned by ranked searches.
+HEADLINE_OPTIONS = {'max_words': 35, 'min_words': 15, 'max_fragments': 2}
+
+
+def normalize_words(words):
+    """Return the canonical form of search words, full text search ignores their case, order and repeats."""
+    return sorted({word.strip().lower() for word in words})
+
+
+def raw_query(words, operator):
+    """Return the `to_tsquery` text matching any ("or") or all ("and") of `words`."""
+    if operator == "or":
+        return " | ".join(words)
+    if operator == "and":
+        return " & ".join(words)
+    raise ValidationError(detail='Invalid operator used for filtering.')
+
+
+def populate_search_query(words, operator, match='exact'):
+    """
+    Return the raw full text search query matching any ("or") or all ("and") of `words`.
+
+    With the "prefix" `match`, words match the lexemes they are a prefix of. With "fuzzy", words also match the
+    closest words of the corpus, see `expand_fuzzy`.
+    """
+    if match == 'prefix':
+        words = [f'{word}:*' for word in words]
+    elif match == 'fuzzy':
+        words = [f"({' | '.join(group)})" for group in expand_fuzzy(words)]
+    elif match != 'exact':
+        raise ValidationError(detail='Invalid match used for filtering.')
+    return SearchQuery(raw_query(words, operator), search_type="raw", config=SEARCH_CONFIG)
+
+
+def expand_fuzzy(words):
+    """
+    Return, for each of `words`, the word itself followed by the closest words of the corpus.
+
+    Close words are looked up by trigram similarity in the vocabulary of `WordFrequency`, through its trigram
+    index, and at most `FUZZY_EXPANSIONS` of them at least `FUZZY_MIN_SIMILARITY` similar are kept per word, the
+    most similar and frequent first. The vocabulary grows much slower than the corpus, and all the words are
+    expanded in a single statement. When paragraphs are sharded, the close words of every shard are merged and
+    their counts summed, so words just missing the closest of some shards are undercounted.
+    """
+    if sharding.is_sharded():
+        shard_rows = sharding.scatter(lambda alias: _fuzzy_candidates(words, alias))
+    else:
+        shard_rows = [_fuzzy_candidates(words, router.db_for_read(WordFrequency))]
+
+    candidates = [{} for word in words]
+    for rows in shard_rows:
+        for position, word, similarity, count in rows:
+            previous_count = candidates[position - 1].get(word, (similarity, 0))[1]
+            candidates[position - 1][word] = (similarity, previous_count + count)
+
+    groups = []
+    for word, close_words in zip(words, candidates):
+        group = [word]
+        ranked = sorted(close_words.items(), key=lambda item: (-item[1][0], -item[1][1], item[0]))
+        for close_word, _ in ranked[:settings.PARAGRAPH_SEARCH['FUZZY_EXPANSIONS']]:
+            if close_word.lower() not in {term.lower() for term in group}:
+                group.append(close_word)
+        groups.append(group)
+    return groups
+
+
+def _fuzzy_candidates(words, using):
+    """Return the `(position, word, similarity, count)` rows of the closest words of the corpus on `using`."""
+    config = settings.PARAGRAPH_SEARCH
+    with connections[using].cursor() as cursor:
+        # `%` is served by the trigram index, at the default `pg_trgm.similarity_threshold` of 0.3.
+        cursor.execute(
+            """
+            SELECT q.position, e.word, e.similarity, e.count
+            FROM unnest(%s::text[]) WITH ORDINALITY AS q(term, position)
+            CROSS JOIN LATERAL (
+                SELECT w.word, similarity(w.word, q.term) AS similarity, w.count FROM core_wordfrequency AS w
+                WHERE w.word %% q.term AND similarity(w.word, q.term) >= %s
+                ORDER BY similarity(w.word, q.term) DESC, w.count DESC, w.word
+                LIMIT %s
+            ) AS e
+            """,
+            [list(words), config['FUZZY_MIN_SIMILARITY'], config['FUZZY_EXPANSIONS']],
+        )
+        return cursor.fetchall()
+
+
+def filter_paragraphs(queryset, words, operator, match='exact'):
+    """
+    Narrow `queryset` down to the paragraphs matching `words` combined with `operator`.
+
+    Exact matches are answered by the configured backend. Prefix and fuzzy matches are always answered by Postgres
+    full text search.
+    """
+    if match == 'exact':
+        return get_backend().filter(queryset, words, operator)
+    return queryset.filter(search_vector=populate_search_query(words, operator, match))
+
+
+def batch_search(queries, with_text=False, using=None):
+    """
+    Run several searches in a single SQL statement.
+
+    `queries` is a list of `(words, operator, limit)` tuples. Returns, for each query in order, the list of the ids
+    of the first `limit` matching paragraphs in id order, or of `(id, text)` pairs if `with_text` is set. Searches
+    differing only in the case, order or repeats of their words are run once, with the largest of their limits.
+    When paragraphs are sharded and no database is given, the statement runs on every shard.
+    """
+    if using is None and sharding.is_sharded():
+        shard_matches = sharding.scatter(lambda alias: batch_search(queries, with_text, using=alias))
+        key = (lambda row: row[0]) if with_text else None
+        return [
+            sharding.merge(matches, key=key, limit=limit)
+            for matches, (words, operator, limit) in zip(zip(*shard_matches), queries)
+        ]
+
+    unique = {}
+    keys = []
+    for words, operator, limit in queries:
+        key = raw_query(normalize_words(words), operator)
+        unique[key] = max(unique.get(key, 0), limit)
+        keys.append(key)
+
+    columns = 'id, text' if with_text else 'id'
+    # Each query is joined laterally to its own index scan, so its limit applies before the others run.
+    sql = f"""
+        SELECT q.query, p.*
+        FROM unnest(%s::text[], %s::int[]) AS q(query, lim)
+        CROSS JOIN LATERAL (
+            SELECT {columns} FROM core_paragraph
+            WHERE search_vector @@ to_tsquery(%s::regconfig, q.query)
+            ORDER BY id
+            LIMIT q.lim
+        ) AS p
+        ORDER BY q.query, p.id
+    """
+    matches = {key: [] for key in unique}
+    with connections[using or router.db_for_read(Paragraph)].cursor() as cursor:
+        cursor.execute(sql, [list(unique), list(unique.values()), SEARCH_CONFIG])
+        for key, *row in cursor.fetchall():
+            matches[key].append(tuple(row) if with_text else row[0])
+
+    return [matches[key][:limit] for key, (words, operator, limit) in zip(keys, queries)]
+
+
+def rank(queryset, words, operator, k, snippet=False, match='exact'):
+    """
+    Return the `k` paragraphs of `queryset` best matching `words` combined with `operator`, best first.
+
+    Paragraphs are annotated with their cover density rank (`ts_rank_cd`) against `Paragraph.search_vector`,
+    whatever the configured backend, and the limit is applied in SQL before anything else is computed. With
+    `snippet`, the paragraphs are annotated with a `snippet` headline of their text and the text is not loaded.
+    Words are matched according to `match`, see `populate_search_query`. When paragraphs are sharded, the best `k`
+    of every shard are merged into a list, the rank of a paragraph does not depend on the other paragraphs.
+    """
+    if sharding.is_sharded():
+        return sharding.merge(
+            sharding.scatter(
+                lambda alias: list(_rank(queryset.using(alias), words, operator, k, snippet, match)),
+            ),
+            key=lambda paragraph: (-paragraph.rank, paragraph.id),
+            limit=k,
+        )
+    return _rank(queryset, words, operator, k, snippet, match)
+
+
+def _rank(queryset, words, operator, k, snippet, match):
+    query = populate_search_query(words, operator, match)
+    rank = SearchRank(F('search_vector'), query, cover_density=True)
+    top = queryset.filter(search_vector=query).annotate(rank=rank).order_by('-rank', 'id').values('id')[:k]
+    # Rank the k winners again rather than all the matches, so headlines are only built for them.
+    ranked = queryset.filter(id__in=top).annotate(rank=rank).order_by('-rank', 'id')
+    if snippet:
+        headline = SearchHeadline('text', query, config=SEARCH_CONFIG, **HEADLINE_OPTIONS)
+        ranked = ranked.annotate(snippet=headline).only('id')
+    return ranked
+
+
+def word_facets(queryset, limit):
+    """
+    Return the `limit` most frequent words among the paragraphs of `queryset`, counted inside Postgres.
+
+    Words are the lexemes of `Paragraph.search_vector`, so stop words are left out and words are stemmed. When more
+    than `FACET_SAMPLE_SIZE` paragraphs match, the words of that many paragraphs are counted, the matches in id order
+    from a random id on, wrapping around to the lowest ids, and matches past the sample are not read. The
+    computation is cancelled after `FACET_TIMEOUT` milliseconds. Returns a dict with the `(word, count)` pairs under
+    `words` and whether they were `sampled` or the computation `timed_out`.
+
+    When paragraphs are sharded, the `limit` most frequent words of every shard are summed, so words just missing
+    the top of some shards are undercounted.
+    """
+    if sharding.is_sharded():
+        shard_facets = sharding.scatter(lambda alias: _word_facets(queryset.using(alias), limit))
+        counts = Counter()
+        for facets in shard_facets:
+            counts.update(dict(facets['words']))
+        return {
+            'words': sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit],
+            'sampled': any(facets['sampled'] for facets in shard_facets),
+            'timed_out': any(facets['timed_out'] for facets in shard_facets),
+        }
+    return _word_facets(queryset, limit)
+
+
+def _word_facets(queryset, limit):
+    config = settings.PARAGRAPH_SEARCH
+    facets = {'words': [], 'sampled': False, 'timed_out': False}
+    try:
+        matches, params = queryset.order_by().values('id').query.sql_with_params()
+    except EmptyResultSet:
+        return facets
+
+    sample_size = config['FACET_SAMPLE_SIZE']
+    try:
+        with transaction.atomic(using=queryset.db), connections[queryset.db].cursor() as cursor:
+            cursor.execute("SELECT current_setting('statement_timeout')")
+            previous_timeout = cursor.fetchone()[0]
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [str(config['FACET_TIMEOUT'])])
+
+            cursor.execute(f'SELECT count(*) FROM (SELECT 1 FROM ({matches}) AS m LIMIT %s) AS m', [
+                *params, sample_size + 1,
+            ])
+            if cursor.fetchone()[0] > sample_size:
+                facets['sampled'] = True
+                cursor.execute('SELECT min(id), max(id) FROM core_paragraph')
+                start = random.randint(*cursor.fetchone())
+                # The second run of matches is only read when the first one falls short of the sample size.
+                matches = f"""
+                    SELECT id FROM (
+                        (SELECT id FROM ({matches}) AS m WHERE id >= %s ORDER BY id LIMIT %s)
+                        UNION ALL
+                        (SELECT id FROM ({matches}) AS m WHERE id < %s ORDER BY id LIMIT %s)
+                    ) AS m LIMIT %s
+                """
+                params = [*params, start, sample_size, *params, start, sample_size, sample_size]
+
+            # Positions are capped at 256 per lexeme and paragraph, close enough for ranking words.
+            cursor.execute(f"""
+                SELECT u.lexeme, sum(coalesce(array_length(u.positions, 1), 1)) AS occurrences
+                FROM core_paragraph AS p
+                JOIN ({matches}) AS m ON m.id = p.id
+                CROSS JOIN LATERAL unnest(p.search_vector) AS u
+                GROUP BY u.lexeme
+                ORDER BY occurrences DESC, u.lexeme
+                LIMIT %s
+            """, [*params, limit])
+            facets['words'] = cursor.fetchall()
+            cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous_timeout])
+    except OperationalError as err:
+        # Only give up on cancellations by the statement timeout (query_canceled).
+        if getattr(err.__cause__, 'pgcode', None) != '57014':
+            raise
+        facets['timed_out'] = True
+    return facets
+
+
+def get_backend():
+    """Return the search backend configured by the `BACKEND` key of the `PARAGRAPH_SEARCH` setting."""
+    return _load_backend(settings.PARAGRAPH_SEARCH['BACKEND'])
+
+
+@lru_cache(maxsize=None)
+def _load_backend(path):
+    return import_string(path)()
+
+
+class PostgresSearchBackend:
+    """Full text search against the GIN-indexed `Paragraph.search_vector` column."""
+
+    def filter(self, queryset, words, operator):
+        """Narrow `queryset` down to the paragraphs matching `words` combined with `operator`."""
+        return queryset.filter(search_vector=populate_search_query(words, operator))
+
+
+def _insert_sorted(values, value):
+    """Insert `value` into the sorted array `values` unless present, returning whether it was inserted."""
+    if not values or values[-1] < value:
+        values.append(value)
+        return True
+    position = bisect.bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        return False
+    values.insert(position, value)
+    return True
+
+
+def _delete_sorted(values, value):
+    """Delete `value` from the sorted array `values` if present, returning whether it was deleted."""
+    position = bisect.bisect_left(values, value)
+    if position < len(values) and values[position] == value:
+        del values[position]
+        return True
+    return False
+
+
+class InvertedIndex:
+    """
+    In-memory inverted index from lexeme to the sorted ids of the paragraphs containing it.
+
+    Lexemes are the ones Postgres stores in `Paragraph.search_vector` and uses to parse queries, so searches match
+    the semantics of `PostgresSearchBackend`. Postings are compact sorted arrays of unsigned 64-bit paragraph ids,
+    the range of the `bigint` primary key, and are combined by merging them. `ids` holds the sorted ids of every
+    paragraph indexed, with or without lexemes, `max_id` is the highest of them and `size` their number.
+    """
+
+    SNAPSHOT_VERSION = 3
+    TYPECODE = 'Q'
+
+    def __init__(self):
+        self.postings = {}
+        self.ids = array(self.TYPECODE)
+        self.lock = threading.RLock()
+
+    @property
+    def max_id(self):
+        return self.ids[-1] if self.ids else 0
+
+    @property
+    def size(self):
+        return len(self.ids)
+
+    def add(self, paragraph_id, lexemes):
+        with self.lock:
+            _insert_sorted(self.ids, paragraph_id)
+            for lexeme in set(lexemes):
+                _insert_sorted(self.postings.setdefault(lexeme, array(self.TYPECODE)), paragraph_id)
+
+    def remove(self, paragraph_id, lexemes):
+        with self.lock:
+            _delete_sorted(self.ids, paragraph_id)
+            for lexeme in set(lexemes):
+                postings = self.postings.get(lexeme)
+                if postings is not None and _delete_sorted(postings, paragraph_id) and not postings:
+                    del self.postings[lexeme]
+
+    def ids_above(self, paragraph_id):
+        """Return the sorted ids indexed above `paragraph_id`."""
+        with self.lock:
+            return self.ids[bisect.bisect_right(self.ids, paragraph_id):].tolist()
+
+    def search(self, lexeme_groups, operator):
+        """
+        Return the sorted ids of the paragraphs matching `lexeme_groups` combined with `operator`.
+
+        Each group holds the lexemes of one query word, all of which must be present for the word to match.
+        """
+        with self.lock:
+            groups = [self._intersect([self.postings.get(lexeme, ()) for lexeme in group])
+                      for group in lexeme_groups]
+            if operator == 'and':
+                return self._intersect(groups)
+            return self._union(groups)
+
+    @staticmethod
+    def _intersect(postings_lists):
+        if not postings_lists:
+            return []
+        # Intersect the shortest lists first, each step can only shrink the candidates, and look their ids up in
+        # the longer lists by binary search from the position of the previous id.
+        postings_lists = sorted(postings_lists, key=len)
+        result = list(postings_lists[0])
+        for postings in postings_lists[1:]:
+            matched = []
+            low = 0
+            for paragraph_id in result:
+                low = bisect.bisect_left(postings, paragraph_id, low)
+                if low == len(postings):
+                    break
+                if postings[low] == paragraph_id:
+                    matched.append(paragraph_id)
+            result = matched
+            if not result:
+                break
+        return result
+
+    @staticmethod
+    def _union(postings_lists):
+        merged = []
+        for paragraph_id in heapq.merge(*postings_lists):
+            if not merged or merged[-1] != paragraph_id:
+                merged.append(paragraph_id)
+        return merged
+
+    def dump(self, path):
+        """Write the index to `path`, atomically replacing any previous snapshot."""
+        with self.lock:
+            snapshot = {
+                'version': self.SNAPSHOT_VERSION,
+                'config': SEARCH_CONFIG,
+                'ids': self.ids.tobytes(),
+                'postings': {lexeme: postings.tobytes() for lexeme, postings in self.postings.items()},
+            }
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'wb') as snapshot_file:
+            pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Return the index stored at `path`, or None if there is no usable snapshot."""
+        try:
+            with open(path, 'rb') as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        if snapshot.get('version') != cls.SNAPSHOT_VERSION or snapshot.get('config') != SEARCH_CONFIG:
+            return None
+
+        index = cls()
+        index.ids.frombytes(snapshot['ids'])
+        for lexeme, data in snapshot['postings'].items():
+            postings = array(cls.TYPECODE)
+            postings.frombytes(data)
+            index.postings[lexeme] = postings
+        return index
+
+
+class InvertedIndexSearchBackend:
+    """
+    Search backend answering queries from an in-memory `InvertedIndex` instead of Postgres.
+
+    The index is loaded from the `INDEX_SNAPSHOT` file of the `PARAGRAPH_SEARCH` setting, if one exists and is
+    consistent with the database, or built from the database on first use. It then follows the paragraphs added
+    and removed by this process. Paragraphs added by other processes are picked up by searches at most every
+    `INDEX_REFRESH_INTERVAL` seconds, when their id is higher than the highest id indexed minus
+    `INDEX_REFRESH_WINDOW`, as ids are not committed in order. Other writes of other processes are not seen, so
+    deployments with several writers should rebuild the index regularly. The index is only changed with the lock
+    of the backend held.
+    """
+
+    CHUNK_SIZE = 2000
+
+    def __init__(self):
+        self._index = None
+        self._refreshed_at = None
+        self._lock = threading.RLock()
+
+    @property
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                self._index = self._load() or self.build()
+                self._refreshed_at = time.monotonic()
+            return self._index
+
+    @property
+    def is_loaded(self):
+        return self._index is not None
+
+    def reset(self):
+        """Drop the index, it is loaded or rebuilt on next use."""
+        with self._lock:
+            self._index = None
+            self._refreshed_at = None
+
+    def build(self, since_id=0, index=None):
+        """Return an index of the stored paragraphs with an id above `since_id`, added to `index` if given."""
+        index = index or InvertedIndex()
+        with self._lock:
+            for paragraph_id, lexemes in self._fetch_lexemes('id > %s', [since_id]):
+                index.add(paragraph_id, lexemes)
+        return index
+
+    def catch_up(self, index):
+        """
+        Add to `index` the stored paragraphs it misses among the ones with an id above its highest id minus
+        `INDEX_REFRESH_WINDOW`, which covers the ids committed after higher ones. Returns the index.
+        """
+        with self._lock:
+            since_id = max(index.max_id - settings.PARAGRAPH_SEARCH['INDEX_REFRESH_WINDOW'], 0)
+            # The ids indexed are read with the lock held, so concurrent catch-ups do not add paragraphs twice.
+            indexed = index.ids_above(since_id)
+            for paragraph_id, lexemes in self._fetch_lexemes('id > %s AND NOT id = ANY(%s::bigint[])',
+                                                             [since_id, indexed]):
+                index.add(paragraph_id, lexemes)
+        return index
+
+    def refresh(self, index):
+        """Catch `index` up with the paragraphs stored by other processes, unless it was refreshed recently."""
+        with self._lock:
+            now = time.monotonic()
+            if self._refreshed_at is not None:
+                if now - self._refreshed_at < settings.PARAGRAPH_SEARCH['INDEX_REFRESH_INTERVAL']:
+                    return
+            self._refreshed_at = now
+            self.catch_up(index)
+
+    def _load(self):
+        path = settings.PARAGRAPH_SEARCH.get('INDEX_SNAPSHOT')
+        index = InvertedIndex.load(path) if path else None
+        if index is None:
+            return None
+
+        # The snapshot is stale if paragraphs it covers were deleted since, otherwise catch up with new ones.
+        if Paragraph.objects.filter(id__lte=index.max_id).count() != index.size:
+            return None
+        return self.catch_up(index)
+
+    def filter(self, queryset, words, operator):
+        """Narrow `queryset` down to the paragraphs matching `words` combined with `operator`."""
+        if sharding.is_sharded():
+            raise ImproperlyConfigured('The inverted index search backend does not support sharded paragraphs.')
+        if operator not in OPERATORS:
+            raise ValidationError(detail='Invalid operator used for filtering.')
+
+        index = self.index
+        self.refresh(index)
+
+        lexeme_groups = [group for group in self._normalize(words) if group]
+        if not lexeme_groups:
+            # Postgres does not match anything when every word is a stop word.
+            return queryset.none()
+        # A single array parameter keeps the statement small however many paragraphs match.
+        ids = RawSQL('SELECT unnest(%s::bigint[])', [index.search(lexeme_groups, operator)])
+        return queryset.filter(id__in=ids)
+
+    def _normalize(self, words):
+        """Return the lexemes Postgres parses each of `words` into when building a query."""
+        return [query_lexemes(word) for word in words]
+
+    def _fetch_lexemes(self, condition, params, using=None):
+        with connections[using or router.db_for_read(Paragraph)].cursor() as cursor:
+            cursor.execute(
+                f"SELECT id, tsvector_to_array(search_vector) FROM core_paragraph WHERE {condition} ORDER BY id",
+                params,
+            )
+            while True:
+                rows = cursor.fetchmany(self.CHUNK_SIZE)
+                if not rows:
+                    break
+                yield from rows
+
+    def _lexemes_of_texts(self, texts):
+        with connections[router.db_for_read(Paragraph)].cursor() as cursor:
+            cursor.execute(
+                "SELECT tsvector_to_array(to_tsvector(%s::regconfig, text)) FROM unnest(%s::text[]) AS text",
+                [SEARCH_CONFIG, texts],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def paragraphs_added(self, paragraphs, using=None):
+        if not self.is_loaded:
+            return
+        ids = [paragraph.id for paragraph in paragraphs]
+        # Read from the database written to, replicas may not have the paragraphs yet.
+        rows = list(self._fetch_lexemes('id = ANY(%s)', [ids], using=using))
+        with self._lock:
+            for paragraph_id, lexemes in rows:
+                self.index.add(paragraph_id, lexemes)
+
+    def paragraphs_removed(self, paragraphs):
+        if not self.is_loaded:
+            return
+        lexemes = self._lexemes_of_texts([paragraph.text for paragraph in paragraphs])
+        with self._lock:
+            for paragraph, paragraph_lexemes in zip(paragraphs, lexemes):
+                self.index.remove(paragraph.id, paragraph_lexemes)
+
+
+LEXEME_PATTERN = re.compile(r"'((?:[^']|'')*)'")
+
+
+@lru_cache(maxsize=100000)
+def query_lexemes(word):
+    """Return the lexemes Postgres parses `word` into when building a query, cached for every backend."""
+    with connections[router.db_for_read(Paragraph)].cursor() as cursor:
+        cursor.execute("SELECT to_tsquery(%s::regconfig, %s)::text", [SEARCH_CONFIG, word])
+        query = cursor.fetchone()[0]
+    return tuple(lexeme.replace("''", "'") for lexeme in LEXEME_PATTERN.findall(query))
+
+
+def _index_backends():
+    return [backend for backend in (get_backend(),) if isinstance(backend, InvertedIndexSearchBackend)]
+
+
+@receiver(paragraphs_added, sender=Paragraph)
+def _add_to_index(sender, paragraphs, using, **kwargs):
+    for backend in _index_backends():
+        transaction.on_commit(lambda backend=backend: backend.paragraphs_added(paragraphs, using), using=using)
+
+
+@receiver(paragraphs_removed, sender=Paragraph)
+def _remove_from_index(sender, paragraphs, using, **kwargs):
+    for backend in _index_backends():
+        transaction.on_commit(lambda backend=backend: backend.paragraphs_removed(paragraphs), using=using)
@@ -1,8 +1,11 @@
+from django.conf import settings
 from rest_framework import serializers
 
 from core.models import (
-    Paragraph
+    IngestJob,
+    Paragraph,
 )
+from paragraph.search import OPERATORS
 
 
 class ParagraphSerializer(serializers.ModelSerializer):
@@ -12,3 +15,69 @@ class ParagraphSerializer(serializers.ModelSerializer):
         model = Paragraph
         fields = ['id', 'text']
         read_only_fields = ['id']
+
+
+class RankedParagraphSerializer(ParagraphSerializer):
+    """Serializer for Paragraphs ranked against a search query."""
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(ParagraphSerializer.Meta):
+        fields = ['id', 'rank', 'text']
+
+
+class ParagraphSnippetSerializer(serializers.ModelSerializer):
+    """Serializer for Paragraphs ranked against a search query, with a highlighted snippet instead of the text."""
+    rank = serializers.FloatField(read_only=True)
+    snippet = serializers.CharField(read_only=True)
+
+    class Meta:
+        model = Paragraph
+        fields = ['id', 'rank', 'snippet']
+        read_only_fields = ['id']
+
+
+class IngestJobSerializer(serializers.ModelSerializer):
+    """Serializer for queued paragraph ingestions."""
+
+    class Meta:
+        model = IngestJob
+        fields = [
+            'id', 'status', 'requested', 'stored', 'duplicates', 'failed', 'attempts', 'error',
+            'created_at', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class SearchWordField(serializers.RegexField):
+    """Field for a search word, which goes into a raw text search query where operators and spaces would not parse."""
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault('error_messages', {'invalid': 'Words may only hold letters, digits and underscores.'})
+        super().__init__(r'^\w+$', **kwargs)
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """Serializer for one of the queries of a batch search."""
+    words = serializers.ListField(child=SearchWordField(), allow_empty=False)
+    operator = serializers.ChoiceField(choices=OPERATORS)
+    limit = serializers.IntegerField(min_value=1, required=False)
+
+    def validate_limit(self, value):
+        return min(value, settings.PARAGRAPH_SEARCH['MAX_PAGE_SIZE'])
+
+    def to_internal_value(self, data):
+        values = super().to_internal_value(data)
+        values.setdefault('limit', settings.PARAGRAPH_SEARCH['PAGE_SIZE'])
+        return values
+
+
+class SearchBatchSerializer(serializers.Serializer):
+    """Serializer for batch searches."""
+    queries = SearchQuerySerializer(many=True, allow_empty=False)
+    paragraphs = serializers.BooleanField(default=False)
+
+    def validate_queries(self, value):
+        max_queries = settings.PARAGRAPH_SEARCH['BATCH_MAX_QUERIES']
+        if len(value) > max_queries:
+            raise serializers.ValidationError(f'A batch holds at most {max_queries} queries.')
+        return value
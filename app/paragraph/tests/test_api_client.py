@@ -0,0 +1,206 @@
+"""
+Tests for the external API client.
+"""
+import asyncio
+import time
+from unittest.mock import patch
+from urllib.parse import urlsplit
+
+from django.test import (
+    SimpleTestCase,
+    override_settings,
+)
+
+from core import metrics
+from paragraph import (
+    api_client,
+    upstream,
+)
+from core.benchmarking import (
+    DEFINITION_PATH,
+    PARAGRAPH_PATH,
+    UpstreamStub,
+)
+
+LOOKUP_SETTINGS = {'MODE': 'threads', 'MAX_WORKERS': 10, 'DEADLINE': 2.0}
+
+UPSTREAM_SETTINGS = {
+    'POOL_CONNECTIONS': 2,
+    'POOL_MAXSIZE': 10,
+    'ASYNC_MAX_CONNECTIONS': 100,
+    'ASYNC_POOL_SIZE': 10,
+    'CONNECT_TIMEOUT': 1.0,
+    'READ_TIMEOUT': 1.0,
+    'RETRIES': 0,
+    'RETRY_BUDGET': 2.0,
+    'BACKOFF_BASE': 0.01,
+    'BACKOFF_MAX': 0.05,
+    'BREAKER_FAILURE_THRESHOLD': 3,
+    'BREAKER_RESET_TIMEOUT': 0.3,
+}
+
+
+class UpstreamStubTestCase(SimpleTestCase):
+    """Run each test against a fresh stub of the external APIs and a fresh pooled client."""
+
+    delay = 0.0
+
+    def setUp(self):
+        self.stub = UpstreamStub(delay=self.delay).__enter__()
+        self.addCleanup(self.stub.__exit__)
+        upstream.client.reset()
+        self.addCleanup(upstream.client.reset)
+        for name, url in (('DEFINITION_URL', DEFINITION_PATH), ('PARAGRAPH_URL', PARAGRAPH_PATH)):
+            patcher = patch(f'paragraph.api_client.{name}', self.stub.url + url)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+
+@override_settings(UPSTREAM_HTTP=UPSTREAM_SETTINGS)
+class UpstreamClientTests(UpstreamStubTestCase):
+    """Test the pooled client shared by the requests to the external APIs."""
+
+    def test_reuses_connections(self):
+        for _ in range(3):
+            self.assertEqual(api_client.get_paragraph(), self.stub.paragraph)
+        self.assertEqual(len(self.stub.connections), 1)
+
+    @override_settings(UPSTREAM_HTTP={**UPSTREAM_SETTINGS, 'ASYNC_MAX_CONNECTIONS': 4, 'ASYNC_POOL_SIZE': 2})
+    def test_shared_async_client_spreads_requests(self):
+        self.stub.delay = 0.1
+
+        async def fetch():
+            try:
+                pool = upstream.client.shared_async_client()
+                self.assertIs(upstream.client.shared_async_client(), pool)
+                texts = await asyncio.gather(*[api_client.aget_paragraph() for _ in range(4)])
+                return pool, texts
+            finally:
+                await upstream.client.aclose()
+
+        pool, texts = asyncio.run(fetch())
+        self.assertEqual(texts, [self.stub.paragraph] * 4)
+        self.assertEqual(len(pool.clients), 2)
+        self.assertEqual(len(self.stub.connections), 4)
+
+    @override_settings(UPSTREAM_HTTP={**UPSTREAM_SETTINGS, 'RETRIES': 3})
+    def test_retries_transient_failures(self):
+        self.stub.statuses[PARAGRAPH_PATH] = [503, 502, 200]
+
+        self.assertEqual(api_client.get_paragraph(), self.stub.paragraph)
+        self.assertEqual(len(self.stub.requests), 3)
+
+    @override_settings(UPSTREAM_HTTP={**UPSTREAM_SETTINGS, 'RETRIES': 3})
+    def test_records_metrics(self):
+        metrics.registry.clear()
+        host = urlsplit(self.stub.url).netloc
+        self.stub.statuses[PARAGRAPH_PATH] = [503, 200]
+
+        api_client.get_paragraph()
+
+        self.assertEqual(metrics.UPSTREAM_DURATION.count(host=host), 2)
+        self.assertEqual(metrics.UPSTREAM_ERRORS.value(host=host, reason='status_503'), 1)
+        self.assertIn(f'upstream_circuit_open{{host="{host}"}} 0', metrics.registry.render())
+
+    @override_settings(UPSTREAM_HTTP={**UPSTREAM_SETTINGS, 'RETRIES': 10, 'RETRY_BUDGET': 0.3})
+    def test_retries_are_limited_by_budget(self):
+        self.stub.delays[PARAGRAPH_PATH] = 0.1
+        self.stub.statuses[PARAGRAPH_PATH] = 503
+
+        with self.assertRaises(Exception):
+            api_client.get_paragraph()
+        self.assertLess(len(self.stub.requests), 4)
+
+    @override_settings(UPSTREAM_HTTP={**UPSTREAM_SETTINGS, 'RETRIES': 10, 'RETRY_BUDGET': 0.3})
+    def test_attempts_time_out_within_budget(self):
+        self.stub.delays[PARAGRAPH_PATH] = 0.8
+
+        def timed(get_paragraph):
+            start = time.monotonic()
+            with self.assertRaises(Exception):
+                get_paragraph()
+            return time.monotonic() - start
+
+        async def atimed():
+            try:
+                # Create the clients first, the budget only covers the request.
+                upstream.client.shared_async_client()
+                start = time.monotonic()
+                with self.assertRaises(Exception):
+                    await api_client.aget_paragraph()
+                return time.monotonic() - start
+            finally:
+                await upstream.client.aclose()
+
+        self.assertLess(timed(api_client.get_paragraph), 0.6)
+        self.assertLess(asyncio.run(atimed()), 0.6)
+        self.assertEqual(len(self.stub.requests), 2)
+
+    def test_circuit_breaker_fails_fast(self):
+        self.stub.statuses[PARAGRAPH_PATH] = 500
+        for _ in range(3):
+            with self.assertRaises(Exception):
+                api_client.get_paragraph()
+
+        with self.assertRaises(upstream.UpstreamUnavailable):
+            api_client.get_paragraph()
+        self.assertEqual(len(self.stub.requests), 3)
+
+        # A trial request is let through once the reset timeout passed, and closes the breaker on success.
+        time.sleep(0.3)
+        self.stub.statuses[PARAGRAPH_PATH] = 200
+        self.assertEqual(api_client.get_paragraph(), self.stub.paragraph)
+        self.assertFalse(upstream.client.breaker(self.stub.url).is_open)
+
+
+@override_settings(DEFINITION_LOOKUP=LOOKUP_SETTINGS, UPSTREAM_HTTP=UPSTREAM_SETTINGS)
+class WordDefinitionsBatchTests(UpstreamStubTestCase):
+    """Test concurrent definition lookups against a local stub of dictionaryapi.dev."""
+
+    delay = 0.2
+
+    def test_lookups_run_concurrently(self):
+        words = [f'word{i}' for i in range(8)]
+        for mode in ('threads', 'asyncio'):
+            with self.subTest(mode=mode):
+                start = time.monotonic()
+                definitions, errors = api_client.get_word_definitions(words, mode=mode)
+                elapsed = time.monotonic() - start
+
+                self.assertEqual(list(definitions), words)
+                self.assertEqual(errors, {})
+                self.assertLess(elapsed, 0.2 * len(words) / 2)
+
+    def test_parallelism_is_bounded(self):
+        for mode in ('threads', 'asyncio'):
+            with self.subTest(mode=mode):
+                start = time.monotonic()
+                api_client.get_word_definitions(['a', 'b', 'c', 'd'], mode=mode, max_workers=2)
+                self.assertGreaterEqual(time.monotonic() - start, 0.4)
+
+    def test_partial_results_on_failures_and_deadline(self):
+        self.stub.delays['slow'] = 1.5
+        self.stub.statuses['broken'] = 500
+        self.stub.statuses['unknown'] = 404
+
+        for mode in ('threads', 'asyncio'):
+            with self.subTest(mode=mode):
+                start = time.monotonic()
+                definitions, errors = api_client.get_word_definitions(
+                    ['a', 'slow', 'broken', 'unknown'], mode=mode, deadline=0.6,
+                )
+
+                self.assertLess(time.monotonic() - start, 1.0)
+                self.assertEqual(set(definitions), {'a', 'unknown'})
+                self.assertFalse(api_client.is_definition_found(definitions['unknown']))
+                self.assertEqual(set(errors), {'slow', 'broken'})
+                self.assertEqual(errors['broken'], api_client.DEFINITION_API_ERROR)
+
+    def test_call_timeout(self):
+        self.stub.delays['slow'] = 1.5
+
+        for mode in ('threads', 'asyncio'):
+            with self.subTest(mode=mode):
+                definitions, errors = api_client.get_word_definitions(['a', 'slow'], mode=mode, deadline=5)
+                self.assertEqual(set(definitions), {'a'})
+                self.assertEqual(set(errors), {'slow'})
@@ -0,0 +1,186 @@
+"""
+Tests for the asynchronous views waiting on the external APIs.
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.test import (
+    AsyncClient,
+    TestCase,
+    override_settings,
+)
+from django.urls import reverse
+from rest_framework import status
+
+from core import (
+    metrics,
+    singleflight,
+)
+from core.models import (
+    IngestJob,
+    Paragraph,
+)
+from paragraph import (
+    api_client,
+    cache,
+    upstream,
+)
+from paragraph.tests.test_api_client import (
+    LOOKUP_SETTINGS,
+    UPSTREAM_SETTINGS,
+    UpstreamStubTestCase,
+)
+from core.benchmarking import PARAGRAPH_PATH
+
+ASYNC_CREATE_URL = reverse('paragraph:async-create')
+ASYNC_DICTIONARY_URL = reverse('paragraph:async-dict')
+
+
+# The async test client of Django 3.2 ignores the query of GET requests given as a dict, queries are in the URLs.
+@override_settings(DEFINITION_LOOKUP=LOOKUP_SETTINGS, UPSTREAM_HTTP=UPSTREAM_SETTINGS)
+class AsyncViewTests(UpstreamStubTestCase, TestCase):
+    """Test the async views against a local stub of the external APIs, through the ASGI request handler."""
+
+    delay = 0.05
+
+    def setUp(self):
+        super().setUp()
+        self.client = AsyncClient()
+        cache.definitions.clear()
+        self.addCleanup(cache.definitions.clear)
+
+    async def test_create_paragraph(self):
+        metrics.registry.clear()
+        try:
+            res = await self.client.get(ASYNC_CREATE_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json()['text'], self.stub.paragraph)
+        self.assertEqual(await sync_to_async(Paragraph.objects.count)(), 1)
+        # Queries run on the thread of `sync_to_async` are attributed to the request.
+        endpoint = 'paragraph:async-create'
+        self.assertEqual(metrics.REQUEST_DURATION.count(method='GET', endpoint=endpoint, status='201'), 1)
+        self.assertGreater(metrics.QUERY_DURATION.count(endpoint=endpoint), 0)
+
+    async def test_create_paragraph_duplicate(self):
+        try:
+            await self.client.get(ASYNC_CREATE_URL)
+            res = await self.client.get(ASYNC_CREATE_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertIn('duplicate_of', res.json())
+
+    @override_settings(PARAGRAPH_SIMILARITY={**settings.PARAGRAPH_SIMILARITY, 'REJECT_DUPLICATES': False})
+    async def test_create_paragraphs_bulk(self):
+        try:
+            res = await self.client.get(f'{ASYNC_CREATE_URL}?count=5')
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json(), {'created': 5, 'failed': 0, 'duplicates': 0})
+
+    async def test_create_paragraphs_bad_count(self):
+        res = await self.client.get(f'{ASYNC_CREATE_URL}?count=many')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.json(), ['Invalid paragraph count.'])
+
+    async def test_create_paragraph_failure(self):
+        self.stub.statuses[PARAGRAPH_PATH] = 500
+        try:
+            res = await self.client.get(ASYNC_CREATE_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertIn('error', res.json())
+
+    async def test_create_paragraphs_queued(self):
+        res = await self.client.get(f'{ASYNC_CREATE_URL}?count=3&async=true')
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        job = await sync_to_async(IngestJob.objects.get)()
+        self.assertEqual(res['Location'], reverse('paragraph:job', args=[job.id]))
+        self.assertEqual((res.json()['id'], res.json()['status'], res.json()['requested']), (job.id, 'pending', 3))
+        self.assertEqual(self.stub.requests, [])
+        self.assertFalse(await sync_to_async(Paragraph.objects.exists)())
+
+    @override_settings(PARAGRAPH_INGEST={**settings.PARAGRAPH_INGEST, 'ASYNC': True})
+    async def test_create_paragraph_queued_by_default(self):
+        res = await self.client.get(ASYNC_CREATE_URL)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(res.json()['requested'], 1)
+
+        res = await self.client.get(f'{ASYNC_CREATE_URL}?count=101&async=true')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    async def test_method_not_allowed(self):
+        res = await self.client.post(ASYNC_CREATE_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    async def test_dictionary(self):
+        self.stub.statuses['unknown'] = 404
+        await sync_to_async(Paragraph.objects.create)(text='unknown unknown word')
+        try:
+            res = await self.client.get(ASYNC_DICTIONARY_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['word'], [{'word': 'word', 'meanings': []}])
+        self.assertFalse(api_client.is_definition_found(res.json()['unknown']))
+        self.assertFalse(res.has_header('Cache-Control'))
+
+    async def test_dictionary_shares_flight_with_sync_view(self):
+        metrics.registry.clear()
+        await sync_to_async(Paragraph.objects.create)(text='word word')
+        try:
+            res = await self.client.get(ASYNC_DICTIONARY_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(singleflight.CALLS.value(name='dictionary', outcome='led'), 1)
+
+    async def test_dictionary_partial_failure(self):
+        self.stub.statuses['broken'] = 500
+        await sync_to_async(Paragraph.objects.create)(text='broken broken word')
+        try:
+            res = await self.client.get(ASYNC_DICTIONARY_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.json()['broken'])
+        self.assertIn('no-cache', res['Cache-Control'])
+
+    async def test_dictionary_failure(self):
+        self.stub.statuses['broken'] = 500
+        await sync_to_async(Paragraph.objects.create)(text='broken')
+        try:
+            res = await self.client.get(ASYNC_DICTIONARY_URL)
+        finally:
+            await upstream.client.aclose()
+
+        self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(res.json(), {'error': api_client.DEFINITION_API_ERROR})
+
+    @override_settings(PARAGRAPH_SIMILARITY={**settings.PARAGRAPH_SIMILARITY, 'REJECT_DUPLICATES': False})
+    async def test_requests_wait_concurrently(self):
+        self.stub.delay = 0.2
+        start = time.monotonic()
+        try:
+            responses = await asyncio.gather(*[self.client.get(f'{ASYNC_CREATE_URL}?count=1') for _ in range(10)])
+        finally:
+            await upstream.client.aclose()
+
+        self.assertTrue(all(res.status_code == status.HTTP_201_CREATED for res in responses))
+        self.assertLess(time.monotonic() - start, self.stub.delay * 10 / 2)
@@ -0,0 +1,242 @@
+"""
+Tests for the paragraph API caches.
+"""
+import threading
+import time
+from datetime import timedelta
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connections
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import (
+    Paragraph,
+    WordDefinition,
+)
+from paragraph import cache
+from paragraph.cache import (
+    DefinitionCache,
+    LRUCache,
+    SearchResultCache,
+)
+
+DICTIONARY_FETCH_URL = reverse('paragraph:dict')
+DICTIONARY_STATS_URL = reverse('paragraph:dict-stats')
+PARAGRAPHS_LIST_URL = reverse('paragraph:paragraph-list')
+SEARCH_STATS_URL = reverse('paragraph:search-stats')
+
+NOT_FOUND_PAYLOAD = {"title": "No Definitions Found", "message": "", "resolution": ""}
+
+
+def definition(word):
+    return [{"word": word, "meanings": []}]
+
+
+class LRUCacheTests(SimpleTestCase):
+    """Test the in-process LRU cache."""
+
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1, ttl=60)
+        lru.set('b', 2, ttl=60)
+        lru.get('a')
+        lru.set('c', 3, ttl=60)
+
+        self.assertEqual(len(lru), 2)
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+    @patch('paragraph.cache.time.monotonic')
+    def test_expires_entries(self, mock_monotonic):
+        mock_monotonic.return_value = 100
+        lru = LRUCache(max_size=2)
+        lru.set('a', 1, ttl=10)
+
+        mock_monotonic.return_value = 109
+        self.assertEqual(lru.get('a'), 1)
+        mock_monotonic.return_value = 110
+        self.assertIsNone(lru.get('a'))
+
+
+@patch('paragraph.api_client.get_word_definition', side_effect=definition)
+class DefinitionCacheTests(TestCase):
+    """Test the two-tier word definitions cache."""
+
+    def setUp(self):
+        self.cache = DefinitionCache()
+
+    def test_fetches_once_then_serves_from_memory(self, mock_definition):
+        self.assertEqual(self.cache.get_many(['a', 'b']), ({'a': definition('a'), 'b': definition('b')}, {}))
+        self.assertEqual(self.cache.get_many(['b', 'a']), ({'b': definition('b'), 'a': definition('a')}, {}))
+
+        self.assertEqual(mock_definition.call_count, 2)
+        self.assertEqual(self.cache.stats(), {'memory_hits': 2, 'database_hits': 0, 'misses': 2})
+        self.assertEqual(WordDefinition.objects.get(word='a').status, WordDefinition.Status.FOUND)
+
+    def test_serves_from_database_when_memory_is_cold(self, mock_definition):
+        self.cache.get_many(['a'])
+        self.cache.local.clear()
+
+        self.assertEqual(self.cache.get_many(['a']), ({'a': definition('a')}, {}))
+        self.assertEqual(mock_definition.call_count, 1)
+        self.assertEqual(self.cache.stats()['database_hits'], 1)
+
+    def test_caches_words_without_definition(self, mock_definition):
+        mock_definition.side_effect = lambda word: NOT_FOUND_PAYLOAD
+
+        self.cache.get_many(['xyzzy'])
+        self.cache.get_many(['xyzzy'])
+
+        self.assertEqual(mock_definition.call_count, 1)
+        self.assertEqual(WordDefinition.objects.get(word='xyzzy').status, WordDefinition.Status.NOT_FOUND)
+
+    def test_refetches_expired_definitions(self, mock_definition):
+        self.cache.get_many(['a'])
+        self.cache.local.clear()
+        WordDefinition.objects.update(fetched_at=timezone.now() - timedelta(days=30))
+
+        self.cache.get_many(['a'])
+        self.assertEqual(mock_definition.call_count, 2)
+        self.assertEqual(WordDefinition.objects.count(), 1)
+
+    def test_does_not_cache_failed_lookups(self, mock_definition):
+        mock_definition.side_effect = Exception('error')
+
+        self.assertEqual(self.cache.get_many(['a']), ({}, {'a': 'error'}))
+        self.cache.get_many(['a'])
+
+        self.assertEqual(mock_definition.call_count, 2)
+        self.assertFalse(WordDefinition.objects.exists())
+
+
+@patch('paragraph.api_client.get_word_definition', side_effect=definition)
+class DictionaryCacheApiTests(TestCase):
+    """Test the dictionary API is served from the definitions cache."""
+
+    def setUp(self):
+        self.client = APIClient()
+        patcher = patch('paragraph.cache.definitions', DefinitionCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_warm_dictionary_request_makes_no_outbound_calls(self, mock_definition):
+        Paragraph.objects.create(text="this this test paragraph")
+
+        first = self.client.get(DICTIONARY_FETCH_URL)
+        mock_definition.reset_mock()
+        second = self.client.get(DICTIONARY_FETCH_URL)
+
+        mock_definition.assert_not_called()
+        self.assertEqual(first.data, second.data)
+        stats = self.client.get(DICTIONARY_STATS_URL).data
+        self.assertEqual(stats, {'memory_hits': 3, 'database_hits': 0, 'misses': 3})
+
+
+def slow_definition(word):
+    time.sleep(0.2)
+    return definition(word)
+
+
+def run_concurrently(*functions):
+    """Call `functions` on a thread each, returning their results."""
+    results = {}
+
+    def run(index, function):
+        try:
+            results[index] = function()
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=run, args=item) for item in enumerate(functions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    return [results.get(index) for index in range(len(functions))]
+
+
+@patch('paragraph.api_client.get_word_definition', side_effect=slow_definition)
+class ConcurrentDefinitionLookupTests(TransactionTestCase):
+    """Test concurrent requests for the same definitions reach the external API once."""
+
+    def setUp(self):
+        patcher = patch('paragraph.cache.definitions', DefinitionCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_concurrent_lookups_fetch_each_word_once(self, mock_definition):
+        results = run_concurrently(
+            lambda: cache.definitions.get_many(['a', 'b']),
+            lambda: cache.definitions.get_many(['b', 'c']),
+            lambda: cache.definitions.get_many(['c', 'a']),
+        )
+
+        self.assertEqual(sorted(call.args[0] for call in mock_definition.call_args_list), ['a', 'b', 'c'])
+        self.assertEqual(results[1], ({'b': definition('b'), 'c': definition('c')}, {}))
+
+    def test_concurrent_dictionary_requests_share_one_build(self, mock_definition):
+        Paragraph.objects.create(text="this this test paragraph")
+
+        responses = run_concurrently(*[lambda: APIClient().get(DICTIONARY_FETCH_URL) for index in range(5)])
+
+        self.assertEqual(mock_definition.call_count, 3)
+        self.assertEqual([response.status_code for response in responses], [200] * 5)
+        self.assertEqual(len({str(response.data) for response in responses}), 1)
+
+
+class SearchResultCacheApiTests(TestCase):
+    """Test the paragraph search API is served from the search result cache."""
+
+    def setUp(self):
+        self.client = APIClient()
+        search_results = SearchResultCache()
+        search_results.clear()
+        patcher = patch('paragraph.cache.search_results', search_results)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        Paragraph.objects.create(text="This is a test paragraph")
+        Paragraph.objects.create(text="This is another sample paragraph")
+
+    def search(self, words, operator='or'):
+        return self.client.get(PARAGRAPHS_LIST_URL, {'words': words, 'operator': operator})
+
+    def test_cached_response_matches_uncached(self):
+        first = self.search('test,sample')
+        second = self.search('test,sample')
+
+        self.assertEqual(first.content, second.content)
+        self.assertEqual(len(second.data['results']), 2)
+        self.assertEqual(self.client.get(SEARCH_STATS_URL).data, {'hits': 1, 'misses': 1, 'hit_ratio': 0.5})
+
+    def test_normalized_queries_share_an_entry(self):
+        self.search('test,sample')
+        self.search('SAMPLE,test,test')
+        self.search('test,sample', operator='and')
+
+        self.assertEqual(self.client.get(SEARCH_STATS_URL).data['hits'], 1)
+
+    def test_writes_invalidate_cached_results(self):
+        self.assertEqual(len(self.search('paragraph').data['results']), 2)
+        paragraph = Paragraph.objects.create(text="A third paragraph")
+        self.assertEqual(len(self.search('paragraph').data['results']), 3)
+        paragraph.delete()
+        self.assertEqual(len(self.search('paragraph').data['results']), 2)
+
+        self.assertEqual(self.client.get(SEARCH_STATS_URL).data['hits'], 0)
+
+    @override_settings(PARAGRAPH_SEARCH_CACHE={**settings.PARAGRAPH_SEARCH_CACHE, 'MAX_IDS': 1})
+    def test_large_results_are_not_cached(self):
+        self.assertEqual(len(self.search('paragraph').data['results']), 2)
+        self.assertEqual(len(self.search('paragraph').data['results']), 2)
+
+        self.assertEqual(self.client.get(SEARCH_STATS_URL).data['hits'], 0)
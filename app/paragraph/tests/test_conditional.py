@@ -0,0 +1,89 @@
+"""
+Tests for conditional requests to the paragraph APIs.
+"""
+from unittest.mock import patch
+
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Paragraph
+from paragraph import cache
+
+PARAGRAPHS_LIST_URL = reverse('paragraph:paragraph-list')
+DICTIONARY_FETCH_URL = reverse('paragraph:dict')
+
+
+class ConditionalSearchTests(TestCase):
+    """Test search responses are revalidated against the corpus generation."""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.search_results.clear()
+        Paragraph.objects.create(text="This is a test paragraph")
+
+    def search(self, words='test,paragraph', **headers):
+        return self.client.get(PARAGRAPHS_LIST_URL, {'words': words, 'operator': 'or'}, **headers)
+
+    def test_not_modified_without_running_the_search(self):
+        res = self.search()
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertIn('public', res['Cache-Control'])
+        self.assertIn('max-age=10', res['Cache-Control'])
+
+        # Only the corpus generation is read.
+        with self.assertNumQueries(1):
+            revalidated = self.search(HTTP_IF_NONE_MATCH=res['ETag'])
+        self.assertEqual(revalidated.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(revalidated['ETag'], res['ETag'])
+        self.assertEqual(revalidated.content, b'')
+
+    def test_etag_follows_the_normalized_query_and_the_corpus(self):
+        etag = self.search()['ETag']
+
+        self.assertEqual(self.search('Paragraph,test,test')['ETag'], etag)
+        self.assertNotEqual(self.search('test')['ETag'], etag)
+        self.assertNotEqual(self.search(HTTP_ACCEPT='application/x-ndjson')['ETag'], etag)
+
+        Paragraph.objects.create(text="Another test paragraph")
+        res = self.search(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_errors_are_not_cached(self):
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'test'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(res.has_header('ETag'))
+
+
+@patch('paragraph.api_client.get_word_definition', side_effect=lambda word: [{"word": word}])
+class ConditionalDictionaryTests(TestCase):
+    """Test dictionary responses are revalidated against the corpus generation."""
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.definitions.clear()
+        Paragraph.objects.create(text="This is a test paragraph")
+
+    def test_not_modified(self, mock_definition):
+        res = self.client.get(DICTIONARY_FETCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        mock_definition.reset_mock()
+
+        res = self.client.get(DICTIONARY_FETCH_URL, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        mock_definition.assert_not_called()
+
+    def test_partial_failures_are_not_cached(self, mock_definition):
+        mock_definition.side_effect = lambda word: [{"word": word}] if word != 'test' else 1 / 0
+
+        res = self.client.get(DICTIONARY_FETCH_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIsNone(res.data['test'])
+        self.assertFalse(res.has_header('ETag'))
+        self.assertIn('no-cache', res['Cache-Control'])
@@ -1,24 +1,39 @@
 """
 Tests for the paragraphs API.
 """
+import json
+
 import mock.mock
+from django.conf import settings
+from django.db import connection
 from django.urls import reverse
-from django.test import TestCase
+from django.test import (
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
 
 from rest_framework import status
 from rest_framework.test import APIClient
 from unittest.mock import patch
 
 from core.models import (
+    CommonWord,
+    IngestJob,
     Paragraph,
+    WordFrequency,
 )
 
+from paragraph import cache
 from paragraph.serializers import ParagraphSerializer
 from paragraph.views import DictionaryRetrieveView
 
 PARAGRAPHS_LIST_URL = reverse('paragraph:paragraph-list')
 PARAGRAPHS_POST_URL = reverse('paragraph:create')
 DICTIONARY_FETCH_URL = reverse('paragraph:dict')
+BATCH_SEARCH_URL = reverse('paragraph:search-batch')
+
+DUPLICATE_TEXT = "The quick brown fox jumps over the lazy dog and runs straight into the dark forest before nightfall"
 
 MOCK_RESPONSE = {
     "this": "The definition for word \'this\'",
@@ -52,12 +67,102 @@ class ParagraphCreateApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
         self.assertEqual(res.json(), {'error': 'error'})
 
+    @mock.mock.patch('paragraph.api_client.get_paragraph', side_effect=["one text", Exception("error"), "two text"])
+    def test_create_paragraphs_bulk(self, mock_response):
+        res = self.client.get(PARAGRAPHS_POST_URL, {'count': 3})
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json(), {'created': 2, 'failed': 1, 'duplicates': 0})
+        self.assertEqual(sorted(Paragraph.objects.values_list('text', flat=True)), ["one text", "two text"])
+
+        # Derived search and word count data is kept consistent with the bulk insert.
+        self.assertEqual(WordFrequency.objects.get(word='text').count, 2)
+        self.assertEqual(Paragraph.objects.filter(search_vector='two').count(), 1)
+
+    @mock.mock.patch('paragraph.api_client.get_paragraph', return_value="text")
+    def test_create_paragraphs_bulk_count_capped(self, mock_response):
+        for count in (0, 101, 'many'):
+            res = self.client.get(PARAGRAPHS_POST_URL, {'count': count})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Paragraph.objects.exists())
+
+    @mock.mock.patch('paragraph.api_client.get_paragraph', side_effect=Exception("error"))
+    def test_create_paragraphs_bulk_failure(self, mock_response):
+        res = self.client.get(PARAGRAPHS_POST_URL, {'count': 2})
+        self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(res.json(), {'error': 'error'})
+
+    @mock.mock.patch('paragraph.api_client.get_paragraph', return_value=DUPLICATE_TEXT + "!")
+    def test_create_paragraph_duplicate(self, mock_response):
+        """Test near-duplicates of stored paragraphs are rejected."""
+        paragraph = create_paragraph(DUPLICATE_TEXT)
+
+        res = self.client.get(PARAGRAPHS_POST_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.json()['duplicate_of'], paragraph)
+        self.assertEqual(Paragraph.objects.count(), 1)
+
+        with override_settings(PARAGRAPH_SIMILARITY={**settings.PARAGRAPH_SIMILARITY, 'REJECT_DUPLICATES': False}):
+            res = self.client.get(PARAGRAPHS_POST_URL)
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    @mock.mock.patch(
+        'paragraph.api_client.get_paragraph',
+        side_effect=[DUPLICATE_TEXT, "A different paragraph", DUPLICATE_TEXT.upper(), "one more text"],
+    )
+    def test_create_paragraphs_bulk_duplicates(self, mock_response):
+        """Test near-duplicates of stored paragraphs and of each other are skipped by bulk ingestion."""
+        create_paragraph("one more text")
+
+        res = self.client.get(PARAGRAPHS_POST_URL, {'count': 4})
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(res.json(), {'created': 2, 'failed': 0, 'duplicates': 2})
+        self.assertEqual(Paragraph.objects.count(), 3)
+
+    @mock.mock.patch('paragraph.api_client.get_paragraph', return_value="text")
+    def test_create_paragraphs_async(self, mock_response):
+        """Test async ingestion queues a job without fetching anything and returns its status."""
+        res = self.client.get(PARAGRAPHS_POST_URL, {'count': 3, 'async': 'true'})
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        job = IngestJob.objects.get()
+        self.assertEqual(res['Location'], reverse('paragraph:job', args=[job.id]))
+        self.assertEqual((res.json()['id'], res.json()['status'], res.json()['requested']), (job.id, 'pending', 3))
+        mock_response.assert_not_called()
+        self.assertFalse(Paragraph.objects.exists())
+
+        res = self.client.get(res['Location'])
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['stored'], 0)
+
+    @mock.mock.patch('paragraph.api_client.get_paragraph', return_value="text")
+    def test_create_paragraph_async_by_default(self, mock_response):
+        """Test every ingestion is queued when async mode is the default, unless the client opts out."""
+        with override_settings(PARAGRAPH_INGEST={**settings.PARAGRAPH_INGEST, 'ASYNC': True}):
+            res = self.client.get(PARAGRAPHS_POST_URL)
+            self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+            self.assertEqual(res.json()['requested'], 1)
+
+            res = self.client.get(PARAGRAPHS_POST_URL, {'async': 'false'})
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+
+    def test_create_paragraphs_async_count_capped(self):
+        res = self.client.get(PARAGRAPHS_POST_URL, {'count': 101, 'async': 'true'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(IngestJob.objects.exists())
+
+    def test_ingest_job_not_found(self):
+        res = self.client.get(reverse('paragraph:job', args=[1]))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
 
 class DictionaryApiTest(TestCase):
     """Test the dictionary get API."""
 
     def setUp(self):
         self.client = APIClient()
+        cache.definitions.clear()
 
     @patch("paragraph.api_client.get_word_definition")
     def test_retrieve_dictionary_success(self, mock_response):
@@ -84,13 +189,45 @@ class DictionaryApiTest(TestCase):
         self.assertEqual(res.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
         self.assertEqual(res.json(), {'error': 'error'})
 
+    @patch("paragraph.api_client.get_word_definition")
+    def test_retrieve_dictionary_partial_failure(self, mock_response):
+        def side_effect(word):
+            if word == "test":
+                raise Exception("error")
+            return f"The definition for word \'{word}\'"
+
+        mock_response.side_effect = side_effect
+
+        create_paragraph("this this test paragraph")
+        res = self.client.get(DICTIONARY_FETCH_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {**MOCK_RESPONSE, "test": None})
+
     def test_retrieve_dictionary_common_words(self):
         create_paragraph("this this test paragraph")
         create_paragraph("this test paragraph")
         words = DictionaryRetrieveView._get_common_words(10)
         self.assertEqual(words[0], ('this', 3))
-        self.assertEqual(words[1], ('test', 2))
-        self.assertEqual(words[2], ('paragraph', 2))
+        self.assertEqual(words[1], ('paragraph', 2))
+        self.assertEqual(words[2], ('test', 2))
+
+    @override_settings(COMMON_WORDS={**settings.COMMON_WORDS, 'SOURCE': 'sketch', 'MAX_LAG': 0})
+    def test_retrieve_dictionary_estimated_common_words(self):
+        create_paragraph("this this test paragraph")
+        create_paragraph("this test paragraph")
+
+        # The exact counts are served until the estimates are stored, which requests never do.
+        with self.assertNumQueries(2):
+            words = DictionaryRetrieveView._get_common_words(10)
+        self.assertEqual(words[:3], [('this', 3), ('paragraph', 2), ('test', 2)])
+        self.assertFalse(CommonWord.objects.exists())
+
+        CommonWord.objects.recompute(processes=1)
+        self.assertEqual(DictionaryRetrieveView._get_common_words(1), [('this', 3)])
+        self.assertTrue(CommonWord.objects.filter(word='this', error=0, guaranteed=True).exists())
+        # Estimates lagging too far behind the corpus give way to the exact counts.
+        create_paragraph("that that that that")
+        self.assertEqual(DictionaryRetrieveView._get_common_words(1), [('that', 4)])
 
 
 class ParagraphSearchApiTests(TestCase):
@@ -98,6 +235,7 @@ class ParagraphSearchApiTests(TestCase):
 
     def setUp(self):
         self.client = APIClient()
+        cache.search_results.clear()
 
     def test_retrieve_all_paragraphs(self):
         create_paragraph("This is a test paragraph")
@@ -108,7 +246,7 @@ class ParagraphSearchApiTests(TestCase):
         paragraphs = Paragraph.objects.all()
         serializer = ParagraphSerializer(paragraphs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrieve_paragraphs_bad_request_incomplete_query(self):
         create_paragraph("This is a test paragraph")
@@ -126,6 +264,14 @@ class ParagraphSearchApiTests(TestCase):
         res = self.client.get(PARAGRAPHS_LIST_URL, params)
         self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
 
+    def test_retrieve_paragraphs_bad_request_invalid_words(self):
+        create_paragraph("This is a test paragraph")
+
+        for words in ['dog cat', 'test,', 'test&paragraph', "test'"]:
+            with self.subTest(words=words):
+                res = self.client.get(PARAGRAPHS_LIST_URL, {'words': words, 'operator': 'or'})
+                self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
     def test_retrieve_paragraphs_or_operator(self):
         create_paragraph("This is a test paragraph")
         create_paragraph("This is another sample paragraph")
@@ -136,7 +282,7 @@ class ParagraphSearchApiTests(TestCase):
         paragraphs = Paragraph.objects.all()
         serializer = ParagraphSerializer(paragraphs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrieve_paragraphs_and_operator(self):
         """Test retrieving a list of paragraphs."""
@@ -149,7 +295,7 @@ class ParagraphSearchApiTests(TestCase):
         paragraphs = Paragraph.objects.filter(id=p1_id)
         serializer = ParagraphSerializer(paragraphs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_retrieve_paragraphs_single_word(self):
         """Test retrieving a list of paragraphs."""
@@ -162,7 +308,7 @@ class ParagraphSearchApiTests(TestCase):
         paragraphs = Paragraph.objects.filter(id=p1_id)
         serializer = ParagraphSerializer(paragraphs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
         params = {'words': f'{"sample"}', 'operator': f'{"or"}'}
         res = self.client.get(PARAGRAPHS_LIST_URL, params)
@@ -170,4 +316,292 @@ class ParagraphSearchApiTests(TestCase):
         paragraphs = Paragraph.objects.filter(id=p2_id)
         serializer = ParagraphSerializer(paragraphs, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+    def test_retrieve_paragraphs_paginated(self):
+        """Test following the cursor links through every page of results."""
+        ids = [create_paragraph(f"This is test paragraph {i}") for i in range(5)]
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'test', 'operator': 'and', 'limit': 2})
+        pages = [res.data]
+        while pages[-1]['next']:
+            pages.append(self.client.get(pages[-1]['next']).data)
+
+        self.assertEqual([[p['id'] for p in page['results']] for page in pages], [ids[0:2], ids[2:4], ids[4:5]])
+        self.assertNotIn('count', pages[0])
+        previous = self.client.get(pages[-1]['previous']).data
+        self.assertEqual([p['id'] for p in previous['results']], ids[2:4])
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'PAGE_SIZE': 2, 'MAX_PAGE_SIZE': 3})
+    def test_retrieve_paragraphs_page_size_capped(self):
+        for i in range(5):
+            create_paragraph(f"This is test paragraph {i}")
+
+        self.assertEqual(len(self.client.get(PARAGRAPHS_LIST_URL).data['results']), 2)
+        self.assertEqual(len(self.client.get(PARAGRAPHS_LIST_URL, {'limit': 50}).data['results']), 3)
+        for limit in (0, 'all'):
+            res = self.client.get(PARAGRAPHS_LIST_URL, {'limit': limit})
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_paragraphs_count_modes(self):
+        create_paragraph("This is a test paragraph")
+        create_paragraph("This is another sample paragraph")
+        params = {'words': 'test', 'operator': 'or', 'limit': 1}
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {**params, 'count': 'exact'})
+        self.assertEqual(res.data['count'], 1)
+        res = self.client.get(PARAGRAPHS_LIST_URL, {**params, 'count': 'estimate'})
+        self.assertIsInstance(res.data['count'], int)
+        res = self.client.get(PARAGRAPHS_LIST_URL, {**params, 'count': 'none'})
+        self.assertNotIn('count', res.data)
+        res = self.client.get(PARAGRAPHS_LIST_URL, {**params, 'count': 'maybe'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'PAGE_SIZE': 1, 'STREAM_CHUNK_SIZE': 2})
+    def test_stream_paragraphs(self):
+        """Test streaming every matching paragraph as newline delimited JSON."""
+        for i in range(5):
+            create_paragraph(f"This is test paragraph {i}")
+        create_paragraph("This is another sample paragraph")
+        paragraphs = Paragraph.objects.filter(search_vector='test').order_by('id')
+        expected = ParagraphSerializer(paragraphs, many=True).data
+
+        requests = [
+            {'data': {'words': 'test', 'operator': 'and', 'stream': 1}},
+            {'data': {'words': 'test', 'operator': 'and'}, 'HTTP_ACCEPT': 'application/x-ndjson'},
+        ]
+        for request in requests:
+            res = self.client.get(PARAGRAPHS_LIST_URL, **request)
+
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertTrue(res.streaming)
+            self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(res.streaming_content).decode().splitlines()
+            self.assertEqual([json.loads(line) for line in lines], expected)
+
+    def test_stream_paragraphs_bad_request(self):
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'test', 'stream': 1})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_paragraphs_prefix_match(self):
+        """Test words match the lexemes they are a prefix of with `match=prefix`."""
+        assumed = create_paragraph("The results were assumed to be correct")
+        assumption = create_paragraph("An assumption about the sample")
+        create_paragraph("This is another paragraph")
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'assu', 'operator': 'or', 'match': 'prefix'})
+        self.assertEqual([result['id'] for result in res.data['results']], [assumed, assumption])
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'assu,samp', 'operator': 'and', 'match': 'prefix'})
+        self.assertEqual([result['id'] for result in res.data['results']], [assumption])
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'assu', 'operator': 'or'})
+        self.assertEqual(res.data['results'], [])
+
+    def test_retrieve_paragraphs_fuzzy_match(self):
+        """Test misspelled words match the closest words of the corpus with `match=fuzzy`."""
+        paragraph = create_paragraph("A paragraph about elephants")
+        create_paragraph("Another text about giraffes")
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'elefants', 'operator': 'or', 'match': 'fuzzy'})
+        self.assertEqual([result['id'] for result in res.data['results']], [paragraph])
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'elefants,paragraf', 'operator': 'and', 'match': 'fuzzy'})
+        self.assertEqual([result['id'] for result in res.data['results']], [paragraph])
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'elefants', 'operator': 'or', 'match': 'exact'})
+        self.assertEqual(res.data['results'], [])
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'elefants', 'operator': 'or', 'match': 'close'})
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_paragraphs_bad_request_invalid_words_prefix_and_fuzzy_match(self):
+        create_paragraph("A paragraph about elephants")
+
+        for match in ['prefix', 'fuzzy']:
+            for words in ['ele phant', 'ele:*', 'elefants,']:
+                with self.subTest(match=match, words=words):
+                    res = self.client.get(PARAGRAPHS_LIST_URL, {'words': words, 'operator': 'or', 'match': match})
+                    self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ranked_search(self):
+        """Test a ranked search returns the k best matches, best first, with the limit applied in SQL."""
+        weak = create_paragraph("A sample of text mentioning the test only once among many other words")
+        strong = create_paragraph("Test after test after test")
+        medium = create_paragraph("This test is a sample test")
+        create_paragraph("This is another paragraph")
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'test', 'operator': 'or', 'rank': 1, 'k': 2})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['id'] for result in res.data['results']], [strong, medium])
+        self.assertEqual(res.data['results'][0]['text'], "Test after test after test")
+        self.assertGreater(res.data['results'][0]['rank'], res.data['results'][1]['rank'])
+        self.assertIn('LIMIT 2', queries[-1]['sql'])
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'test', 'operator': 'or', 'rank': 1})
+        self.assertEqual([result['id'] for result in res.data['results']], [strong, medium, weak])
+
+    def test_ranked_search_snippets(self):
+        """Test a ranked search returns highlighted snippets instead of the text when asked to."""
+        paragraph = create_paragraph("This is a test paragraph")
+
+        res = self.client.get(
+            PARAGRAPHS_LIST_URL, {'words': 'test', 'operator': 'and', 'rank': 'true', 'snippet': 'true'}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(set(res.data['results'][0]), {'id', 'rank', 'snippet'})
+        self.assertEqual(res.data['results'][0]['id'], paragraph)
+        self.assertEqual(res.data['results'][0]['snippet'], 'This is a <b>test</b> paragraph')
+
+    def test_ranked_search_bad_request(self):
+        requests = [
+            {'rank': 1},
+            {'words': 'test', 'operator': 'or', 'rank': 1, 'k': 0},
+            {'words': 'test', 'operator': 'or', 'rank': 1, 'k': 'many'},
+            {'words': 'test', 'operator': 'xor', 'rank': 1},
+        ]
+        for request in requests:
+            res = self.client.get(PARAGRAPHS_LIST_URL, request)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_retrieve_paragraphs_word_facets(self):
+        """Test the most frequent words among the matches are returned as facets."""
+        create_paragraph("This test paragraph is a test")
+        create_paragraph("This is another sample test")
+        create_paragraph("A sample paragraph without the word")
+
+        res = self.client.get(
+            PARAGRAPHS_LIST_URL, {'words': 'test', 'operator': 'or', 'facets': 'words', 'facet_limit': 3}
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(res.data['facets'], {
+            'words': [
+                {'word': 'test', 'count': 3},
+                {'word': 'anoth', 'count': 1},
+                {'word': 'paragraph', 'count': 1},
+            ],
+            'sampled': False,
+            'timed_out': False,
+        })
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'FACET_SAMPLE_SIZE': 1})
+    def test_retrieve_paragraphs_word_facets_sampled(self):
+        create_paragraph("This test paragraph")
+        create_paragraph("This test sample")
+
+        res = self.client.get(PARAGRAPHS_LIST_URL, {'words': 'test', 'operator': 'or', 'facets': 'words'})
+
+        self.assertTrue(res.data['facets']['sampled'])
+        words = [facet['word'] for facet in res.data['facets']['words']]
+        self.assertIn(words, (['paragraph', 'test'], ['sampl', 'test']))
+
+    def test_retrieve_paragraphs_word_facets_bad_request(self):
+        requests = [
+            {'facets': 'text'},
+            {'facets': 'words', 'facet_limit': 0},
+            {'words': 'test', 'operator': 'or', 'facets': 'words', 'rank': 1},
+            {'facets': 'words', 'stream': 1},
+        ]
+        for params in requests:
+            res = self.client.get(PARAGRAPHS_LIST_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ParagraphBatchSearchApiTests(TestCase):
+    """Test the paragraph batch search API."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.first = create_paragraph("This is a test paragraph")
+        self.second = create_paragraph("This is another sample paragraph")
+        self.third = create_paragraph("One more test")
+
+    def test_batch_search(self):
+        """Test every query of a batch is answered in a single statement, keyed by query index."""
+        queries = [
+            {'words': ['test'], 'operator': 'or'},
+            {'words': ['test', 'sample'], 'operator': 'and'},
+            {'words': ['sample', 'test'], 'operator': 'or', 'limit': 2},
+            {'words': ['TEST', 'sample', 'test'], 'operator': 'or'},
+            {'words': ['missing'], 'operator': 'or'},
+        ]
+
+        with self.assertNumQueries(1):
+            res = self.client.post(BATCH_SEARCH_URL, {'queries': queries}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.json()['results'], {
+            '0': [self.first, self.third],
+            '1': [],
+            '2': [self.first, self.second],
+            '3': [self.first, self.second, self.third],
+            '4': [],
+        })
+
+    def test_batch_search_paragraphs(self):
+        res = self.client.post(
+            BATCH_SEARCH_URL,
+            {'queries': [{'words': ['sample'], 'operator': 'and'}], 'paragraphs': True},
+            format='json',
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        expected = [{'id': self.second, 'text': "This is another sample paragraph"}]
+        self.assertEqual(res.json()['results'], {'0': expected})
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'BATCH_MAX_QUERIES': 1})
+    def test_batch_search_bad_request(self):
+        requests = [
+            {},
+            {'queries': []},
+            {'queries': [{'words': ['test'], 'operator': 'xor'}]},
+            {'queries': [{'words': [], 'operator': 'or'}]},
+            {'queries': [{'words': ['a&'], 'operator': 'or'}]},
+            {'queries': [{'words': ['foo bar'], 'operator': 'or'}]},
+            {'queries': [{'words': ['!'], 'operator': 'or'}]},
+            {'queries': [{'words': ['test'], 'operator': 'or', 'limit': 0}]},
+            {'queries': [{'words': ['test'], 'operator': 'or'}] * 2},
+        ]
+        for request in requests:
+            res = self.client.post(BATCH_SEARCH_URL, request, format='json')
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ParagraphSimilarApiTests(TestCase):
+    """Test the similar paragraphs API."""
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def test_similar_paragraphs(self):
+        paragraph = create_paragraph(DUPLICATE_TEXT)
+        near = create_paragraph(DUPLICATE_TEXT.replace('nightfall', 'sunset'))
+        create_paragraph("Something completely different is written in this other paragraph")
+
+        res = self.client.get(reverse('paragraph:similar', args=[paragraph]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([result['id'] for result in res.data['results']], [near])
+        self.assertGreater(res.data['results'][0]['similarity'], 0.7)
+        self.assertEqual(res.data['results'][0]['text'], DUPLICATE_TEXT.replace('nightfall', 'sunset'))
+
+        res = self.client.get(reverse('paragraph:similar', args=[paragraph]), {'min_similarity': 1})
+        self.assertEqual(res.data['results'], [])
+
+    def test_similar_paragraphs_not_found(self):
+        self.assertEqual(self.client.get(reverse('paragraph:similar', args=[1])).status_code, 404)
+        paragraph = create_paragraph("!!")
+        res = self.client.get(reverse('paragraph:similar', args=[paragraph]))
+        self.assertEqual(res.data, {'results': []})
+
+    def test_similar_paragraphs_bad_request(self):
+        paragraph = create_paragraph(DUPLICATE_TEXT)
+        for params in ({'limit': 0}, {'min_similarity': 2}, {'min_similarity': 'high'}):
+            res = self.client.get(reverse('paragraph:similar', args=[paragraph]), params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
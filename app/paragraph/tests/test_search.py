@@ -0,0 +1,227 @@
+"""
+Tests for the search backends.
+"""
+import os
+import tempfile
+from unittest.mock import patch
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.expressions import RawSQL
+from django.test import (
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+
+from core.models import Paragraph
+from paragraph import search
+from paragraph.search import InvertedIndex
+from paragraph.tests import test_paragraph_api
+
+INDEX_BACKEND = 'paragraph.search.InvertedIndexSearchBackend'
+
+
+class InvertedIndexTests(SimpleTestCase):
+    """Test the in-memory inverted index."""
+
+    def setUp(self):
+        self.index = InvertedIndex()
+        self.index.add(3, ['test', 'paragraph'])
+        self.index.add(1, ['test', 'sampl'])
+        self.index.add(2, ['paragraph', 'sampl', 'anoth'])
+
+    def test_postings_are_sorted(self):
+        self.assertEqual(list(self.index.postings['test']), [1, 3])
+        self.assertEqual(list(self.index.postings['sampl']), [1, 2])
+        self.assertEqual(self.index.max_id, 3)
+
+    def test_search(self):
+        self.assertEqual(self.index.search([('test',), ('sampl',)], 'and'), [1])
+        self.assertEqual(self.index.search([('test',), ('sampl',)], 'or'), [1, 2, 3])
+        self.assertEqual(self.index.search([('test',), ('missing',)], 'and'), [])
+        self.assertEqual(self.index.search([('test',), ('missing',)], 'or'), [1, 3])
+        self.assertEqual(self.index.search([('paragraph', 'sampl')], 'or'), [2])
+
+    def test_remove(self):
+        self.index.remove(1, ['test', 'sampl'])
+        self.index.remove(2, ['anoth'])
+        self.assertEqual(self.index.search([('test',)], 'or'), [3])
+        self.assertNotIn('anoth', self.index.postings)
+
+    def test_size_counts_distinct_ids(self):
+        self.index.add(1, ['anoth'])
+        self.assertEqual(self.index.size, 3)
+
+        self.index.remove(2, ['paragraph', 'sampl', 'anoth'])
+        self.index.remove(4, ['test'])
+        self.assertEqual(self.index.size, 2)
+        self.assertEqual(self.index.ids_above(1), [3])
+
+    def test_snapshot_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.snapshot')
+            self.index.dump(path)
+            loaded = InvertedIndex.load(path)
+
+        self.assertEqual(loaded.postings, self.index.postings)
+        self.assertEqual(loaded.max_id, 3)
+        self.assertEqual(loaded.size, 3)
+        self.assertIsNone(InvertedIndex.load(path))
+
+    def test_ids_beyond_32_bits(self):
+        self.index.add(2 ** 40, ['test'])
+
+        self.assertEqual(self.index.search([('test',)], 'or'), [1, 3, 2 ** 40])
+        self.assertEqual(self.index.max_id, 2 ** 40)
+
+
+class InvertedIndexBackendTestMixin:
+    """Run against the inverted index backend, rebuilt from the database of each test."""
+
+    def setUp(self):
+        super().setUp()
+        self.overrider = override_settings(PARAGRAPH_SEARCH={
+            **settings.PARAGRAPH_SEARCH, 'BACKEND': INDEX_BACKEND, 'INDEX_REFRESH_INTERVAL': 0,
+        })
+        self.overrider.enable()
+        self.addCleanup(self.overrider.disable)
+        self.backend = search.get_backend()
+        self.backend.reset()
+        self.addCleanup(self.backend.reset)
+
+
+class InvertedIndexSearchApiTests(InvertedIndexBackendTestMixin, test_paragraph_api.ParagraphSearchApiTests):
+    """Test the paragraph search API answers like Postgres when served from the inverted index."""
+
+
+class InvertedIndexBackendTests(InvertedIndexBackendTestMixin, TestCase):
+    """Test the inverted index backend."""
+
+    def search(self, words, operator):
+        paragraphs = self.backend.filter(Paragraph.objects.all(), words, operator)
+        return list(paragraphs.order_by('id').values_list('id', flat=True))
+
+    def test_matches_postgres(self):
+        texts = [
+            "The paragraphs were assumed to be tests",
+            "An assumption is a test of another sample",
+            "Samples of paragraphs, tested and assumed!",
+            "the of and",
+        ]
+        for text in texts:
+            Paragraph.objects.create(text=text)
+        queries = [
+            (['paragraph'], 'and'), (['assumed', 'tests'], 'and'), (['samples', 'assumption'], 'or'),
+            (['the', 'test'], 'and'), (['the'], 'or'), (['missing', 'sample'], 'or'), (['TESTED'], 'and'),
+        ]
+
+        for words, operator in queries:
+            with self.subTest(words=words, operator=operator):
+                expected = search.PostgresSearchBackend().filter(Paragraph.objects.all(), words, operator)
+                expected_ids = list(expected.order_by('id').values_list('id', flat=True))
+                self.assertEqual(self.search(words, operator), expected_ids)
+
+    def test_follows_paragraph_writes(self):
+        first = Paragraph.objects.create(text="a test paragraph")
+        self.assertEqual(self.search(['test'], 'and'), [first.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second, third = Paragraph.objects.bulk_create([Paragraph(text="test"), Paragraph(text="sample")])
+        with self.captureOnCommitCallbacks(execute=True):
+            first.text = "a sample"
+            first.save()
+        self.assertEqual(self.search(['test'], 'and'), [second.id])
+        self.assertEqual(self.search(['sample'], 'and'), [first.id, third.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Paragraph.objects.filter(id=third.id).delete()
+        self.assertEqual(self.search(['sample'], 'and'), [first.id])
+
+    def test_picks_up_paragraphs_of_other_processes(self):
+        first = Paragraph.objects.create(text="a test paragraph")
+        self.assertEqual(self.search(['test'], 'and'), [first.id])
+
+        # On-commit callbacks do not run here, like for paragraphs written by another process.
+        second = Paragraph.objects.create(text="another test")
+        with override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'INDEX_REFRESH_INTERVAL': 60}):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.search(['test'], 'and'), [first.id])
+        self.assertEqual(self.search(['test'], 'and'), [first.id, second.id])
+        self.assertEqual(self.backend.index.size, 2)
+
+    def test_picks_up_paragraphs_committed_late(self):
+        first = Paragraph.objects.create(text="a test paragraph")
+        with self.captureOnCommitCallbacks(execute=True):
+            third = Paragraph.objects.create(id=first.id + 10, text="a third test")
+        self.assertEqual(self.search(['test'], 'and'), [first.id, third.id])
+
+        # A lower id committed by another process after a higher one was indexed.
+        second = Paragraph.objects.create(id=first.id + 5, text="another test")
+        self.assertEqual(self.search(['test'], 'and'), [first.id, second.id, third.id])
+        self.assertEqual(self.backend.index.size, 3)
+
+    def test_loads_snapshot_and_catches_up(self):
+        first = Paragraph.objects.create(text="a test paragraph")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'index.snapshot')
+            self.backend.build().dump(path)
+            second = Paragraph.objects.create(text="another test")
+
+            with override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'INDEX_SNAPSHOT': path}):
+                self.backend.reset()
+                self.assertEqual(self.search(['test'], 'and'), [first.id, second.id])
+
+                # A snapshot covering deleted paragraphs is discarded and the index rebuilt.
+                Paragraph.objects.filter(id=first.id).delete()
+                self.backend.reset()
+                self.assertEqual(self.search(['test'], 'and'), [second.id])
+
+
+class WordFacetsTests(TestCase):
+    """Test the word facets of a set of paragraphs."""
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'FACET_TIMEOUT': 10})
+    def test_facets_time_out(self):
+        Paragraph.objects.create(text='test paragraph')
+        slow = Paragraph.objects.filter(id__in=RawSQL('SELECT id FROM core_paragraph, pg_sleep(0.2)', []))
+
+        facets = search.word_facets(slow, 10)
+
+        self.assertEqual(facets, {'words': [], 'sampled': False, 'timed_out': True})
+        with connection.cursor() as cursor:
+            cursor.execute('SHOW statement_timeout')
+            self.assertEqual(cursor.fetchone()[0], '0')
+        self.assertEqual(search.word_facets(Paragraph.objects.all(), 10)['words'], [('paragraph', 1), ('test', 1)])
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'FACET_SAMPLE_SIZE': 2})
+    def test_sample_wraps_around(self):
+        Paragraph.objects.create(text='test first')
+        Paragraph.objects.create(text='test second')
+        last = Paragraph.objects.create(text='test third')
+
+        with patch('paragraph.search.random.randint', return_value=last.id):
+            facets = search.word_facets(Paragraph.objects.all(), 10)
+
+        self.assertTrue(facets['sampled'])
+        self.assertEqual(facets['words'], [('test', 2), ('first', 1), ('third', 1)])
+
+    def test_facets_of_no_paragraphs(self):
+        facets = search.word_facets(Paragraph.objects.none(), 10)
+        self.assertEqual(facets, {'words': [], 'sampled': False, 'timed_out': False})
+
+
+class FuzzyExpansionTests(TestCase):
+    """Test the expansion of search words to close words of the corpus."""
+
+    def setUp(self):
+        Paragraph.objects.create(text='Elephants and an elephant met the elephants keeper')
+
+    def test_expand_fuzzy(self):
+        self.assertEqual(search.expand_fuzzy(['elefant', 'zzz']), [['elefant', 'elephant'], ['zzz']])
+        # Case variants of a word are only kept once.
+        self.assertEqual(search.expand_fuzzy(['elephan']), [['elephan', 'elephant', 'Elephants']])
+
+    @override_settings(PARAGRAPH_SEARCH={**settings.PARAGRAPH_SEARCH, 'FUZZY_EXPANSIONS': 1})
+    def test_expand_fuzzy_bounded(self):
+        self.assertEqual(search.expand_fuzzy(['elephan']), [['elephan', 'elephant']])
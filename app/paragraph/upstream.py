@@ -0,0 +1,275 @@
+"""
+Pooled HTTP client for the external APIs, with timeouts, retries and a circuit breaker per host.
+"""
+import asyncio
+import math
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlsplit
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from core import metrics
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+class UpstreamUnavailable(Exception):
+    """Raised without issuing a request while the circuit breaker of an upstream host is open."""
+
+
+class CircuitBreaker:
+    """
+    Fail fast while an upstream is down.
+
+    The breaker opens after `failure_threshold` consecutive failed requests and rejects requests until
+    `reset_timeout` seconds have passed. It then lets a single trial request through per `reset_timeout`, which
+    closes the breaker again on success and keeps it open on failure.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self):
+        return self.opened_at is not None
+
+    def allow(self, reset_timeout):
+        """Return whether a request may be issued now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < reset_timeout:
+                return False
+            # Admit a trial request and keep rejecting the others until it settles or times out.
+            self.opened_at = time.monotonic()
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self, failure_threshold):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+class AsyncClientPool:
+    """
+    `httpx.AsyncClient`s sharing the requests of an event loop, used like a single client.
+
+    The connection pool of a client scans all its connections whenever a request starts or ends, which takes time
+    quadratic in its size, so hundreds of connections are spread over several small clients. Requests go to the
+    client with the fewest requests in flight.
+    """
+
+    def __init__(self, clients):
+        self.clients = clients
+        self._in_flight = [0] * len(clients)
+
+    async def get(self, url, **kwargs):
+        index = min(range(len(self.clients)), key=self._in_flight.__getitem__)
+        self._in_flight[index] += 1
+        try:
+            return await self.clients[index].get(url, **kwargs)
+        finally:
+            self._in_flight[index] -= 1
+
+    async def aclose(self):
+        for client in self.clients:
+            await client.aclose()
+
+
+class UpstreamClient:
+    """
+    Client shared by all requests to the external APIs, configured by the `UPSTREAM_HTTP` setting.
+
+    Connections are kept alive in a pool per host. Failed attempts (connection errors, timeouts and retryable
+    statuses) are retried with jittered exponential backoff as long as the retry count and the time budget of
+    the request allow it, the timeouts of every attempt being cut down to what is left of the budget.
+    """
+
+    def __init__(self):
+        self._session = None
+        self._breakers = {}
+        self._async_clients = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    @property
+    def config(self):
+        return settings.UPSTREAM_HTTP
+
+    @property
+    def session(self):
+        with self._lock:
+            if self._session is None:
+                adapter = HTTPAdapter(
+                    pool_connections=self.config['POOL_CONNECTIONS'],
+                    pool_maxsize=self.config['POOL_MAXSIZE'],
+                    max_retries=0,
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._session = session
+            return self._session
+
+    def async_client(self, max_connections=None):
+        """Return a new `httpx.AsyncClient` with the pool limits and timeouts of the synchronous session."""
+        max_connections = max_connections or self.config['POOL_MAXSIZE']
+        return httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=httpx.Timeout(self.config['READ_TIMEOUT'], connect=self.config['CONNECT_TIMEOUT']),
+        )
+
+    def shared_async_client(self):
+        """
+        Return the `AsyncClientPool` shared by the coroutines of the running event loop, created on first use.
+
+        It holds up to `ASYNC_MAX_CONNECTIONS` connections, so that many requests can wait on the external APIs at
+        once, spread over clients of at most `ASYNC_POOL_SIZE` connections.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            client = self._async_clients.get(loop)
+            if client is None:
+                pool_size = self.config['ASYNC_POOL_SIZE']
+                pools = math.ceil(self.config['ASYNC_MAX_CONNECTIONS'] / pool_size)
+                client = self._async_clients[loop] = AsyncClientPool(
+                    [self.async_client(pool_size) for _ in range(pools)],
+                )
+            return client
+
+    async def aclose(self):
+        """Close the pooled connections of the shared async client of the running event loop."""
+        with self._lock:
+            client = self._async_clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+    def breaker(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            return self._breakers.setdefault(host, CircuitBreaker())
+
+    def breakers(self):
+        """Return the circuit breakers keyed by host."""
+        with self._lock:
+            return dict(self._breakers)
+
+    def reset(self):
+        """Close the pooled connections and forget the state of the circuit breakers."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._session = None
+            self._breakers = {}
+            self._async_clients = weakref.WeakKeyDictionary()
+
+    def get(self, url):
+        """Issue a GET request to `url`, returning the last response or raising the last error."""
+        breaker = self._admit(url)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=self._timeouts(started))
+                error = None
+            except requests.RequestException as err:
+                response, error = None, err
+            self._record(url, attempt_started, response, error)
+
+            delay = self._retry_delay(attempt, started, response)
+            if delay is None:
+                return self._settle(breaker, response, error)
+            time.sleep(delay)
+            attempt += 1
+
+    async def aget(self, client, url):
+        """Issue a GET request to `url` with the `httpx.AsyncClient` `client`, retrying like `get`."""
+        breaker = self._admit(url)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt_started = time.perf_counter()
+            connect_timeout, read_timeout = self._timeouts(started)
+            try:
+                response = await client.get(url, timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+                error = None
+            except httpx.HTTPError as err:
+                response, error = None, err
+            self._record(url, attempt_started, response, error)
+
+            delay = self._retry_delay(attempt, started, response)
+            if delay is None:
+                return self._settle(breaker, response, error)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def _admit(self, url):
+        breaker = self.breaker(url)
+        if not breaker.allow(self.config['BREAKER_RESET_TIMEOUT']):
+            metrics.UPSTREAM_ERRORS.inc(host=urlsplit(url).netloc, reason='circuit_open')
+            raise UpstreamUnavailable(f"{urlsplit(url).netloc} is unavailable, not retrying until it recovers.")
+        return breaker
+
+    @staticmethod
+    def _record(url, started, response, error):
+        """Record the latency and the failure, if any, of an attempt in the upstream metrics."""
+        host = urlsplit(url).netloc
+        metrics.UPSTREAM_DURATION.observe(time.perf_counter() - started, host=host)
+        if error is not None:
+            metrics.UPSTREAM_ERRORS.inc(host=host, reason=type(error).__name__)
+        elif response.status_code >= 500 or response.status_code in RETRY_STATUSES:
+            metrics.UPSTREAM_ERRORS.inc(host=host, reason=f'status_{response.status_code}')
+
+    def _timeouts(self, started):
+        """Return the connect and read timeouts of an attempt, cut down to the rest of the budget of the request."""
+        remaining = self.config['RETRY_BUDGET'] - (time.monotonic() - started)
+        return min(self.config['CONNECT_TIMEOUT'], remaining), min(self.config['READ_TIMEOUT'], remaining)
+
+    def _retry_delay(self, attempt, started, response):
+        """Return how long to back off before the next attempt, or None if the outcome is final."""
+        if response is not None and response.status_code not in RETRY_STATUSES:
+            return None
+        if attempt >= self.config['RETRIES']:
+            return None
+
+        # Full jitter: a random delay below the exponential backoff spreads out retries of concurrent requests.
+        backoff = min(self.config['BACKOFF_MAX'], self.config['BACKOFF_BASE'] * 2 ** attempt)
+        delay = random.uniform(0, backoff)
+        # The next attempt times out with the budget, so it is only worth making with some of the budget left.
+        if time.monotonic() - started + delay >= self.config['RETRY_BUDGET']:
+            return None
+        return delay
+
+    def _settle(self, breaker, response, error):
+        if error is not None or response.status_code >= 500:
+            breaker.record_failure(self.config['BREAKER_FAILURE_THRESHOLD'])
+        else:
+            breaker.record_success()
+
+        if error is not None:
+            raise error
+        return response
+
+
+client = UpstreamClient()
+
+metrics.registry.register_callback(
+    'upstream_circuit_open',
+    'Whether the circuit breaker of an external API host is open.',
+    'gauge',
+    lambda: [({'host': host}, int(breaker.is_open)) for host, breaker in client.breakers().items()],
+)
@@ -7,7 +7,10 @@ from django.urls import (
 )
 from rest_framework.routers import DefaultRouter
 
-from paragraph import views
+from paragraph import (
+    async_views,
+    views,
+)
 
 app_name = 'paragraph'
 
@@ -15,7 +18,14 @@ router = DefaultRouter()
 router.register('search', views.ParagraphListViewSet)
 
 urlpatterns = [
+    path('search/batch', views.ParagraphBatchSearchView.as_view(), name='search-batch'),
+    path('search/stats', views.SearchCacheStatsView.as_view(), name='search-stats'),
     path('', include(router.urls)),
     path('get', views.ParagraphCreateView.as_view(), name='create'),
+    path('jobs/<int:pk>', views.IngestJobRetrieveView.as_view(), name='job'),
+    path('<int:pk>/similar', views.ParagraphSimilarView.as_view(), name='similar'),
     path('dictionary', views.DictionaryRetrieveView.as_view(), name='dict'),
+    path('async/get', async_views.create_paragraph, name='async-create'),
+    path('async/dictionary', async_views.dictionary, name='async-dict'),
+    path('dictionary/stats', views.DictionaryCacheStatsView.as_view(), name='dict-stats'),
 ]
@@ -1,8 +1,7 @@
 """
 Views for the paragraph APIs.
 """
-import re
-from collections import Counter
+import json
 
 from drf_spectacular.utils import (
     extend_schema_view,
@@ -14,22 +13,47 @@ from rest_framework import (
     viewsets,
     mixins,
 )
-from rest_framework.generics import RetrieveAPIView
+from rest_framework.generics import (
+    RetrieveAPIView,
+    get_object_or_404,
+)
+from rest_framework.views import APIView
 from rest_framework import status
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from django.contrib.postgres.search import (
-    SearchQuery,
-    SearchVector,
-)
+from rest_framework.settings import api_settings
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import add_never_cache_headers
 
+from core import (
+    metrics,
+    minhash,
+    sharding,
+)
+from core.routers import (
+    pins_to_primary,
+    reads_from_replicas,
+)
 from core.models import (
-    Paragraph
+    CommonWord,
+    IngestJob,
+    Paragraph,
+    ParagraphSignature,
+    WordFrequency,
 )
+from core.singleflight import SingleFlight
 from paragraph import (
     serializers,
-    api_client
+    api_client,
+    cache,
+    ingest,
+    search,
 )
+from paragraph.conditional import conditional_on_corpus
+from paragraph.pagination import ParagraphCursorPagination
+from paragraph.renderers import NDJSONRenderer
 
 
 class ParagraphCreateView(RetrieveAPIView):
@@ -37,53 +61,241 @@ class ParagraphCreateView(RetrieveAPIView):
     queryset = Paragraph.objects.all()
     serializer_class = serializers.ParagraphSerializer
 
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'count',
+                OpenApiTypes.INT,
+                description='Number of paragraphs to fetch and store at once.',
+            ),
+            OpenApiParameter(
+                'async',
+                OpenApiTypes.BOOL,
+                description='Queue an ingestion job and return its status right away instead of waiting for it.',
+            ),
+        ]
+    )
+    @pins_to_primary
     def get(self, request, *args, **kwargs):
-        """Fetch and create a new paragraph record."""
+        """Fetch and create a new paragraph record, or `count` of them at once."""
+        if self._is_async(request.query_params):
+            data, location = self._enqueue(request.query_params)
+            response = Response(data, status=status.HTTP_202_ACCEPTED)
+            response['Location'] = location
+            return response
+        if 'count' in request.query_params:
+            # Fetch the paragraphs concurrently, then insert them in batches within a single transaction.
+            count = self._get_count(request.query_params.get('count'))
+            return Response(*self._store_many(*api_client.get_paragraphs(count)))
+
         try:
             # Get a new paragraph from the external API.
             response_text = api_client.get_paragraph()
         except Exception as err:
             return Response(data={"error": str(err)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(*self._store(response_text))
 
-        serializer = self.get_serializer(data={"text": response_text})
+    @staticmethod
+    def _get_count(value):
+        max_count = settings.PARAGRAPH_BULK['MAX_COUNT']
+        try:
+            count = int(value)
+        except ValueError:
+            raise ValidationError(detail='Invalid paragraph count.')
+        if not 1 <= count <= max_count:
+            raise ValidationError(detail=f'Paragraph count must be between 1 and {max_count}.')
+        return count
+
+    @staticmethod
+    def _is_async(query_params):
+        value = query_params.get('async')
+        if value is None:
+            return settings.PARAGRAPH_INGEST['ASYNC']
+        return value.lower() in ('1', 'true')
+
+    @classmethod
+    def _enqueue(cls, query_params):
+        """
+        Queue the ingestion for the `process_ingest_jobs` worker.
+
+        Returns the data of the job and the URL to poll for its outcome.
+        """
+        count = cls._get_count(query_params['count']) if 'count' in query_params else 1
+        job = ingest.enqueue(count)
+        return serializers.IngestJobSerializer(job).data, reverse('paragraph:job', args=[job.id])
+
+    @staticmethod
+    def _store(text):
+        """Store a fetched paragraph unless it is a near-duplicate, returning the response data and status."""
+        duplicate_of = ingest.find_duplicate(minhash.signature(text))
+        if duplicate_of is not None:
+            return (
+                {"error": f"Near-duplicate of paragraph {duplicate_of}.", "duplicate_of": duplicate_of},
+                status.HTTP_409_CONFLICT,
+            )
+
+        serializer = serializers.ParagraphSerializer(data={"text": text})
         serializer.is_valid(raise_exception=True)
         serializer.save()
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return serializer.data, status.HTTP_201_CREATED
+
+    @staticmethod
+    def _store_many(texts, errors):
+        """Store the paragraphs fetched at once, returning the response data and status."""
+        if not texts:
+            return {"error": errors[0]}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+        paragraphs, duplicates = ingest.store(texts)
+        return {"created": len(paragraphs), "failed": len(errors), "duplicates": duplicates}, status.HTTP_201_CREATED
+
+
+class IngestJobRetrieveView(RetrieveAPIView):
+    """View for retrieving the progress of a queued paragraph ingestion."""
+    queryset = IngestJob.objects.all()
+    serializer_class = serializers.IngestJobSerializer
+
+
+class ParagraphSimilarView(APIView):
+    """View for retrieving the paragraphs most similar to a stored paragraph."""
+
+    @extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description='Maximum number of similar paragraphs to return.',
+            ),
+            OpenApiParameter(
+                'min_similarity',
+                OpenApiTypes.FLOAT,
+                description='Minimum estimated Jaccard similarity of the word shingles, between 0 and 1.',
+            ),
+        ],
+        responses=OpenApiTypes.OBJECT,
+    )
+    def get(self, request, pk, *args, **kwargs):
+        """Return the paragraphs similar to paragraph `pk`, most similar first."""
+        config = settings.PARAGRAPH_SIMILARITY
+        try:
+            limit = int(request.query_params.get('limit', config['SIMILAR_LIMIT']))
+            min_similarity = float(request.query_params.get('min_similarity', config['SIMILAR_THRESHOLD']))
+        except ValueError:
+            raise ValidationError(detail='Invalid similarity query parameters.')
+        if limit < 1 or not 0 <= min_similarity <= 1:
+            raise ValidationError(detail='Invalid similarity query parameters.')
+
+        shard = sharding.shard_for(pk) if sharding.is_sharded() else None
+        signature = ParagraphSignature.objects.db_manager(shard).filter(paragraph_id=pk) \
+            .values_list('signature', flat=True).first()
+        if signature is None:
+            # Paragraphs without any word have no signature and are similar to none.
+            get_object_or_404(Paragraph.objects.db_manager(shard).all(), pk=pk)
+            return Response({"results": []}, status=status.HTTP_200_OK)
+
+        matches = ParagraphSignature.objects.similar(
+            minhash.from_bytes(signature),
+            min_similarity,
+            limit=min(limit, settings.PARAGRAPH_SEARCH['MAX_PAGE_SIZE']),
+            exclude_id=pk,
+        )
+        ids = [paragraph_id for paragraph_id, similarity in matches]
+        if sharding.is_sharded():
+            texts = {}
+            for alias, shard_ids in sharding.group_by_shard(ids).items():
+                texts.update(Paragraph.objects.using(alias).in_bulk(shard_ids))
+        else:
+            texts = Paragraph.objects.in_bulk(ids)
+        results = [
+            {"id": paragraph_id, "similarity": similarity, "text": texts[paragraph_id].text}
+            for paragraph_id, similarity in matches if paragraph_id in texts
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
 
 
 class DictionaryRetrieveView(RetrieveAPIView):
     """View for retrieving definition of the most common words present in the database."""
     queryset = Paragraph.objects.all()
     serializer_class = serializers.ParagraphSerializer
+    # Concurrent requests share one build of the response.
+    flight = SingleFlight('dictionary')
 
     @staticmethod
     def _get_common_words(max_count):
-        counter = Counter()
-
-        for paragraph_text in Paragraph.objects.all():
-            # Remove leading and trailing special characters from each word in the paragraph like , ! & $ etc.
-            words = re.findall(r'\w+', paragraph_text.text)
-            counter += Counter(dict(Counter(words).most_common(max_count)))
-
-        return counter.most_common(10)
+        if settings.COMMON_WORDS['SOURCE'] == 'sketch':
+            # Estimated in bounded memory by the recompute_common_words command, see `core.topk`.
+            return CommonWord.objects.most_common(max_count)
+        # Served by the index on (count DESC, word), which is maintained on every paragraph write.
+        return WordFrequency.objects.most_common(max_count)
 
     @staticmethod
     def _populate_response(common_words):
-        response = {}
-        for word, count in common_words:
-            response[word] = api_client.get_word_definition(word)
-        return response
+        # Definitions are served from the cache, only missing or expired ones reach the external API.
+        definitions, errors = cache.definitions.get_many([word for word, count in common_words])
+        if errors and not definitions:
+            raise Exception(next(iter(errors.values())))
 
-    def get(self, request, *args, **kwargs):
+        # Words whose lookup failed are kept in the response without a definition.
+        return {word: definitions.get(word) for word, count in common_words}
+
+    @classmethod
+    def _build(cls):
         # Get the 10 most common words in all paragraphs.
-        common_words = self._get_common_words(max_count=10)
+        with metrics.timer('common_words'):
+            common_words = cls._get_common_words(max_count=10)
+        # Get the word definition from external API for each common word and populate the response object.
+        with metrics.timer('definitions'):
+            return cls._populate_response(common_words)
+
+    @reads_from_replicas
+    @conditional_on_corpus
+    def get(self, request, *args, **kwargs):
         try:
-            # Get the word definition from external API for each common word and populate the response object.
-            response = self._populate_response(common_words)
+            response = self.flight.do('dictionary', self._build)
         except Exception as err:
             return Response(data={"error": str(err)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-        return Response(response, status=status.HTTP_200_OK)
+        response = Response(response, status=status.HTTP_200_OK)
+        if None in response.data.values():
+            # Failed lookups may succeed on the next request, do not let clients hold on to the response.
+            add_never_cache_headers(response)
+        return response
+
+
+class DictionaryCacheStatsView(APIView):
+    """View for retrieving the hit and miss counts of the word definitions cache."""
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request, *args, **kwargs):
+        return Response(cache.definitions.stats(), status=status.HTTP_200_OK)
+
+
+class ParagraphBatchSearchView(APIView):
+    """View for running several paragraph searches in a single database round trip."""
+
+    @extend_schema(request=serializers.SearchBatchSerializer, responses=OpenApiTypes.OBJECT)
+    @reads_from_replicas
+    def post(self, request, *args, **kwargs):
+        """Return the matches of each query, keyed by the index of the query in the batch."""
+        serializer = serializers.SearchBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        queries = serializer.validated_data['queries']
+        with_text = serializer.validated_data['paragraphs']
+
+        matches = search.batch_search(
+            [(query['words'], query['operator'], query['limit']) for query in queries],
+            with_text=with_text,
+        )
+        if with_text:
+            matches = [[{'id': paragraph_id, 'text': text} for paragraph_id, text in rows] for rows in matches]
+        return Response({'results': dict(enumerate(matches))}, status=status.HTTP_200_OK)
+
+
+class SearchCacheStatsView(APIView):
+    """View for retrieving the hit and miss counts of the search result cache."""
+
+    @extend_schema(responses=OpenApiTypes.OBJECT)
+    def get(self, request, *args, **kwargs):
+        return Response(cache.search_results.stats(), status=status.HTTP_200_OK)
 
 
 @extend_schema_view(
@@ -99,51 +311,194 @@ class DictionaryRetrieveView(RetrieveAPIView):
                 OpenApiTypes.STR,
                 description='Operator to use for filtering.',
             ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=list(search.MATCHES),
+                description='Match the words exactly (default), as prefixes or fuzzily.',
+            ),
+            OpenApiParameter(
+                'stream',
+                OpenApiTypes.BOOL,
+                description='Stream every result as newline delimited JSON instead of returning a page.',
+            ),
+            OpenApiParameter(
+                'rank',
+                OpenApiTypes.BOOL,
+                description='Return the best `k` matches by relevance instead of a page in id order.',
+            ),
+            OpenApiParameter(
+                'k',
+                OpenApiTypes.INT,
+                description='Number of matches returned by a ranked search.',
+            ),
+            OpenApiParameter(
+                'snippet',
+                OpenApiTypes.BOOL,
+                description='Return a highlighted snippet instead of the text of ranked matches.',
+            ),
+            OpenApiParameter(
+                'facets',
+                OpenApiTypes.STR,
+                enum=['words'],
+                description='Also return the most frequent words among the matches, with pages of results only.',
+            ),
+            OpenApiParameter(
+                'facet_limit',
+                OpenApiTypes.INT,
+                description='Number of most frequent words returned as facets.',
+            ),
         ]
     )
 )
 class ParagraphListViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
     """Retrieve paragraphs from the database based on the search query."""
     serializer_class = serializers.ParagraphSerializer
-    queryset = Paragraph.objects.all()
-
-    @staticmethod
-    def _populate_search_query(words, operator):
-        query = ""
-
-        if operator == "or":
-            for word in words:
-                query += word + " | "
-            query = query.removesuffix(" | ")
-        elif operator == "and":
-            for word in words:
-                query += word + " & "
-            query = query.removesuffix(" & ")
-        else:
-            raise ValidationError(detail='Invalid operator used for filtering.')
-
-        return SearchQuery(query, search_type="raw")
+    queryset = Paragraph.objects.defer('search_vector')
+    pagination_class = ParagraphCursorPagination
+    renderer_classes = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
 
     def get_queryset(self):
         """Filter queryset."""
+        search_params = self._get_search_params()
+
+        # Filter paragraphs with the configured search backend, through the search result cache.
+        if search_params is not None:
+            return cache.search_results.filter(self.queryset, *search_params, match=self._get_match())
+
+        # Return all paragraphs
+        return self.queryset.all()
+
+    def _get_match(self):
+        """Return how the search words are matched against the paragraphs."""
+        match = self.request.query_params.get('match', 'exact')
+        if match not in search.MATCHES:
+            raise ValidationError(detail='Invalid match used for filtering.')
+        return match
+
+    def _get_search_params(self):
+        """Return the `(words, operator)` pair of the search query, or None if all paragraphs are requested."""
         word_filter_present = False
         operator_filter_present = False
 
         if 'words' in self.request.query_params:
             word_filter_present = True
-            words = self.request.query_params.get('words').split(',')
+            word_field = serializers.SearchWordField()
+            words = [word_field.run_validation(word) for word in self.request.query_params.get('words').split(',')]
 
         if 'operator' in self.request.query_params:
             operator_filter_present = True
             operator = self.request.query_params.get('operator')
 
-        # Filter paragraphs
         if word_filter_present and operator_filter_present:
-            search_query = self._populate_search_query(words, operator)
-            return Paragraph.objects.annotate(search=SearchVector('text')).filter(search=search_query)
+            return words, operator
 
-        # Return all paragraphs
         if not word_filter_present and not operator_filter_present:
-            return Paragraph.objects.all()
+            return None
 
         raise ValidationError(detail='Invalid search query parameters.')
+
+    @reads_from_replicas
+    @conditional_on_corpus
+    def list(self, request, *args, **kwargs):
+        """List a page of results, the best ranked ones, or stream all of them as newline delimited JSON."""
+        rank_requested = request.query_params.get('rank', '').lower() in ('1', 'true')
+        stream_requested = request.query_params.get('stream', '').lower() in ('1', 'true')
+        stream_requested = stream_requested or isinstance(request.accepted_renderer, NDJSONRenderer)
+        facet_limit = self._get_facet_limit(request)
+        if facet_limit is not None and (rank_requested or stream_requested):
+            raise ValidationError(detail='Facets are only returned with pages of results.')
+
+        if rank_requested:
+            return self._rank(request)
+        if stream_requested:
+            return self._stream(self.get_queryset())
+
+        queryset = self.filter_queryset(self.get_queryset())
+        with metrics.timer('query'):
+            page = self.paginate_queryset(sharding.ShardedQuerySet(queryset) if sharding.is_sharded() else queryset)
+        with metrics.timer('serialize'):
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        if facet_limit is not None:
+            with metrics.timer('facets'):
+                facets = search.word_facets(queryset, facet_limit)
+            facets['words'] = [{'word': word, 'count': count} for word, count in facets['words']]
+            response.data['facets'] = facets
+        return response
+
+    @staticmethod
+    def _get_facet_limit(request):
+        """Return the number of word facets requested, or None if no facets are requested."""
+        facets = request.query_params.get('facets')
+        if facets is None:
+            return None
+        if facets != 'words':
+            raise ValidationError(detail='Invalid facets.')
+
+        config = settings.PARAGRAPH_SEARCH
+        try:
+            facet_limit = int(request.query_params.get('facet_limit', config['FACET_LIMIT']))
+        except ValueError:
+            raise ValidationError(detail='Invalid facet limit.')
+        if facet_limit < 1:
+            raise ValidationError(detail='Invalid facet limit.')
+        return min(facet_limit, config['MAX_PAGE_SIZE'])
+
+    def _rank(self, request):
+        """Return the `k` paragraphs best matching the search query, best first."""
+        search_params = self._get_search_params()
+        if search_params is None:
+            raise ValidationError(detail='Ranked search requires words and an operator.')
+
+        config = settings.PARAGRAPH_SEARCH
+        try:
+            k = int(request.query_params.get('k', config['RANK_K']))
+        except ValueError:
+            raise ValidationError(detail='Invalid number of ranked results.')
+        if k < 1:
+            raise ValidationError(detail='Invalid number of ranked results.')
+
+        snippet = request.query_params.get('snippet', '').lower() in ('1', 'true')
+        paragraphs = search.rank(
+            self.queryset, *search_params, min(k, config['MAX_PAGE_SIZE']), snippet=snippet, match=self._get_match(),
+        )
+        if snippet:
+            serializer = serializers.ParagraphSnippetSerializer(paragraphs, many=True)
+        else:
+            serializer = serializers.RankedParagraphSerializer(paragraphs, many=True)
+        # The ranking query runs as the serializer reads the paragraphs.
+        with metrics.timer('rank'):
+            results = serializer.data
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _stream(queryset):
+        """
+        Stream the paragraphs of `queryset` in id order.
+
+        Rows are read through a server-side cursor and written out in chunks, bypassing the model serializer, so
+        memory stays flat however many paragraphs match. When paragraphs are sharded, the rows of every shard are
+        read through a cursor each and merged by id.
+        """
+        chunk_size = settings.PARAGRAPH_SEARCH['STREAM_CHUNK_SIZE']
+        queryset = queryset.order_by('id').values_list('id', 'text')
+        if sharding.is_sharded():
+            rows = sharding.imerge(
+                [queryset.using(alias).iterator(chunk_size=chunk_size) for alias in sharding.get_shards()],
+                key=lambda row: row[0],
+            )
+        else:
+            # Rows are read once the view returned, from the database the view would have read them from.
+            rows = queryset.using(queryset.db).iterator(chunk_size=chunk_size)
+
+        def lines():
+            chunk = []
+            for paragraph_id, text in rows:
+                chunk.append(json.dumps({'id': paragraph_id, 'text': text}, ensure_ascii=False))
+                if len(chunk) == chunk_size:
+                    yield '\n'.join(chunk) + '\n'
+                    chunk = []
+            if chunk:
+                yield '\n'.join(chunk) + '\n'
+
+        return StreamingHttpResponse(lines(), content_type=NDJSONRenderer.media_type)